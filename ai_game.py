@@ -11,12 +11,33 @@
 import pygame
 from pygame.locals import *
 import random
-
-# import NLP models
+import time
+
+# cache for rendered text
+from text_rendering import TextCache, TextLayout
+# redraws only the parts of the screen that change
+from rendering import DirtyRectRenderer, BackgroundLayer, RenderQueue
+# times the sections of the event loop
+from profiling import FrameProfiler
+# registry of the objects in the world, for collision and proximity checks
+from world import World
+# runs the game logic at a fixed rate, however long each frame takes
+from timestep import FixedTimestep, interpolate_rect
+# packs the images into one surface, cached on disk
+from assets import SpriteAtlas
+# the NPCs, loaded from npcs.json
+from npcs import NPCRegistry
+# looks up what each key does, and collects the text the player types
+from input_handling import InputHandler, TextBuffer
+# the state of the tree, the lock and the key
+from game_state import GameState, Key, Lock
+
+# import NLP models - used as chat_models.<name>, so nothing in chat_models can clash with the game's own names
 import chat_models
-from chat_models import *
 
-from transformers import Conversation, set_seed
+# store the Fox's, the Robot's and the Moose's responses on disk, so inputs seen before (even in an earlier game) are
+# answered without running the model
+chat_models.use_response_cache("npc_responses.sqlite")
 
 # initialize all imported pygame modules - this will raise exceptions if it fails
 pygame.init()
@@ -26,105 +47,108 @@ running = True
 
 # clock for setting frame rate of game (see end of event loop)
 clock = pygame.time.Clock()
+# the most frames drawn per second - 0 for no limit
+FRAME_RATE_LIMIT = 120
+
+# the player moves in fixed "ticks" of game logic, 60 per second, whatever the frame rate (see timestep.py and MOVEMENTS)
+# after a slow frame, up to MAX_TICKS_PER_FRAME ticks run to catch up, so the player keeps moving at the same speed -
+# set FRAME_SKIP to False to run at most one tick per frame instead (the game then slows down with the frame rate)
+TICK_RATE = 60
+FRAME_SKIP = True
+MAX_TICKS_PER_FRAME = 5
+timestep = FixedTimestep(TICK_RATE, frame_skip=FRAME_SKIP, max_ticks_per_frame=MAX_TICKS_PER_FRAME)
+
+# times each section of the event loop on every frame (see profiling.py and benchmarks/game_loop.py)
+profiler = FrameProfiler()
+# press F3 to show or hide the frame time and the slowest section in the top right corner of the window,
+# and F4 to save the timings of the last frames as a trace file (open it in chrome://tracing or https://ui.perfetto.dev)
+show_profiler = False
+profiler_box = pygame.Rect(740,20,250,48)
 
 # set display window size (width, height) - the window is pygame's built-in GUI
 screen = pygame.display.set_mode((1000,700))
 
 # -------------------------------------IMAGES, SURFACES & RECTANGLES--------------------------------------------- #
 # surfaces - store image info
-# convert_alpha() - convert image to pygame-friendly format while keeping transparent pixels
 # rectangles - store location info
 # get_rect() draws a rectangle around a surface
 
+# all the images, at the size they are drawn (the key, the locks and the NPCs are resized to 72 x 72 pixels), packed into
+# one surface that is saved in the sprite_cache folder - so the images are only loaded and resized the first time
+# the game runs, or when they change (see assets.py)
+sprites = SpriteAtlas({
+    "bear": ('ai_game_images/brown_bear.png', None),
+    "tree": ('ai_game_images/tree.png', None),
+    "key": ('ai_game_images/key.png', (72,72)),
+    "lock": ('ai_game_images/lock.png', (72,72)),
+    "unlocked lock": ('ai_game_images/unlocked_lock.png', (72,72)),
+})
+
+# the NPCs - each one's name, image, position, model and greeting are in npcs.json, and their images are added to the
+# sprite atlas (see npcs.py)
+npcs = NPCRegistry.load("npcs.json", sprites)
+
 # bear icon - player's character
-bear_surf = pygame.image.load('ai_game_images/brown_bear.png').convert_alpha()
+bear_surf = sprites.get("bear")
 bear_loc = bear_surf.get_rect()
+# where the player was before the last tick of game logic (see MOVEMENTS)
+bear_prev = bear_loc.copy()
 
 # obstacle - wall
 wall = pygame.Rect((200,200),(10,100))
 
+# text box and inventory box at the bottom of the window
+text_box = pygame.Rect(10,540,690,150)
+inventory_box = pygame.Rect(710,540,280,150)
+
 # tree icon - interactive object
-tree_surf = pygame.image.load('ai_game_images/tree.png').convert_alpha()
+tree_surf = sprites.get("tree")
 tree_loc = tree_surf.get_rect(center = (400,200))
 
 # key icon - object appears in inventory and can be used on the lock
-key_surf_large = pygame.image.load('ai_game_images/key.png').convert_alpha()
-# resize image
-key_surf = pygame.transform.scale(key_surf_large, (72,72))
+key_surf = sprites.get("key")
 key_loc = key_surf.get_rect(center = (850,615))
 
 # lock icon - interactive object
-lock_surf_large = pygame.image.load('ai_game_images/lock.png').convert_alpha()
-# resize image
-lock_surf = pygame.transform.scale(lock_surf_large, (72,72))
+lock_surf = sprites.get("lock")
 lock_loc = key_surf.get_rect(center = (150,300))
 
 # unlocked lock icon - will not appear until key is used on lock
-unlocked_surf_large = pygame.image.load('ai_game_images/unlocked_lock.png').convert_alpha()
-# resize image
-unlocked_surf = pygame.transform.scale(unlocked_surf_large, (72,72))
-
-# polar bear icon - conversational chatbot NPC
-polar_surf = pygame.image.load('ai_game_images/polar_bear.png').convert_alpha()
-polar_loc = polar_surf.get_rect(center = (600,100))
-
-# robot icon - question-answering NPC
-robot_surf_large = pygame.image.load('ai_game_images/robot.png').convert_alpha()
-# resize image
-robot_surf = pygame.transform.scale(robot_surf_large, (72,72))
-robot_loc = robot_surf.get_rect(center = (800,300))
-
-# fox icon - fill-mask NPC
-fox_surf_large = pygame.image.load('ai_game_images/fox.png').convert_alpha()
-# resize image
-fox_surf = pygame.transform.scale(fox_surf_large, (72,72))
-fox_loc = fox_surf.get_rect(center = (900,450))
-
-# moose icon - text generation NPC
-moose_surf_large = pygame.image.load('ai_game_images/moose.png').convert_alpha()
-# resize image
-moose_surf = pygame.transform.scale(moose_surf_large, (72,72))
-moose_loc = moose_surf.get_rect(center = (500,450))
+unlocked_surf = sprites.get("unlocked lock")
+
+# an NPC's model starts loading in the background when the player is within this many pixels of the NPC
+# (the player's rectangle is grown by this amount when checking if the player is close)
+PRELOAD_DISTANCE = 300
+
+# every object the player can bump into or talk to, indexed by where it is (see world.py) - the wall is solid, so the
+# player cannot walk through it
+world = World()
+world.add("wall", wall, solid=True)
+world.add("tree", tree_loc)
+world.add("lock", lock_loc)
+for npc in npcs:
+    world.add(npc.name, npc.rect)
 
 # -------------------------------------FLAGS FOR INTERACTIVE OBJECTS--------------------------------------------- #
 
-# For Text Box:
-current_title = "PLAYER BEAR:"      # title changes to the name of the object/NPC being interacted with when
-                                    # update_text_box_title is called at end of event loop
+# For Tree, Lock, Key and Text Box:
+state = GameState()     # the state of the tree, the lock and the key, and what the player is touching (see game_state.py)
+                        #   - state.tree: the key is at the top, the player said yes or no, or the tree has been climbed
+                        #   - state.lock: locked, the player said yes or no, or unlocked
+                        #   - state.key: in the tree, in the inventory, or used
+                        # state.title is the title of the text box - it changes to the name of the object/NPC being
+                        # interacted with, and state.prompt is what the tree or the lock says
 
 # For Chatbot NPCs:
-input_text = ""                     # holds user input during interaction with NPC
+input_text = TextBuffer(max_length=300)     # holds user input during interaction with NPC
+                                            # (input_text.text is the input as a string - see input_handling.py)
 
 new_user_input = False              # flag for new user input when talking to chatbot
                                     # True if user hits RETURN or ENTER key when interacting with chatbot
                                     # False otherwise
 
-# For Tree:
-climb_tree = "None"     # holds player's response for interaction with tree:
-                        #   - "None": tree is not interacted with
-                        #   - "Yes": player wants to climb tree
-                        #   - "No": player does not want to climb tree
-
-tree_climbed = False    # True when the player has climbed the tree
-                        # Prevents tree from being interacted with after player climbs tree
-
-# For Lock:
-open_lock = "None"      # holds player's response for interaction with lock:
-                        #   - "None": lock is not interacted with
-                        #   - "Yes": player wants to use key on lock
-                        #   - "No": player does not want to use key on lock
-
-lock_state = "Locked"   # current state of lock, either "Locked" or "Unlocked"
-
-# For Key:
-key = False             # whether or not the player has the key
-                        #   - False: player does not have key
-                        #   - True: player has key
-
-key_used = "None"       # whether or not the key has been used
-                        #   - "None": player does not have key
-                        #   - "Yes": player used key
-                        #   - "No": player has key but has not used it
+talking_to = None                   # the NPC the player is touching, or None
+                                    # (each NPC keeps its own conversation and waits for its own model - see npcs.py)
 
 # -------------------------------------TEXT HANDLING--------------------------------------------- #
 # Note: General text will be black, player's response text will be blue
@@ -132,33 +156,24 @@ key_used = "None"       # whether or not the key has been used
 # font object - used to render strings into surfaces
 font = pygame.font.SysFont("lucidaconsole", 14)
 
-# For Conversational NPC (Polar Bear):
-polar_convo = Conversation(conversation_id="100")
-polar_convo.append_response("Hey! I'm a conversational model. Wanna chat?")
-
-# For Question-Answering NPC (Robot):
-robot_convo = {"past_user_inputs": [], "generated_responses": []}
-robot_convo["generated_responses"].append("I am a question-answering chatbot. Ask me anything about this game.")
+# rendered lines of text are cached, so text that stays on screen is only rendered once instead of every frame
+# (text_cache.hits and text_cache.misses count how often a line was reused or had to be rendered)
+text_cache = TextCache(max_bytes=4 * 1024 * 1024)
 
-# For Fill-Mask NPC (Fox):
-fox_convo = {"past_user_inputs": [], "generated_responses": []}
-fox_convo["generated_responses"].append("I am a fill-mask chatbot. Give me a sentence and I will fill in the blanks wherever you write '<mask>'.")
+# word wrap for lines that are too long for the text box, cached so each line is only laid out once
+text_layout = TextLayout()
 
-# For Text-Generation NPC (Moose):
-moose_story = "Once upon a time,"
-# create a list of random numbers to be used as seeds for the text-generating model
-seed_list = []
-for i in range(100):
-    seed_list.append(random.randint(0,500))
-# use the first entry as the current seed
-current_seed = seed_list[0]
+# lines of text written to the text box on the current frame, as (text, colour, (x,y)) - see write_lines()
+# they are drawn by draw_scene() at the end of the event loop
+text_to_draw = []
 
 # write lines to screen
 def write_lines(lines: list[str], x: int, y: int, colour: str="black"):
     """
-    Draws lines of text on the display surface (screen). The top left corner of the first line of text
-    begins at position (x,y) and the y-value increases by 20 pixels for each line. If a line of text is
-    longer than the width of the text box (690 pixels), the text is wrapped down to the next line.
+    Writes lines of text to the text box. The top left corner of the first line of text begins at position (x,y)
+    and the y-value increases by 20 pixels for each line. If a line of text is longer than the width of the text box
+    (690 pixels), the text is wrapped down to the next line.
+    The lines are added to text_to_draw and drawn on the display surface (screen) by draw_scene().
     
     Parameters:
     - lines (list[str]): text to add to screen
@@ -170,142 +185,209 @@ def write_lines(lines: list[str], x: int, y: int, colour: str="black"):
     - y (int): y-value of the next possible line
     """
     for line in lines:
-        # line of text that will appear on the screen - must fit text box width of 690 pixels
-        line_to_render = ""
-        # temporary string to test if a line will fit within the width of the text box
-        line_to_test = ""
-
-        # if the line will fit within the width of the text box, print the line to the screen
-        if font.render(line, True, colour).get_width() <= 690:
-            screen.blit(font.render(line, True, colour), (x,y))
-        
-        # if the line is longer than the text box...
-        else:
-            # create a list of all words in the line
-            words = line.split()
-
-            # Iterate over the list of words.
-            # Here, we add words to line_to_test until it is too long to fit in the test box.
-            # Note: when we split the line into words, we lost the spaces, so we need to add the spaces back in-between words,
-            # unless we have reached the last word
-
-            i = 0
-            while i < len(words):
-
-                # if the last word has been reached, add the word to line_to_test but don't add a space
-                if i == len(words) - 1:
-                    line_to_test = line_to_test + words[i]
-
-                # otherwise, add the word to line_to_test with a space after it
-                else:
-                    line_to_test = line_to_test + words[i] + " "
-                
-                # check the length of line_to_test - if line_to_test is 690 pixels or less in width when it is rendered,
-                # then add it to the line_to_render
-                if font.render(line_to_test, True, colour).get_width() <= 690:
-                    line_to_render = line_to_test
-                
-                # if the line would be too long with another added word...
-                else:
-                    # print the current line_to_render
-                    screen.blit(font.render(line_to_render, True, colour), (x,y))
-                    # clear the line_to_render (starts the next line with a blank string)
-                    line_to_render = ""
-
-                    # if the last word in words has been reached
-                    if i == len(words) - 1:
-                        # add the word to the line_to_test with no space after it
-                        line_to_test = words[i]
-                        # if we have reached the last word, we need to print it to the screen
-                        line_to_render = line_to_test
-
-                    # otherwise, add a space in-between the words
-                    else:
-                        # add the word to the line_to_test plus a space
-                        line_to_test = words[i] + " "
-
-                    # move the next line down on the screen
-                    y += 20
-                
-                # move on to the next word
-                i += 1
-            
-            # if the line_to_render is not empty, print it to the screen
-            if not line_to_render == "":
-                screen.blit(font.render(line_to_render, True, colour), (x,y))
-
-        # move down a line
-        y += 20
-    
+        # split the line into lines that fit within the width of the text box (690 pixels) - the layout is
+        # cached, so this only measures the text the first time the line is written
+        for wrapped_line in text_layout.wrap(font, line, 690):
+            text_to_draw.append((wrapped_line, colour, (x,y)))
+            # move down a line
+            y += 20
+
     return y
 
-# update title of text box
-def update_text_box_title():
+# -------------------------------------KEYBOARD INPUT--------------------------------------------- #
+# What each key does depends on what the player is touching: the "tree", the "lock", or an "npc". Every frame the event
+# loop sets input_handler.contexts to the things the player is touching, and input_handler only calls the handlers
+# bound to the pressed keys in those contexts (or in the context None, which is always active).
+# Each handler is called with the number of times its key was pressed on the frame.
+
+input_handler = InputHandler()
+
+# F3 shows or hides the profiler overlay, F4 saves a trace of the last frames
+def toggle_profiler(presses: int):
+    global show_profiler
+    show_profiler = not show_profiler
+
+def save_trace(presses: int):
+    trace_file = time.strftime("trace-%Y%m%d-%H%M%S.json")
+    profiler.export_chrome_trace(trace_file)
+    print(f"saved profiler trace to {trace_file}")
+
+input_handler.bind(None, K_F3, toggle_profiler)
+input_handler.bind(None, K_F4, save_trace, coalesce=True)
+
+# F5 saves the state of the tree, the lock and the key, and F9 goes back to it - handy for trying the tree and the lock again
+saved_state = state.snapshot()
+
+def save_state(presses: int):
+    global saved_state
+    saved_state = state.snapshot()
+
+def load_state(presses: int):
+    state.restore(saved_state)
+
+input_handler.bind(None, K_F5, save_state, coalesce=True)
+input_handler.bind(None, K_F9, load_state, coalesce=True)
+
+# if player collides with the tree or the lock, accept yes or no responses (see GameState.answer)
+def answer_yes(presses: int):
+    state.answer(True)
+
+def answer_no(presses: int):
+    state.answer(False)
+
+for context in ("tree", "lock"):
+    input_handler.bind(context, K_y, answer_yes, coalesce=True)
+    input_handler.bind(context, K_n, answer_no, coalesce=True)
+
+# if player collides with an NPC, accept the user's text input - the typed text goes to input_text,
+# RETURN or ENTER gives it to the NPC, and BACKSPACE removes the last letter
+def submit_input(presses: int):
+    global new_user_input
+    new_user_input = True
+
+def erase_input(presses: int):
+    input_text.backspace(presses)
+    # the Moose resets its story (see StoryNPC.backspace)
+    talking_to.backspace()
+
+input_handler.bind_text("npc", input_text)
+input_handler.bind("npc", K_RETURN, submit_input, coalesce=True)
+input_handler.bind("npc", K_BACKSPACE, erase_input, coalesce=True)
+
+# -------------------------------------DRAWING THE SCENE--------------------------------------------- #
+
+# draws everything that does not move
+def draw_background(surface):
+    """
+    Draws the parts of the scene that do not move onto a surface: the background, the text box, the inventory box,
+    the wall, the tree, the lock and the NPCs. This is only called when the background layer is out of date
+    (when the game starts, and after the lock is unlocked) - every other frame reuses the surface.
+
+    Parameters:
+    - surface (pygame.Surface): surface to draw on (the background layer)
+
+    Returns: None
+    """
+    # draw background
+    pygame.draw.rect(surface, (191,180,214), surface.get_rect())
+
+    # add instructions for the player
+    instructions = text_cache.render(font, "Use the arrow keys to move. When prompted, enter text and hit RETURN or ENTER.", "black")
+    # draw instructions in top corner of the window
+    surface.blit(instructions, (0,0))
+
+    # draw text box
+    pygame.draw.rect(surface, (214,201,240), text_box)
+
+    # draw inventory box
+    pygame.draw.rect(surface, (214,201,240), inventory_box)
+    # add title to inventory box
+    inventory_box_title = text_cache.render(font, "INVENTORY:", "red")
+    surface.blit(inventory_box_title, (710,540))
+
+    # draw wall
+    pygame.draw.rect(surface, (154, 146, 173), wall)
+
+    # add the tree, the lock and the NPCs - all in one call (see RenderQueue in rendering.py)
+    sprites_to_draw = RenderQueue()
+    # add tree image
+    sprites_to_draw.add(tree_surf, tree_loc)
+    # add lock image
+    sprites_to_draw.add(lock_surf, lock_loc)
+    # add NPCs
+    for npc in npcs:
+        sprites_to_draw.add(npc.sprite, npc.rect)
+    sprites_to_draw.draw(surface)
+
+# everything that does not move, drawn once onto its own surface (see draw_background)
+background = BackgroundLayer(screen.get_size(), draw_background)
+
+# layers of the things drawn on top of the background layer - higher layers are drawn on top (see RenderQueue)
+PLAYER_LAYER = 1
+TEXT_LAYER = 2
+
+# everything drawn on top of the background layer on this frame, drawn with one call (see queue_scene)
+render_queue = RenderQueue()
+
+# collects everything that moves or changes for this frame
+def queue_scene():
     """
-    Updates the title of the text box to the name of the object or NPC the player is colliding with.
-    If none of these collisions are occurring, the default title "PLAYER BEAR: " is used.
+    Adds the things that move or change (the player, the text box and the inventory) to render_queue for this frame.
+    Called once per frame, before the renderer redraws the parts of the screen that have changed.
 
     Parameters: None
 
     Returns: None
     """
+    render_queue.clear()
 
-    # make the current_title variable and all collision flags global so they do not need to be passed to the function
-    global current_title
-    global collide_tree
-    global collide_lock
-    global lock_state
-    global collide_robot
-    global collide_fox
-    global collide_moose
-
-    # collision with tree
-    if collide_tree == True:
-        current_title = "TREE: "
-    
-    # collision with lock
-    elif collide_lock == True:
-        if lock_state == "Locked":
-            current_title = "LOCK: "
-        elif lock_state == "Unlocked":
-            current_title = "OPEN LOCK: "
-    
-    # coliision with polar bear
-    elif collide_polar == True:
-        current_title = "POLAR BEAR: CONVERSATIONAL MODEL"
+    # add bear image to screen - part of the way between where it was on the last two ticks (see MOVEMENTS)
+    render_queue.add(bear_surf, bear_draw_loc, PLAYER_LAYER)
 
-    # collision with robot
-    elif collide_robot == True:
-        current_title = "ROBOT: QUESTION-ANSWERING MODEL"
-    
-    # collision with fox
-    elif collide_fox == True:
-        current_title = "FOX: FILL-MASK MODEL"
+    # add title to text box - title changes to the object or NPC the player is interacting with
+    text_box_title = text_cache.render(font, state.title, "red")
+    render_queue.add(text_box_title, (10,540), TEXT_LAYER)
 
-    # collision with moose
-    elif collide_moose == True:
-        current_title = "MOOSE: TEXT-GENERATING MODEL"
-    
-    # no collisions
-    else:
-        current_title = "PLAYER BEAR: "
+    # if player has key, key icon appears in inventory
+    if state.key == Key.IN_INVENTORY:
+        render_queue.add(key_surf, key_loc, TEXT_LAYER)
+
+    # add the text written to the text box on this frame
+    for text, colour, position in text_to_draw:
+        render_queue.add(text_cache.render(font, text, colour), position, TEXT_LAYER)
+
+# draws the whole scene
+def draw_scene():
+    """
+    Draws everything in the game on the display surface (screen): the background layer, then the things that move
+    or change on top of it (render_queue, filled by queue_scene).
+    The renderer calls this at the end of the event loop for each part of the screen that has changed since the last frame,
+    with drawing clipped to that part, so only the pixels that have changed are drawn.
+
+    Parameters: None
+
+    Returns: None
+    """
+    # draw the background layer - everything that does not move
+    background.draw(screen)
+
+    # draw the player, the text box and the inventory with one call
+    render_queue.draw(screen)
+
+    # add the profiler overlay if it is turned on (F3)
+    if show_profiler == True:
+        profiler.draw_overlay(screen, font, profiler_box)
 
-# reset the story for the text-generating NPC
-def reset_story():
+# redraws the parts of the screen that have changed - see UPDATE EVENT LOOP
+renderer = DirtyRectRenderer(screen)
+
+# -------------------------------------CHANGES OF STATE--------------------------------------------- #
+# called by state whenever the state of the tree, the lock or the key changes, or the player walks up to or away from
+# something - everything else that follows from the state is worked out by the GameState itself (see game_state.py)
+def on_transition(state):
     """
-    Reset's the text-generating NPC's story to 'Once upon a time,'.
-    Is activated when the player is interacting with the NPC and presses the BACKSPACE key.
+    Updates the parts of the game that depend on the state: what the keys do, and the lock's icon.
+
+    Parameters:
+    - state (GameState): the game's state
+
+    Returns: None
     """
+    global lock_surf
 
-    # set global variables so they do not need to be passed to the function
-    global moose_story
-    global current_seed
+    # what the keys do depends on what the player is touching (see KEYBOARD INPUT)
+    input_handler.contexts = state.contexts
 
-    # reset the story variable
-    moose_story = "Once upon a time,"
+    # change lock icon to unlocked version once the key has been used - the lock is part of the background layer, so redraw it
+    if state.lock == Lock.SAID_YES or state.lock == Lock.UNLOCKED:
+        new_lock_surf = unlocked_surf
+    else:
+        new_lock_surf = sprites.get("lock")
+    if lock_surf is not new_lock_surf:
+        lock_surf = new_lock_surf
+        background.invalidate()
 
-    # select a random new number from the seed_list to be the new seed
-    current_seed = random.choice(seed_list)
+state.on_transition(on_transition)
 
 # -------------------------------------SET WINDOW TITLE AND ICON--------------------------------------------- #
 # set window title
@@ -316,377 +398,137 @@ pygame.display.set_icon(bear_surf)
 # ---------------------------------------EVENT LOOP-------------------------------------------- #
 while running:
 
+    # start timing the sections of this frame (each section ends with profiler.lap)
+    profiler.start_frame()
+
     # -----------------------------------EVENT LISTENERS----------------------------------------------- #
-    for event in pygame.event.get():
+    # keys pressed and text typed go to the handlers for what the player is touching (see KEYBOARD INPUT) -
+    # the other events are handled here
+    for event in input_handler.handle(pygame.event.get()):
 
         # user quitting game - when the player clicks the "quit" button, "running" is set to False and application closes
         if event.type == QUIT:
             running = False
-        
-        # if player collides with tree, accept yes or no responses
-        if event.type == KEYDOWN and collide_tree == True:
-            if event.key == K_y:
-                climb_tree = "Yes"
-            elif event.key == K_n:
-                climb_tree = "No"
-        
-        # if player collides with lock, accept yes or no responses
-        if event.type == KEYDOWN and collide_lock == True:
-            if event.key == K_y:
-                open_lock = "Yes"
-            elif event.key == K_n:
-                open_lock = "No"
-
-        # if player collides with an NPC, accept the user's text input
-        if event.type == KEYDOWN:
-            if collide_polar == True or collide_robot == True or collide_fox == True or collide_moose == True:
-                if event.key == pygame.K_RETURN:
-                    new_user_input = True
-                    
-                elif event.key == pygame.K_BACKSPACE:
-                    input_text = input_text[:-1]
-                    if collide_moose == True:
-                        reset_story()
-                else:
-                    input_text += event.unicode
 
+        # if the window has been covered up and shown again, redraw all of it
+        if event.type == VIDEOEXPOSE:
+            renderer.mark_all()
+
+    profiler.lap("events")
 
     # -----------------------------------MOVEMENTS----------------------------------------------- #
     # get currently pressed keys
     keys = pygame.key.get_pressed()
 
-    # movements for player icon
-    if keys[pygame.K_LEFT]:
-        # Left movement occurs UNLESS...
-        # player is within y-range of wall...........................and player is left of wall.....and player will collide with wall
-        if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.left >= wall.right and bear_loc.left - 10 < wall.right: pass
-        # otherwise, move left
-        else: bear_loc = bear_loc.move([-10, 0])
-    if keys[pygame.K_RIGHT]:
-       
-        # Right movement occurs UNLESS...
-        # player is within y-range of wall...........................and player is right of wall.....and player will collide with wall
-        if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.right <= wall.left and bear_loc.right + 10 > wall.left: pass
-        # otherwise, move right
-        else: bear_loc = bear_loc.move([10, 0])
-    if keys[pygame.K_UP]:
-        # Upward movement occurs UNLESS...
-        # player is within x-range of wall...........................and player is below wall........and player will collide with wall
-        if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.top >= wall.bottom and bear_loc.top - 10 < wall.bottom: pass
-        # otherwise, move up
-        else: bear_loc = bear_loc.move([0, -10])
-    if keys[pygame.K_DOWN]:
-        # Downward movement occurs UNLESS...
-        # player is within x-range of wall...........................and player is above wall........and player will collide with wall
-        if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.bottom <= wall.top and bear_loc.bottom + 10 > wall.top: pass
-        # otherwise, move down
-        else: bear_loc = bear_loc.move([0, 10])
+    # run the ticks of game logic for this frame - none if the last frame was quick, more than one (up to
+    # MAX_TICKS_PER_FRAME) if it was slow (see timestep.py)
+    for tick in range(timestep.advance()):
+        # where the player was before this tick, for drawing it between ticks
+        bear_prev = bear_loc.copy()
+
+        # movements for player icon - the player moves 10 pixels in each direction per tick, unless a solid object
+        # (the wall) is in the way, in which case it stops right next to it (see World.sweep)
+        if keys[pygame.K_LEFT]:
+            bear_loc = world.sweep(bear_loc, -10, 0)
+        if keys[pygame.K_RIGHT]:
+            bear_loc = world.sweep(bear_loc, 10, 0)
+        if keys[pygame.K_UP]:
+            bear_loc = world.sweep(bear_loc, 0, -10)
+        if keys[pygame.K_DOWN]:
+            bear_loc = world.sweep(bear_loc, 0, 10)
+
+        # confine the player's icon to the rectangle of the display screen,
+        # just below the line of instructions
+        bear_loc.clamp_ip(pygame.Rect(0,10,1000,530))
+
+    # where to draw the player on this frame - collisions still use bear_loc, where the player is after the last tick
+    bear_draw_loc = interpolate_rect(bear_prev, bear_loc, timestep.alpha)
+
+    # -----------------------------------PRELOADING NPC MODELS----------------------------------------------- #
+    # the models are only loaded when they are first needed (see chat_models.py), so start loading an NPC's model
+    # in the background as soon as the player walks near it - by the time the player reaches the NPC it is ready
+    nearby = world.query(bear_loc.inflate(PRELOAD_DISTANCE, PRELOAD_DISTANCE))
+    for npc in npcs.nearby(nearby):
+        npc.model.preload()
 
     # ----------------------------------DRAWING ITEMS ON SCREEN------------------------------------------------ #
-    # draw background
-    pygame.draw.rect(screen, (191,180,214), screen.get_rect())
-
-    # add instructions for the player
-    instructions = font.render("Use the arrow keys to move. When prompted, enter text and hit RETURN or ENTER.", True, "black")
-    # draw instructions in top corner of the window
-    screen.blit(instructions, (0,0))
-
-    # draw text box
-    pygame.draw.rect(screen, (214,201,240), pygame.Rect(10,540,690,150))
-    # add title to text box - title changes to the object or NPC the player is interacting with
-    # current_title = "PLAYER BEAR:"
-    text_box_title = font.render(current_title, True, "red")
-
-    # draw inventory box
-    pygame.draw.rect(screen, (214,201,240), pygame.Rect(710,540,280,150))
-    # add title to inventory box
-    inventory_box_title = font.render("INVENTORY:", True, "red")
-
-    # draw wall
-    pygame.draw.rect(screen, (154, 146, 173), wall)
-
-    # confine the player's icon to the rectangle of the display screen,
-    # just below the line of instructions
-    bear_loc.clamp_ip(pygame.Rect(0,10,1000,530))
-
-    # add bear image to screen
-    screen.blit(bear_surf, bear_loc)
-    # add tree image to screen
-    screen.blit(tree_surf, tree_loc)
-    # add text box title to screen
-    screen.blit(text_box_title, (10,540))
-    # add inventory box title to screen
-    screen.blit(inventory_box_title, (710,540))
-    # add lock image to screen
-    screen.blit(lock_surf, lock_loc)
-    # add polar bear NPC to screen
-    screen.blit(polar_surf, polar_loc)
-    # add robot NPC to screen
-    screen.blit(robot_surf, robot_loc)
-    # add fox NPC to screen
-    screen.blit(fox_surf, fox_loc)
-    # add moose NPC to screen
-    screen.blit(moose_surf, moose_loc)
-
-    # ---------------------------------------INTERACTING WITH TREE------------------------------------------- #
-    # flag for collision with tree - True if collision is currently occurring
-    collide_tree = pygame.Rect.colliderect(bear_loc, tree_loc)
-
-    # if player is colliding with tree and player hasn't climbed tree before, write text to screen
-    if collide_tree == True and tree_climbed == False:
-        write_lines(["There is a tall tree... with something at the top!", "Climb tree? Yes [y] or No [n]: "], 10, 560)
-        
-        # event listeners handle player's response, which is stored in climb_tree
-        if climb_tree == "Yes":
-            write_lines(["[y]: You climb to the top and find a KEY."], 10, 600, "blue")
-            # player has key
-            # key appears in inventory (see below)
-            key = True
-            # player has key but has not used it
-            key_used = False
-
-        elif climb_tree == "No":
-            write_lines(["[n]: It looks too tall to climb anyway."], 10, 600, "blue")
-    
-    # if player is not colliding with tree
-    elif collide_tree == False:
-        # if player climbed the tree (has the key)
-        if key == True:
-            # prevents tree from being interacted with after it has been climbed
-            tree_climbed = True
-
-        # climb_tree removes the text from the text box when player is not colliding with tree
-        climb_tree = "None"
-
-    # ----------------------------------------KEY APPEARING IN INVENTORY------------------------------------------ #
-    # if player has key, key icon appears in inventory
-    if key == True:
-        screen.blit(key_surf, key_loc)
-    
-    # ----------------------------------------INTERACTING WITH LOCK------------------------------------------ #
-    # flag for collision with lock - True if collision is currently occurring
-    collide_lock = pygame.Rect.colliderect(bear_loc, lock_loc)
-
-    # if player is colliding with lock and the lock is locked, write text to screen
-    if collide_lock == True and lock_state == "Locked":
-        write_lines(["A lock. You use your paws but it won't budge.", "It probably needs a KEY..."], 10, 560)
-        
-        # if the player has the key but has not used it, give them the option to use it
-        if key_used == False:
-            write_lines(["Use KEY? Yes [y] or No [n]: "], 10, 600)
-
-            # event listeners handle player's response, which is stored in open_lock
-            if open_lock == "Yes":
-                write_lines(["[y]: It worked!"], 10, 620, "blue")
-                # change lock icon to unlocked version
-                lock_surf = unlocked_surf                
-                # key disappears from inventory
-                key = False
-
-            elif open_lock == "No":
-                write_lines(["[n]: Really? Why not?"], 10, 620, "blue")
-
-    # if player is not colliding with lock
-    elif collide_lock == False:
-        # if player wants to open the lock and the lock is locked...
-        if open_lock == "Yes" and lock_state == "Locked":
-            # unlock the lock
-            lock_state = "Unlocked"
-            # key has been used
-            key_used = True
-
-        # open_lock removes the text from the text box when player is not colliding with lock
-        open_lock = "None"
-
-
-    # ----------------------------------------INTERACTING WITH POLAR BEAR (CONVERSATIONAL NPC)------------------------------------------ #
-    # Model: facebook/blenderbot-400M-distill (https://huggingface.co/facebook/blenderbot-400M-distill?text=Hey+my+name+is+Julien%21+How+are+you%3F)
-    
-    # flag for collision with polar bear - True if collision is currently occurring
-    collide_polar = pygame.Rect.colliderect(bear_loc, polar_loc)
-    
-    if collide_polar == True:
-
-        # if the player has not spoken to the chatbot yet
-        if len(polar_convo.past_user_inputs) == 0:
-            # show the most recent bot response and get the y-coordinate for the next line
-            y = write_lines(["P. Bear: " + polar_convo.generated_responses[-1]], 10, 560, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y, "black")
-
-        else:
-            # show the most recent user input and get the y-coordinate for the next line
-            y = write_lines(["You: " + polar_convo.past_user_inputs[-1]], 10, 560, "black")
-            # on the next line, show the most recent bot response and get the y-coordinate for the next line
-            y2 = write_lines(["P. Bear: " + polar_convo.generated_responses[-1]], 10, y, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y2, "black")
-
-        # if the player hits the RETURN or ENTER key
-        if new_user_input == True:
-            # remove the oldest bot response from the conversation
-            polar_convo.generated_responses.pop(0)
-            # if there are older lines of user input in the conversation, remove the oldest line
-            # (this does not occur the first time the user enters a new line)
-            if len(polar_convo.past_user_inputs) > 0:
-                polar_convo.past_user_inputs.pop(0)
-            # add the user's input to the conversation object
-            polar_convo.add_user_input(input_text)
-            # have the chatbot respond to the conversation object - automatically adds bot's response to the object
-            blenderbot(polar_convo)
-            
-            new_user_input = False
-            input_text = ""
-
-    # ----------------------------------------INTERACTING WITH ROBOT (QUESTION-ANSWERING NPC)------------------------------------------ #
-    # Model: distilbert-base-cased-distilled-squad (https://huggingface.co/distilbert-base-cased-distilled-squad)
-    
-    # Note: the logic below is the same as the logic for the conversational model
+    # Note: nothing is drawn here. The sections below write to the text box with write_lines(), and the scene is drawn by
+    # draw_scene() at the end of the event loop - only where the screen has changed (see UPDATE EVENT LOOP).
+
+    # clear the text box - the text for this frame is written by the sections below
+    text_to_draw.clear()
+
+    # the objects the player is touching - the sections below check this instead of each checking for a collision
+    touching = world.query(bear_loc)
+
+    profiler.lap("movement")
+
+    # ----------------------------------------INTERACTING WITH NPCs------------------------------------------ #
+    # Each NPC's model runs on a background thread (see chat_models.submit), so the game does not freeze while it responds.
+    # While an NPC is waiting for its model it shows "thinking...", and the response is added to its conversation as
+    # soon as it is ready - even if the player has walked away (only the NPCs that are waiting are checked).
+    npcs.poll()
+
+    profiler.lap("npc responses")
+
+    # the NPC the player is talking to - only the NPCs the player is touching are updated (see NPC.update)
+    talking_to = None
+    for npc in npcs.touching(touching):
+        if talking_to is None:
+            talking_to = npc
+        # write the conversation to the text box, and if the player hit RETURN or ENTER, give their input to the NPC's model
+        if npcs.update(npc, write_lines, input_text.text, new_user_input):
+            input_text.clear()
+        # timed on its own, so a slow frame can be traced to the NPC that caused it (e.g. "npc fox")
+        profiler.lap(f"npc {npc.name}")
+
+    new_user_input = False
+
+    # ---------------------------------------INTERACTING WITH TREE AND LOCK------------------------------------------- #
+    # tell the state what the player is touching - the tree and the lock come before the NPCs
+    # (nothing happens unless it has changed - see GameState.touch)
+    if "tree" in touching:
+        state.touch("tree")
+    elif "lock" in touching:
+        state.touch("lock")
+    else:
+        state.touch(talking_to)
 
-    # flag for collision with robot - True if collision is currently occurring
-    collide_robot = pygame.Rect.colliderect(bear_loc, robot_loc)
-    
-    if collide_robot == True:
-
-        # if the player has not spoken to the chatbot yet
-        if len(robot_convo["past_user_inputs"]) == 0:
-            # show the most recent bot response and get the y-coordinate for the next line
-            y = write_lines(["Robot: " + robot_convo["generated_responses"][-1]], 10, 560, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y, "black")
-
-        else:
-            # show the most recent user input and get the y-coordinate for the next line
-            y = write_lines(["You: " + robot_convo["past_user_inputs"][-1]], 10, 560, "black")
-            # on the next line, show the most recent bot response and get the y-coordinate for the next line
-            y2 = write_lines(["Robot: " + robot_convo["generated_responses"][-1]], 10, y, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y2, "black")
-
-        # if the player hits the RETURN or ENTER key
-        if new_user_input == True:
-            # remove the oldest bot response from the conversation
-            robot_convo["generated_responses"].pop(0)
-            # if there are older lines of user input in the conversation, remove the oldest line
-            # (this does not occur the first time the user enters a new line)
-            if len(robot_convo["past_user_inputs"]) > 0:
-                robot_convo["past_user_inputs"].pop(0)
-            # add the user's input to the conversation
-            robot_convo["past_user_inputs"].append(input_text)
-            # get the chatbot's response to the conversation - we only want the answer, not the other information it returns (score, etc.)
-            response = qa_chatbot(robot_convo["past_user_inputs"][-1], context)["answer"]
-            # format the response so the text looks normal
-            response = response.capitalize() + "."
-            # add the bot's response to the conversation history
-            robot_convo["generated_responses"].append(response)
-
-            new_user_input = False
-            input_text = ""
-
-    # ----------------------------------------INTERACTING WITH FOX (FILL-MASK NPC)------------------------------------------ #
-    # Model: distilroberta-base (https://huggingface.co/distilroberta-base)
-    
-    # Note: the logic below is the same as the logic for the conversational model
-
-    # flag for collision with fox - True if collision is currently occurring
-    collide_fox = pygame.Rect.colliderect(bear_loc, fox_loc)
-
-    if collide_fox == True:
-
-        # if the player has not spoken to the chatbot yet
-        if len(fox_convo["past_user_inputs"]) == 0:
-            # show the most recent bot response and get the y-coordinate for the next line
-            y = write_lines(["Fox: " + fox_convo["generated_responses"][-1]], 10, 560, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y, "black")
-
-        else:
-            # show the most recent user input and get the y-coordinate for the next line
-            y = write_lines(["You: " + fox_convo["past_user_inputs"][-1]], 10, 560, "black")
-            # on the next line, show the most recent bot response and get the y-coordinate for the next line
-            y2 = write_lines(["Fox: " + fox_convo["generated_responses"][-1]], 10, y, "blue")
-            # on the next line, show the user's input on screen as they type it out
-            write_lines([f"You: {input_text}"], 10, y2, "black")
-
-        # if the player hits the RETURN or ENTER key
-        if new_user_input == True:
-
-            # remove the oldest bot response from the conversation
-            fox_convo["generated_responses"].pop(0)
-            # if there are older lines of user input in the conversation, remove the oldest line
-            # (this does not occur the first time the user enters a new line)
-            if len(fox_convo["past_user_inputs"]) > 0:
-                fox_convo["past_user_inputs"].pop(0)
-            # add the user's input to the conversation
-            fox_convo["past_user_inputs"].append(input_text)
-
-            # if the input text contains '<mask>', get the chatbot's response
-            if '<mask>' in input_text:
-
-                # get the chatbot's response to the conversation
-                response = fm_chatbot(fox_convo["past_user_inputs"][-1])
-
-                # get the most likely <mask> tokens and store them in a string
-                response_tokens = ""
-                i = 0
-                while i < len(response):
-                    # if we have reached the last token, insert a period
-                    if i == len(response) - 1:
-                        response_tokens += response[i]['token_str'] + "."
-                    # otherwise, insert a comma
-                    else:
-                        response_tokens += response[i]['token_str'] + ","
-                    i += 1
-
-                # add the bot's response to the conversation history - The sentence with the filled-in blank, and the most likely words
-                fox_convo["generated_responses"].append(f"{response[0]['sequence']} The most likely words are:{response_tokens}")
-
-            # if the input does not contain '<mask>', print an error message
-            else:
-                fox_convo["generated_responses"].append("I don't understand. Make sure your input contains the word <mask>.")
-
-            new_user_input = False
-            input_text = ""
-
-    # ----------------------------------------INTERACTING WITH MOOSE (TEXT-GENERATING NPC)------------------------------------------ #
-    # Model: gpt2 (https://huggingface.co/gpt2?text=Once+upon+a+time%2C)
-
-    # flag for collision with moose - True if collision is currently occurring
-    collide_moose = pygame.Rect.colliderect(bear_loc, moose_loc)
-
-    if collide_moose == True:
-
-        # show the story
-        write_lines(["Moose: " + moose_story], 10, 560, "blue")
-
-        # show instructions for player
-        write_lines(["TIP - Hit RETURN or ENTER to continue the story, or BACKSPACE to reset it."], 10, 670, "black")
- 
-        # if the player hits the RETURN or ENTER key, continue the story
-        if new_user_input == True:
-            
-            # set the seed
-            set_seed(current_seed)
-            
-            # get the model's response - the continued story
-            moose_story = tg_chatbot(moose_story, max_new_tokens=35)[0]['generated_text']
-
-            new_user_input = False
-            input_text = ""
-        
-        # Note: if the player hits the BACKSPACE key, the story is reset to "Once upon a time," and the seed is changed.
-        # This occurs when an event listener (see EVENT LISTENERS section) calls the reset_story() function.
+    # write what the tree or the lock says - worked out when the state last changed, e.g. when the player answered [y] or [n]
+    for lines, y, colour in state.prompt:
+        write_lines(lines, 10, y, colour)
 
+    profiler.lap("tree and lock")
 
     # ----------------------------------------UPDATE EVENT LOOP------------------------------------------ #
-    # update text box title
-    update_text_box_title()
-    
-    # update the display surface
-    pygame.display.update()
-
-    # set the frame rate to 60 FPS (frames per second) - a constant frame rate helps the game run smoother
-    clock.tick(60)
+    # tell the renderer about everything that can change - if something has moved or changed since the last frame,
+    # its old and new positions are redrawn
+    renderer.track("bear", bear_draw_loc)
+    renderer.track("lock", lock_loc, lock_surf)
+    renderer.track("key", key_loc, state.key)
+    # the text can run below the bottom of the text box (e.g. the Moose's tip at y = 670), so track everything down to
+    # the bottom of the lowest line - otherwise the part of a line below the box would never be redrawn
+    # (the lines are measured as they are drawn - text_cache keeps them, so draw_scene() does not render them again)
+    text_area = text_box.copy()
+    for line, colour, (x,y) in text_to_draw:
+        text_area.height = max(text_area.height, y + text_cache.render(font, line, colour).get_height() - text_box.top)
+    renderer.track("text box", text_area, (state.title, tuple(text_to_draw)))
+    if show_profiler == True:
+        renderer.track("profiler", profiler_box, tuple(profiler.overlay_lines()))
+
+    # redraw the parts of the screen that have changed
+    queue_scene()
+    dirty_rects = renderer.redraw(draw_scene)
+    profiler.lap("draw")
+
+    # update the display surface - only the parts that have changed
+    pygame.display.update(dirty_rects)
+    profiler.lap("display update")
+
+    # limit the frame rate (frames per second) - the player still moves at the same speed, as the game logic runs in
+    # fixed ticks (see MOVEMENTS)
+    clock.tick(FRAME_RATE_LIMIT)
+    profiler.lap("clock")
 
 # close the application
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,201 @@
+# Sprite atlas for ai_game.py
+
+# ai_game.py used to load each image in ai_game_images/ on its own, decode it from PNG, and shrink most of them to
+# 72 x 72 pixels with pygame.transform.scale - keeping both the full-size image and the small one in memory.
+
+# A SpriteAtlas packs all the sprites, already at the size the game draws them, into one surface (a "texture atlas"),
+# and hands out each sprite as a subsurface of it - a view of part of the atlas that takes no memory of its own and is
+# drawn like any other surface. The full-size images are only needed while the atlas is built, and are freed after.
+
+# The finished atlas is saved in a cache folder as raw pixels, under a name made from a hash of the image files and the
+# sizes. The next time the game starts, the atlas is read back in one go - no PNG decoding or scaling - unless an image
+# or a size has changed, in which case the hash is different and the atlas is built again.
+
+import hashlib
+import json
+import os
+
+import pygame
+
+# changes whenever the way the atlas is built or saved changes, so atlases saved by older code are not used
+ATLAS_VERSION = 1
+
+
+class SpriteAtlas:
+    """
+    Packs sprites (images scaled to the size they are drawn at) into one surface, cached on disk.
+
+    The atlas is built (or read from the cache) the first time a sprite is asked for, so it must be used after
+    pygame.display.set_mode() (the sprites are converted to the display's pixel format).
+
+    Parameters:
+    - sprites (dict[str, tuple[str, tuple[int, int]]]): name -> (image file, (width, height)) for every sprite, e.g.
+      {"key": ("ai_game_images/key.png", (72, 72))} - a size of None keeps the image's own size
+    - cache_dir (str): folder for the cached atlas, created if it does not exist - None to always build it (default: "sprite_cache")
+    - max_width (int): widest the atlas can be, in pixels (default: 1024)
+
+    Attributes:
+    - from_cache (bool): True if the atlas was read from the cache, False if it was built (None until it is loaded)
+    """
+
+    def __init__(self, sprites: dict, cache_dir: str="sprite_cache", max_width: int=1024):
+        self.sprites = {name: (path, None if size is None else tuple(size)) for name, (path, size) in sprites.items()}
+        self.cache_dir = cache_dir
+        self.max_width = max_width
+        self.from_cache = None
+        # the atlas surface, and name -> where each sprite is in it
+        self._surface = None
+        self._areas = {}
+        # name -> subsurface, so each sprite is always the same surface object
+        self._subsurfaces = {}
+
+    def __contains__(self, name):
+        return name in self.sprites
+
+    def add(self, name: str, path: str, size=None):
+        """
+        Adds a sprite to the atlas. Sprites can only be added before the atlas is loaded (before the first get()).
+
+        Parameters:
+        - name (str): unique name for the sprite, e.g. "fox"
+        - path (str): the image file
+        - size (tuple[int, int]): (width, height) to scale the image to, or None to keep its own size (default: None)
+
+        Returns: None
+        """
+        if self._surface is not None:
+            raise RuntimeError(f"cannot add sprite {name!r}: the atlas has already been loaded")
+        self.sprites[name] = (path, None if size is None else tuple(size))
+
+    def get(self, name: str):
+        """
+        Returns a sprite, loading the atlas first if it has not been loaded yet.
+
+        Parameters:
+        - name (str): the sprite's name, e.g. "key"
+
+        Returns:
+        - sprite (pygame.Surface): the sprite - a subsurface of the atlas (the same surface on every call)
+        """
+        if name not in self._subsurfaces:
+            self.load()
+            self._subsurfaces[name] = self._surface.subsurface(self._areas[name])
+        return self._subsurfaces[name]
+
+    def area(self, name: str):
+        """
+        Returns:
+        - area (pygame.Rect): where the sprite is in the atlas, for blitting part of it with surface.blit(atlas.surface, position, area)
+        """
+        self.load()
+        return self._areas[name]
+
+    @property
+    def surface(self):
+        """The atlas surface, with every sprite on it."""
+        self.load()
+        return self._surface
+
+    def load(self):
+        """
+        Reads the atlas from the cache, or builds it (and saves it to the cache) if it is not there.
+        Does nothing if the atlas is already loaded.
+
+        Returns: None
+        """
+        if self._surface is not None:
+            return
+
+        path = None
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, f"atlas-{self.key()}")
+            if self._read(path):
+                self.from_cache = True
+                return
+
+        self._build()
+        self.from_cache = False
+        if path is not None:
+            self._write(path)
+
+    def key(self):
+        """
+        Returns the cache key for the atlas: a hash of the contents of every image file, the sprites' names and sizes,
+        and ATLAS_VERSION.
+
+        Returns:
+        - key (str): the hash, as hexadecimal
+        """
+        digest = hashlib.sha256(f"{ATLAS_VERSION} {self.max_width}".encode())
+        for name, (path, size) in sorted(self.sprites.items()):
+            with open(path, "rb") as file:
+                file_hash = hashlib.sha256(file.read()).hexdigest()
+            digest.update(json.dumps([name, size, file_hash]).encode())
+        return digest.hexdigest()[:32]
+
+    def _build(self):
+        """Loads and scales every image, and packs them into a new atlas."""
+        images = {}
+        for name, (path, size) in self.sprites.items():
+            image = pygame.image.load(path).convert_alpha()
+            if size is not None and image.get_size() != size:
+                image = pygame.transform.scale(image, size)
+            images[name] = image
+
+        self._areas = self._pack({name: image.get_size() for name, image in images.items()})
+        width = max((area.right for area in self._areas.values()), default=1)
+        height = max((area.bottom for area in self._areas.values()), default=1)
+        self._surface = pygame.Surface((width, height), pygame.SRCALPHA).convert_alpha()
+        self._surface.fill((0, 0, 0, 0))
+        for name, image in images.items():
+            # BLEND_RGBA_ADD onto transparent pixels copies the image exactly, alpha included
+            self._surface.blit(image, self._areas[name], special_flags=pygame.BLEND_RGBA_ADD)
+        # (the full-size images are freed when images goes out of scope)
+
+    def _pack(self, sizes: dict):
+        """
+        Works out where each sprite goes in the atlas: the tallest sprites first, left to right in rows ("shelves"),
+        starting a new row when the next sprite does not fit in max_width.
+
+        Parameters:
+        - sizes (dict[str, tuple[int, int]]): name -> (width, height) of each sprite
+
+        Returns:
+        - areas (dict[str, pygame.Rect]): name -> where the sprite goes
+        """
+        areas = {}
+        x = y = row_height = 0
+        for name, (width, height) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+            if x > 0 and x + width > self.max_width:
+                x, y, row_height = 0, y + row_height, 0
+            areas[name] = pygame.Rect(x, y, width, height)
+            x += width
+            row_height = max(row_height, height)
+        return areas
+
+    def _read(self, path: str):
+        """Reads the atlas from path.json and path.rgba. Returns False if they are missing or do not match the sprites."""
+        try:
+            with open(path + ".json") as file:
+                layout = json.load(file)
+            with open(path + ".rgba", "rb") as file:
+                pixels = file.read()
+        except (OSError, ValueError):
+            return False
+        if sorted(layout["areas"]) != sorted(self.sprites) or len(pixels) != layout["width"] * layout["height"] * 4:
+            return False
+        self._surface = pygame.image.frombytes(pixels, (layout["width"], layout["height"]), "RGBA").convert_alpha()
+        self._areas = {name: pygame.Rect(area) for name, area in layout["areas"].items()}
+        return True
+
+    def _write(self, path: str):
+        """Saves the atlas to path.json (where each sprite is) and path.rgba (the pixels)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        width, height = self._surface.get_size()
+        layout = {"width": width, "height": height, "areas": {name: tuple(area) for name, area in self._areas.items()}}
+        # write to temporary files first, so a game started at the same time never reads a half-written atlas
+        for extension, data in ((".rgba", pygame.image.tobytes(self._surface, "RGBA")), (".json", json.dumps(layout).encode())):
+            temporary = f"{path}{extension}.{os.getpid()}"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path + extension)
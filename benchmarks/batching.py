@@ -0,0 +1,102 @@
+# Throughput benchmark for batching NPC requests (chat_models.submit_batched)
+# Simulates many players talking to the same NPC at once: sends a burst of requests to one chatbot, first one request
+# per model call (chat_models.submit), then micro-batched (chat_models.submit_batched), and reports requests per second.
+# Also checks that batching does not change any of the responses.
+
+# Run from the repository root:
+#   python benchmarks/batching.py                              (downloads the real models)
+#   python benchmarks/batching.py --requests 64 --batch-size 16
+#   python benchmarks/batching.py --local-models path/to/models   (folders named blenderbot, qa_chatbot, fm_chatbot)
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import chat_models
+
+from transformers import Conversation
+
+# what the players say to each chatbot
+PLAYER_INPUTS = {
+    "blenderbot": ["Hi! How are you?", "Do you like fishing?", "What is your favourite food?", "It is very cold today.",
+                   "Have you ever seen a moose?", "Tell me about yourself."],
+    "qa_chatbot": ["What is an NPC?", "What does the Robot do?", "Where is the key?", "How do I move?",
+                   "What model does the Fox use?", "What is the wall?"],
+    "fm_chatbot": ["The bear sat on a <mask>.", "I like to eat <mask> for breakfast.", "The <mask> is very tall.",
+                   "Open the lock with the <mask>.", "The robot answers <mask>.", "It is cold in the <mask>."],
+}
+
+
+def make_request(name: str, i: int):
+    """Returns the arguments for the i-th request to a chatbot."""
+    text = PLAYER_INPUTS[name][i % len(PLAYER_INPUTS[name])]
+    if name == "blenderbot":
+        return (Conversation(text),)
+    if name == "qa_chatbot":
+        # a different question every time, so the answer cache cannot answer any of them
+        return (f"Player {i} asks: {text}", chat_models.context)
+    return (text,)
+
+
+def response_text(name: str, response):
+    """Returns the part of a response that the game shows, for comparing responses."""
+    if name == "blenderbot":
+        return response.generated_responses[-1]
+    if name == "qa_chatbot":
+        return response["answer"]
+    return [prediction["token_str"] for prediction in response]
+
+
+def run_burst(name: str, requests: int, batched: bool):
+    """Sends all of the requests at once and waits for every response. Returns (seconds, responses)."""
+    chatbot = chat_models.models[name]
+    # forget the answers from the last burst, so every request runs the model
+    if isinstance(chatbot.load(), chat_models.QAEngine):
+        chatbot.load().clear()
+
+    start = time.perf_counter()
+    if batched:
+        futures = [chat_models.submit_batched(name, *make_request(name, i)) for i in range(requests)]
+    else:
+        futures = [chat_models.submit(chatbot, *make_request(name, i)) for i in range(requests)]
+    responses = [response_text(name, future.result()) for future in futures]
+    return time.perf_counter() - start, responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one-at-a-time and micro-batched NPC requests.")
+    parser.add_argument("--requests", type=int, default=32, help="requests in each burst (default: 32)")
+    parser.add_argument("--batch-size", type=int, default=8, help="maximum batch size (default: 8)")
+    parser.add_argument("--max-wait", type=float, default=0.005, help="seconds to wait for more requests (default: 0.005)")
+    parser.add_argument("--local-models", help="folder of local models to use instead of downloading them, one sub-folder per chatbot")
+    args = parser.parse_args()
+
+    names = list(PLAYER_INPUTS)
+    if args.local_models:
+        sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+        from game_loop import install_local_models
+        names = [name for name in install_local_models(args.local_models) if name in PLAYER_INPUTS]
+
+    for batcher in chat_models.batchers.values():
+        batcher.max_batch_size = args.batch_size
+        batcher.max_wait = args.max_wait
+
+    print(f"{'chatbot':<12}{'one at a time (req/s)':>24}{'batched (req/s)':>18}{'mean batch':>12}{'same responses':>16}")
+    for name in names:
+        chat_models.models[name].load()
+        # warm up both paths, so one-off work is not timed
+        run_burst(name, 2, batched=False)
+        run_burst(name, 2, batched=True)
+        batcher = chat_models.batchers[name]
+        batcher.batches = batcher.requests = 0
+        single_time, single_responses = run_burst(name, args.requests, batched=False)
+        batched_time, batched_responses = run_burst(name, args.requests, batched=True)
+        print(f"{name:<12}{args.requests / single_time:>24.1f}{args.requests / batched_time:>18.1f}"
+              f"{batcher.requests / max(batcher.batches, 1):>12.1f}{str(single_responses == batched_responses):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Long-conversation benchmark for the Polar Bear (blenderbot)
+# Has a long conversation with blenderbot twice - once in a transformers Conversation, which gives the model the whole
+# conversation every time, and once in a chat_models.ConversationHistory, which only keeps as many of the newest messages
+# as the model can read - and reports how many tokens the model was given and how long it took to respond, every few turns.
+# A Conversation eventually gets too long for the model, and its rows then show the error.
+
+# Run from the repository root:
+#   python benchmarks/conversation_length.py                          (downloads the real model)
+#   python benchmarks/conversation_length.py --turns 100 --every 10
+#   python benchmarks/conversation_length.py --local-models path/to/models   (a folder named blenderbot)
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import chat_models
+
+from transformers import Conversation
+
+# what the player says, over and over
+PLAYER_INPUTS = ["Hi! How are you?", "Do you like fishing?", "What is your favourite food?", "It is very cold today.",
+                 "Have you ever seen a moose?", "Tell me about yourself."]
+
+
+def input_length(conversation):
+    """Returns the number of tokens blenderbot is given for the conversation."""
+    tokenizer = chat_models.blenderbot.tokenizer
+    if isinstance(conversation, chat_models.ConversationHistory):
+        return len(conversation.input_ids(tokenizer, chat_models.blenderbot.model.config.max_position_embeddings))
+    return len(tokenizer.apply_chat_template(conversation, add_generation_prompt=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare blenderbot's response time over a long Conversation and ConversationHistory.")
+    parser.add_argument("--turns", type=int, default=60, help="number of messages the player sends (default: 60)")
+    parser.add_argument("--every", type=int, default=5, help="report every this many turns (default: 5)")
+    parser.add_argument("--local-models", help="folder of local models to use instead of downloading them, with a sub-folder named blenderbot")
+    args = parser.parse_args()
+
+    if args.local_models:
+        chat_models.model_sources["blenderbot"] = os.path.join(args.local_models, "blenderbot")
+    chat_models.blenderbot.load()
+
+    conversations = {"Conversation": Conversation(), "ConversationHistory": chat_models.ConversationHistory()}
+    failed = {}
+    rows = {}
+    for name, conversation in conversations.items():
+        conversation.append_response("Hey! I'm a conversational model. Wanna chat?")
+        for turn in range(1, args.turns + 1):
+            if name in failed:
+                break
+            conversation.add_user_input(PLAYER_INPUTS[turn % len(PLAYER_INPUTS)])
+            tokens = input_length(conversation)
+            start = time.perf_counter()
+            try:
+                chat_models.submit_batched("blenderbot", conversation).result()
+            except Exception as error:
+                failed[name] = f"{type(error).__name__} at turn {turn} ({tokens} tokens)"
+                continue
+            if turn % args.every == 0 or turn == 1:
+                rows.setdefault(turn, {})[name] = (tokens, (time.perf_counter() - start) * 1000)
+
+    print(f"{'turn':>6}" + "".join(f"{name + ' tokens':>28}{'ms':>10}" for name in conversations))
+    for turn, results in sorted(rows.items()):
+        cells = ""
+        for name in conversations:
+            tokens, milliseconds = results.get(name, ("-", float("nan")))
+            cells += f"{tokens:>28}{milliseconds:>10.1f}"
+        print(f"{turn:>6}{cells}")
+    for name, error in failed.items():
+        print(f"{name} failed: {error}")
+
+
+if __name__ == "__main__":
+    main()
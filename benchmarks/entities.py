@@ -0,0 +1,79 @@
+# Per-tick benchmark for moving many entities (entities.py)
+# Fills ai_game.py's map (with its wall) with wandering entities and times one tick - picking new directions, moving,
+# stopping at the wall and clamping to the map - for growing numbers of entities:
+#   - numpy: all entities at once with Entities.step()
+#   - one Rect at a time: a python loop over pygame.Rects with World.sweep() and clamp_ip(), the way ai_game.py moves
+#     the player (skipped above --max-loop entities, as it gets slow)
+# Both start from the same positions and get the same directions, so the last column checks they end up in the same places.
+
+# Run from the repository root:
+#   python benchmarks/entities.py
+#   python benchmarks/entities.py --counts 10 1000 100000 --ticks 200
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import numpy as np
+import pygame
+
+from entities import Entities
+from world import World
+
+# ai_game.py's wall, and the area the player is kept in
+WALL = pygame.Rect((200, 200), (10, 100))
+BOUNDS = pygame.Rect(0, 10, 1000, 530)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time one tick of moving many entities, with NumPy and one Rect at a time.")
+    parser.add_argument("--counts", nargs="+", type=int, default=[10, 100, 1000, 10000, 100000], help="numbers of entities (default: 10 to 100000)")
+    parser.add_argument("--ticks", type=int, default=100, help="ticks to time per count (default: 100)")
+    parser.add_argument("--max-loop", type=int, default=10000, help="largest count to also time one Rect at a time (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+
+    world = World()
+    world.add("wall", WALL, solid=True)
+
+    print(f"{'entities':>9}{'numpy (ms/tick)':>17}{'one Rect at a time (ms/tick)':>30}{'speed-up':>10}{'same':>6}")
+    for count in args.counts:
+        rng = np.random.default_rng(args.seed)
+        entities = Entities([WALL], BOUNDS)
+        entities.add([(int(x), int(y), 72, 72) for x, y in zip(rng.integers(0, 928, count), rng.integers(10, 468, count))])
+        rects = [entities.rect(i) for i in range(count)]
+        loop = count <= args.max_loop
+
+        numpy_time = loop_time = 0.0
+        for tick in range(args.ticks):
+            # the same directions for both
+            entities.wander(rng)
+            vx, vy = entities.vx.tolist(), entities.vy.tolist()
+
+            start = time.perf_counter()
+            entities.step()
+            numpy_time += time.perf_counter() - start
+
+            if loop:
+                start = time.perf_counter()
+                for i in range(count):
+                    rect = world.sweep(rects[i], vx[i], vy[i])
+                    rect.clamp_ip(BOUNDS)
+                    rects[i] = rect
+                loop_time += time.perf_counter() - start
+
+        numpy_ms = numpy_time / args.ticks * 1000
+        if loop:
+            loop_ms = loop_time / args.ticks * 1000
+            same = all(entities.rect(i) == rects[i] for i in range(count))
+            print(f"{count:>9}{numpy_ms:>17.3f}{loop_ms:>30.3f}{loop_ms / numpy_ms:>9.0f}x{str(same):>6}")
+        else:
+            print(f"{count:>9}{numpy_ms:>17.3f}{'-':>30}{'-':>10}{'-':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Frame-time benchmark for drawing the ai_game.py scene
+# Compares three ways of drawing a frame:
+#   - full redraw:       what ai_game.py used to do - fill the background and draw every item separately, every frame
+#   - background layer:  blit the pre-baked BackgroundLayer, then the things that move, over the whole screen
+#   - background + dirty rects: the same, but only where the screen has changed (DirtyRectRenderer)
+# each with the player walking around and with the player standing still.
+
+# Runs without a window (SDL dummy video driver). Run from the repository root:
+#   python benchmarks/frame_time.py
+#   python benchmarks/frame_time.py --frames 2000
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from rendering import BackgroundLayer, DirtyRectRenderer
+
+INSTRUCTIONS = "Use the arrow keys to move. When prompted, enter text and hit RETURN or ENTER."
+
+
+def load(name: str, size=None):
+    """Loads an image from ai_game_images, scaled to size if given."""
+    surface = pygame.image.load(os.path.join(ROOT, "ai_game_images", name)).convert_alpha()
+    if size is not None:
+        surface = pygame.transform.scale(surface, size)
+    return surface
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ways of drawing a frame of ai_game.py.")
+    parser.add_argument("--frames", type=int, default=1000, help="frames per case (default: 1000)")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((1000,700))
+    font = pygame.font.SysFont("lucidaconsole", 14)
+
+    # the same scene as ai_game.py
+    bear_surf = load("brown_bear.png")
+    tree_surf = load("tree.png")
+    lock_surf = load("lock.png", (72,72))
+    polar_surf = load("polar_bear.png")
+    robot_surf = load("robot.png", (72,72))
+    fox_surf = load("fox.png", (72,72))
+    moose_surf = load("moose.png", (72,72))
+    wall = pygame.Rect((200,200),(10,100))
+    text_box = pygame.Rect(10,540,690,150)
+    inventory_box = pygame.Rect(710,540,280,150)
+    static_items = [
+        (tree_surf, tree_surf.get_rect(center = (400,200))),
+        (lock_surf, lock_surf.get_rect(center = (150,300))),
+        (polar_surf, polar_surf.get_rect(center = (600,100))),
+        (robot_surf, robot_surf.get_rect(center = (800,300))),
+        (fox_surf, fox_surf.get_rect(center = (900,450))),
+        (moose_surf, moose_surf.get_rect(center = (500,450))),
+    ]
+    text_lines = ["P. Bear: Hey! I'm a conversational model. Wanna chat?", "You: "]
+
+    def draw_static(surface):
+        pygame.draw.rect(surface, (191,180,214), surface.get_rect())
+        surface.blit(font.render(INSTRUCTIONS, True, "black"), (0,0))
+        pygame.draw.rect(surface, (214,201,240), text_box)
+        pygame.draw.rect(surface, (214,201,240), inventory_box)
+        surface.blit(font.render("INVENTORY:", True, "red"), (710,540))
+        pygame.draw.rect(surface, (154, 146, 173), wall)
+        for item_surf, item_loc in static_items:
+            surface.blit(item_surf, item_loc)
+
+    background = BackgroundLayer(screen.get_size(), draw_static)
+    rendered_text = [font.render(line, True, "blue") for line in text_lines]
+    title = font.render("PLAYER BEAR: ", True, "red")
+
+    def draw_dynamic(bear_loc):
+        screen.blit(bear_surf, bear_loc)
+        screen.blit(title, (10,540))
+        for i, line in enumerate(rendered_text):
+            screen.blit(line, (10, 560 + 20 * i))
+
+    def full_redraw(bear_loc):
+        # the old frame: everything drawn separately and the whole display updated
+        pygame.draw.rect(screen, (191,180,214), screen.get_rect())
+        screen.blit(font.render(INSTRUCTIONS, True, "black"), (0,0))
+        pygame.draw.rect(screen, (214,201,240), text_box)
+        pygame.draw.rect(screen, (214,201,240), inventory_box)
+        pygame.draw.rect(screen, (154, 146, 173), wall)
+        screen.blit(bear_surf, bear_loc)
+        for item_surf, item_loc in static_items:
+            screen.blit(item_surf, item_loc)
+        screen.blit(font.render("PLAYER BEAR: ", True, "red"), (10,540))
+        screen.blit(font.render("INVENTORY:", True, "red"), (710,540))
+        for i, line in enumerate(text_lines):
+            screen.blit(font.render(line, True, "blue"), (10, 560 + 20 * i))
+        pygame.display.update()
+
+    def background_layer(bear_loc):
+        background.draw(screen)
+        draw_dynamic(bear_loc)
+        pygame.display.update()
+
+    renderer = DirtyRectRenderer(screen)
+
+    def dirty_rects(bear_loc):
+        renderer.track("bear", bear_loc)
+        renderer.track("text box", text_box, tuple(text_lines))
+        pygame.display.update(renderer.redraw(lambda: (background.draw(screen), draw_dynamic(bear_loc))))
+
+    def run(draw_frame, moving: bool):
+        bear_loc = pygame.Rect(0, 10, 72, 72)
+        # one frame first, so one-off work (the first full redraw, baking the background) is not timed
+        draw_frame(bear_loc)
+        start = time.perf_counter()
+        for frame in range(args.frames):
+            if moving:
+                # walk back and forth along the top of the window, 10 pixels a frame like the game
+                bear_loc = bear_loc.move([10 if (frame // 90) % 2 == 0 else -10, 0])
+            draw_frame(bear_loc)
+        return (time.perf_counter() - start) / args.frames * 1000
+
+    print(f"{'case':<28}{'moving (ms/frame)':>20}{'standing (ms/frame)':>22}")
+    for name, draw_frame in (("full redraw", full_redraw), ("background layer", background_layer), ("background + dirty rects", dirty_rects)):
+        print(f"{name:<28}{run(draw_frame, True):>20.3f}{run(draw_frame, False):>22.3f}")
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
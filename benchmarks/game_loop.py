@@ -0,0 +1,296 @@
+# Headless benchmark harness for the event loops in ai_game.py and simple_pygame.py
+# Runs a game without a window (SDL dummy video driver), replays a scripted sequence of arrow-key and text events
+# (the same keys and text on every run), and reports how long each section of the event loop took, using the game's
+# FrameProfiler (see profiling.py).
+
+# For ai_game.py, the chat_models pipelines are replaced with stubs that answer after a fixed delay, so the benchmark
+# measures the game and not the models. Small local models can be used instead with --local-models.
+
+# The clock is not limited to 60 FPS unless --fps is given, so the timings show the real cost of each frame.
+# The game's fixed timestep (see timestep.py) is given a scripted clock that moves on by one tick on every frame, so the
+# player moves the same way on every run however long the frames take - unless --real-time is given.
+
+# Run from anywhere:
+#   python benchmarks/game_loop.py                      (ai_game.py, stub models)
+#   python benchmarks/game_loop.py --game simple_pygame
+#   python benchmarks/game_loop.py --stub-latency 0.5 --json results.json
+#   python benchmarks/game_loop.py --local-models path/to/models   (folders named blenderbot, qa_chatbot, fm_chatbot, tg_chatbot)
+#   python benchmarks/game_loop.py --overlay --trace trace.json    (profiler overlay on, timeline saved for chrome://tracing)
+
+import argparse
+import json
+import os
+import random
+import runpy
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# keep the game's response cache in memory, so runs do not depend on (or add to) responses stored by earlier runs
+os.environ.setdefault("CHAT_MODELS_RESPONSE_CACHE", ":memory:")
+
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, QUIT, TEXTINPUT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# task for each chatbot, used when loading local models
+TASKS = {
+    "blenderbot": "conversational",
+    "qa_chatbot": "question-answering",
+    "fm_chatbot": "fill-mask",
+    "tg_chatbot": "text-generation",
+}
+
+
+# -------------------------------------SCRIPTED INPUT--------------------------------------------- #
+
+class Script:
+    """
+    A sequence of frames of player input. Each frame has the set of arrow keys held down and a list of events.
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def hold(self, keys, frames: int):
+        """Holds keys (e.g. (pygame.K_RIGHT,)) down for a number of frames."""
+        for i in range(frames):
+            self.frames.append((frozenset(keys), []))
+        return self
+
+    def wait(self, frames: int):
+        """Does nothing for a number of frames."""
+        return self.hold((), frames)
+
+    def press(self, key: int, unicode: str=""):
+        """Presses and releases a key on one frame."""
+        self.frames.append((frozenset(), [pygame.event.Event(KEYDOWN, key=key, mod=0, unicode=unicode),
+                                          pygame.event.Event(KEYUP, key=key, mod=0)]))
+        return self
+
+    def type(self, text: str):
+        """Types text one character per frame (KEYDOWN and TEXTINPUT, like a real keyboard), then presses RETURN."""
+        for character in text:
+            self.frames.append((frozenset(), [pygame.event.Event(KEYDOWN, key=ord(character.lower()), mod=0, unicode=character),
+                                              pygame.event.Event(TEXTINPUT, text=character)]))
+        self.press(pygame.K_RETURN, "\r")
+        return self
+
+
+def ai_game_script(rounds: int, overlay: bool=False):
+    """
+    Walks the player to each NPC in ai_game.py, talks to it, then climbs the tree and opens the lock.
+    If overlay is True, F3 is pressed first to show the profiler overlay.
+    """
+    script = Script()
+    if overlay:
+        # after one frame, once the game has set up its collision flags
+        script.wait(1).press(pygame.K_F3)
+    for i in range(rounds):
+        # Polar Bear
+        script.hold((pygame.K_RIGHT,), 55).type("hi there, how are you?").wait(30)
+        # Robot
+        script.hold((pygame.K_DOWN,), 20).hold((pygame.K_RIGHT,), 20).type("what is an npc?").wait(30)
+        # Fox
+        script.hold((pygame.K_DOWN,), 15).hold((pygame.K_RIGHT,), 10).type("the bear sat on a <mask>.").wait(30)
+        # Moose - continue the story twice, then reset it
+        script.hold((pygame.K_LEFT,), 40).type("").wait(60).type("").wait(60).press(pygame.K_BACKSPACE).wait(10)
+        # tree and lock (only the first round changes anything)
+        script.hold((pygame.K_UP,), 16).press(pygame.K_y).wait(10).hold((pygame.K_DOWN,), 13).hold((pygame.K_LEFT,), 35)
+        script.press(pygame.K_y).wait(10).hold((pygame.K_UP,), 20)
+        # back to the top left corner, standing still for a while
+        script.hold((pygame.K_UP, pygame.K_LEFT), 40).wait(120)
+    return script
+
+
+def simple_pygame_script(rounds: int):
+    """
+    Climbs the tree and opens the lock in simple_pygame.py, walking around in between.
+    """
+    script = Script()
+    for i in range(rounds):
+        script.hold((pygame.K_RIGHT,), 33).hold((pygame.K_DOWN,), 13).press(pygame.K_y).wait(10)
+        script.hold((pygame.K_DOWN,), 25).hold((pygame.K_LEFT,), 25).press(pygame.K_y).wait(10)
+        script.hold((pygame.K_UP,), 20).hold((pygame.K_UP, pygame.K_LEFT), 40).wait(120)
+    return script
+
+
+class ScriptedKeys:
+    """Stands in for the result of pygame.key.get_pressed(), for the keys held down on the current frame."""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ScriptedInput:
+    """
+    Replaces pygame.event.get and pygame.key.get_pressed with the frames of a Script. The game calls pygame.event.get()
+    once per frame, so each call moves on to the next frame. After the last frame, a QUIT event ends the game.
+    """
+
+    def __init__(self, script: Script):
+        self.script = script
+        self.frame = 0
+        self.keys = ScriptedKeys(frozenset())
+        self._get_events = pygame.event.get
+
+    def install(self, real_time: bool=False):
+        pygame.event.get = self.get_events
+        pygame.key.get_pressed = lambda: self.keys
+        if not real_time:
+            import timestep
+            timestep.time_source = self.time
+
+    def time(self, tick_rate: int=60):
+        """Stands in for the game's clock (timestep.time_source): one tick has passed for each frame so far."""
+        return self.frame / tick_rate
+
+    def get_events(self, *args, **kwargs):
+        # empty the real event queue, so it does not fill up
+        self._get_events()
+
+        if self.frame >= len(self.script.frames):
+            return [pygame.event.Event(QUIT)]
+
+        keys, events = self.script.frames[self.frame]
+        self.frame += 1
+        self.keys = ScriptedKeys(keys)
+        return list(events)
+
+
+class UnlimitedClock:
+    """Stands in for pygame.time.Clock without limiting the frame rate, so every frame runs as fast as it can."""
+
+    def tick(self, framerate: int=0):
+        return 0
+
+    def get_fps(self):
+        return 0.0
+
+
+# -------------------------------------STUB MODELS--------------------------------------------- #
+
+def install_stub_models(latency: float, skip=()):
+    """
+    Replaces the four chatbots (and the Moose's streaming generation) with stubs that wait for latency seconds,
+    then give a fixed response. Chatbots named in skip are left alone.
+    """
+    import chat_models
+
+    def blenderbot(conversation):
+        time.sleep(latency)
+        conversation.append_response("That sounds great! I love talking about the weather and fishing.")
+        return conversation
+
+    def qa_chatbot(question, context):
+        time.sleep(latency)
+        return {"score": 1.0, "start": 0, "end": 0, "answer": "non-player character"}
+
+    def fm_chatbot(text):
+        time.sleep(latency)
+        words = ["mat", "chair", "rock", "log", "bed"]
+        return [{"score": 0.2, "token": i, "token_str": " " + word, "sequence": text.replace("<mask>", word)} for i, word in enumerate(words)]
+
+    def tg_chatbot(story, max_new_tokens=35, **kwargs):
+        return [{"generated_text": story + "".join(generate_story_tokens(story, 0, max_new_tokens))}]
+
+    def generate_story_tokens(story, seed, max_new_tokens=35):
+        # the story grows one word at a time, over latency seconds in total
+        rng = random.Random(seed + len(story))
+        for i in range(max_new_tokens):
+            time.sleep(latency / max_new_tokens)
+            yield " " + rng.choice(["the", "moose", "walked", "into", "a", "forest", "and", "found", "honey."])
+
+    stubs = {"blenderbot": blenderbot, "qa_chatbot": qa_chatbot, "fm_chatbot": fm_chatbot, "tg_chatbot": tg_chatbot}
+    for name, stub in stubs.items():
+        if name not in skip:
+            chat_models.use_pipeline(name, stub)
+
+    # the Moose looks generate_story_tokens up on chat_models each time it continues the story (see npcs.StoryNPC)
+    if "tg_chatbot" not in skip:
+        chat_models.generate_story_tokens = generate_story_tokens
+
+
+def install_local_models(directory: str):
+    """
+    Replaces each chatbot that has a folder in directory (e.g. directory/tg_chatbot) with a pipeline loaded from that folder.
+
+    Returns:
+    - names (list[str]): the chatbots that were replaced
+    """
+    import chat_models
+    from transformers import pipeline
+
+    names = []
+    for name, task in TASKS.items():
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            kwargs = {"do_sample": True} if task == "text-generation" else {}
+            local_pipeline = pipeline(task=task, model=path, **kwargs)
+            # load it in the precision chosen for the chatbot (see chat_models.set_precision)
+            local_pipeline.model = chat_models.convert_model(local_pipeline.model, chat_models.precision[name])
+            if task == "question-answering":
+                # answer from the cached context, like the game's own qa_chatbot
+                local_pipeline = chat_models.QAEngine(local_pipeline, chat_models.context)
+            chat_models.use_pipeline(name, local_pipeline)
+            print(f"using local model for {name}: {path}")
+            names.append(name)
+    return names
+
+
+# -------------------------------------RUNNING THE BENCHMARK--------------------------------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted input through a game's event loop and time each section.")
+    parser.add_argument("--game", choices=["ai_game", "simple_pygame"], default="ai_game", help="game to run (default: ai_game)")
+    parser.add_argument("--rounds", type=int, default=3, help="number of times to repeat the input script (default: 3)")
+    parser.add_argument("--fps", type=int, default=0, help="limit the frame rate like the game does, e.g. 60 (default: no limit)")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds each stub model takes to respond (default: 0.05)")
+    parser.add_argument("--local-models", help="folder of local models to use instead of stubs, one sub-folder per chatbot")
+    parser.add_argument("--seed", type=int, default=0, help="seed for python's random module (default: 0)")
+    parser.add_argument("--json", help="also write the timings to this JSON file")
+    parser.add_argument("--overlay", action="store_true", help="show the profiler overlay in ai_game.py while it runs (F3)")
+    parser.add_argument("--trace", help="also write a Chrome trace of every frame to this file (chrome://tracing, ui.perfetto.dev)")
+    parser.add_argument("--real-time", action="store_true", help="run the game's ticks on the real clock instead of one per frame")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    random.seed(args.seed)
+
+    if args.game == "ai_game":
+        local_models = install_local_models(args.local_models) if args.local_models else []
+        install_stub_models(args.stub_latency, skip=local_models)
+        script = ai_game_script(args.rounds, args.overlay)
+    else:
+        script = simple_pygame_script(args.rounds)
+
+    ScriptedInput(script).install(args.real_time)
+    if args.fps == 0:
+        pygame.time.Clock = UnlimitedClock
+
+    start = time.perf_counter()
+    game = runpy.run_path(os.path.join(ROOT, args.game + ".py"), run_name="__main__")
+    seconds = time.perf_counter() - start
+
+    profiler = game["profiler"]
+    timestep = game["timestep"]
+    print(f"{args.game}: {len(script.frames)} scripted frames in {seconds:.2f} s, {timestep.ticks} ticks ({timestep.dropped:.2f} s dropped)")
+    print(profiler.report())
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"game": args.game, "frames": len(script.frames), "ticks": timestep.ticks, "seconds": seconds,
+                       "sections": profiler.summary()}, file, indent=2)
+
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Keyboard input benchmark for input_handling.py
+# Times handling one frame's worth of keyboard events while the player is talking to an NPC, for growing bursts of
+# events - as if the player pasted text, or kept typing during a slow frame:
+#   - if-chain: the event loop ai_game.py used to have - every KEYDOWN checked against the tree, the lock and the NPCs,
+#     and each letter added with input_text += letter
+#   - InputHandler: keys looked up in a table, typed text (TEXTINPUT) added to a TextBuffer in one go
+# Each burst is a real keyboard's events for some text (KEYDOWN, TEXTINPUT and KEYUP per letter), followed by a
+# run of BACKSPACE presses. Both end up with the same text, which the last column checks.
+
+# Run from the repository root:
+#   python benchmarks/input_burst.py
+#   python benchmarks/input_burst.py --events 100 10000 --repeats 50
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, TEXTINPUT
+
+from input_handling import InputHandler, TextBuffer
+
+TEXT = "the bear sat on a <mask> by the lake. "
+
+
+def burst(letters: int):
+    """Returns the events for typing letters letters of TEXT, then pressing BACKSPACE letters // 10 times."""
+    events = []
+    for i in range(letters):
+        letter = TEXT[i % len(TEXT)]
+        events.append(pygame.event.Event(KEYDOWN, key=ord(letter), mod=0, unicode=letter))
+        events.append(pygame.event.Event(TEXTINPUT, text=letter))
+        events.append(pygame.event.Event(KEYUP, key=ord(letter), mod=0))
+    for i in range(letters // 10):
+        events.append(pygame.event.Event(KEYDOWN, key=pygame.K_BACKSPACE, mod=0, unicode="\b"))
+        events.append(pygame.event.Event(KEYUP, key=pygame.K_BACKSPACE, mod=0))
+    return events
+
+
+def if_chain(events):
+    """ai_game.py's old event loop, talking to an NPC. Returns the typed text."""
+    input_text = ""
+    # talking to the Fox
+    collide_tree = collide_lock = collide_polar = collide_robot = collide_moose = False
+    collide_fox = True
+    climb_tree = open_lock = "None"
+    new_user_input = False
+    for event in events:
+        if event.type == pygame.QUIT:
+            pass
+        if event.type == KEYDOWN and collide_tree == True:
+            if event.key == pygame.K_y:
+                climb_tree = "Yes"
+            elif event.key == pygame.K_n:
+                climb_tree = "No"
+        if event.type == KEYDOWN and collide_lock == True:
+            if event.key == pygame.K_y:
+                open_lock = "Yes"
+            elif event.key == pygame.K_n:
+                open_lock = "No"
+        if event.type == KEYDOWN:
+            if collide_polar == True or collide_robot == True or collide_fox == True or collide_moose == True:
+                if event.key == pygame.K_RETURN:
+                    new_user_input = True
+                elif event.key == pygame.K_BACKSPACE:
+                    input_text = input_text[:-1]
+                else:
+                    input_text += event.unicode
+    return input_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time one frame of keyboard events with the old if-chain and with InputHandler.")
+    parser.add_argument("--events", nargs="+", type=int, default=[10, 100, 1000, 10000], help="letters typed per frame (default: 10 to 10000)")
+    parser.add_argument("--repeats", type=int, default=20, help="frames to time per burst size (default: 20)")
+    args = parser.parse_args()
+
+    buffer = TextBuffer()
+    handler = InputHandler()
+    handler.bind_text("npc", buffer)
+    handler.bind("npc", pygame.K_RETURN, lambda presses: None, coalesce=True)
+    handler.bind("npc", pygame.K_BACKSPACE, buffer.backspace, coalesce=True)
+    handler.bind("tree", pygame.K_y, lambda presses: None, coalesce=True)
+    handler.bind("lock", pygame.K_y, lambda presses: None, coalesce=True)
+    handler.contexts = ("npc",)
+
+    print(f"{'letters':>8}{'events':>8}{'if-chain (ms)':>15}{'InputHandler (ms)':>19}{'speed-up':>10}{'same':>6}")
+    for letters in args.events:
+        events = burst(letters)
+
+        start = time.perf_counter()
+        for i in range(args.repeats):
+            expected = if_chain(events)
+        chain_ms = (time.perf_counter() - start) / args.repeats * 1000
+
+        start = time.perf_counter()
+        for i in range(args.repeats):
+            buffer.clear()
+            handler.handle(events)
+            text = buffer.text
+        handler_ms = (time.perf_counter() - start) / args.repeats * 1000
+
+        print(f"{letters:>8}{len(events):>8}{chain_ms:>15.3f}{handler_ms:>19.3f}{chain_ms / handler_ms:>9.1f}x{str(text == expected):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Cold- and warm-start loading benchmark for the models in chat_models.py
+# Loads each chatbot in a fresh python process and reports how long each step of loading it took (see
+# chat_models.load_times): importing transformers, finding the files, reading the config, the tokenizer, the weights,
+# converting the precision and building the pipeline.
+#   - cold: the model's files have just been dropped from the operating system's file cache, as after a reboot
+#   - warm: the files are still in the file cache from the run before, as when the game is restarted
+# Both are run with the fast loader (memory-mapped safetensors, "mmap") and with plain from_pretrained(), to compare them.
+
+# The model files are downloaded (if needed) by an untimed run first. Cold starts only drop the model's own files from
+# the file cache; run as root with --drop-caches to drop everything (python, torch and transformers too).
+
+# Run from the repository root:
+#   python benchmarks/model_loading.py
+#   python benchmarks/model_loading.py --models tg_chatbot --warm-runs 5
+#   python benchmarks/model_loading.py --local-models path/to/models   (folders named blenderbot, qa_chatbot, fm_chatbot, tg_chatbot)
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NAMES = ["blenderbot", "qa_chatbot", "fm_chatbot", "tg_chatbot"]
+
+# the steps of loading a model, in order (see chat_models.load_parts)
+STEPS = ["import", "resolve", "config", "tokenizer", "weights", "convert", "pipeline"]
+
+# the two ways of loading the models: chat_models.fast_loading on and off
+LOADERS = {"mmap": True, "from_pretrained": False}
+
+
+def run_child(name: str, fast: bool, local_models):
+    """
+    Runs in the child process: loads one chatbot and prints how long it took as JSON.
+    """
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import resource
+    import chat_models
+
+    chat_models.fast_loading = fast
+    if local_models:
+        chat_models.model_sources[name] = os.path.join(local_models, name)
+    chat_models.models[name].load()
+
+    print(json.dumps({
+        "total": time.perf_counter() - start,
+        "steps": chat_models.load_times[name],
+        "weights_loaded_by": chat_models.weights_loaded_by[name],
+        "folder": chat_models._local_folder(chat_models.model_sources[name]),
+        "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def load_in_child(name: str, fast: bool, local_models):
+    """Loads a chatbot in a fresh python process and returns the child's results (see run_child)."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, str(int(fast))]
+    if local_models:
+        command += ["--local-models", os.path.abspath(local_models)]
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def drop_from_file_cache(folder: str, everything: bool):
+    """
+    Drops a model's files (or, with everything, every file) from the operating system's file cache, so the next load
+    has to read them from disk.
+    """
+    if everything:
+        # needs root
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as file:
+            file.write("3\n")
+        return
+    for directory, subdirectories, files in os.walk(folder):
+        for file_name in files:
+            # the files in the HuggingFace cache are links - open() follows them to the real file
+            with open(os.path.join(directory, file_name), "rb") as file:
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold- and warm-start loading times of the chat_models chatbots.")
+    parser.add_argument("--models", nargs="+", choices=NAMES, default=NAMES, help="chatbots to load (default: all)")
+    parser.add_argument("--loaders", nargs="+", choices=list(LOADERS), default=list(LOADERS), help="loaders to compare (default: both)")
+    parser.add_argument("--warm-runs", type=int, default=3, help="warm-start runs per chatbot and loader - the median is shown (default: 3)")
+    parser.add_argument("--drop-caches", action="store_true", help="drop the whole file cache before cold starts (needs root)")
+    parser.add_argument("--local-models", help="folder of local models to use instead of downloading them, one sub-folder per chatbot")
+    parser.add_argument("--child", nargs=2, metavar=("NAME", "FAST"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1] == "1", args.local_models)
+        return
+
+    print(f"{'chatbot':<12}{'loader':>16}{'start':>7}{'total (s)':>11}" + "".join(f"{step:>11}" for step in STEPS) + f"{'peak RSS (MB)':>15}")
+    for name in args.models:
+        for loader in args.loaders:
+            fast = LOADERS[loader]
+            # untimed: downloads the model if needed, and finds its files
+            folder = load_in_child(name, fast, args.local_models)["folder"]
+
+            drop_from_file_cache(folder, args.drop_caches)
+            runs = {"cold": [load_in_child(name, fast, args.local_models)]}
+            runs["warm"] = [load_in_child(name, fast, args.local_models) for i in range(args.warm_runs)]
+
+            for start, results in runs.items():
+                # the run with the median total time
+                result = sorted(results, key=lambda result: result["total"])[len(results) // 2]
+                steps = "".join(f"{result['steps'].get(step, 0.0):>11.3f}" for step in STEPS)
+                # the loader that actually loaded the weights ("mmap" falls back to from_pretrained without model.safetensors)
+                print(f"{name:<12}{result['weights_loaded_by']:>16}{start:>7}{result['total']:>11.3f}{steps}{result['peak']:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
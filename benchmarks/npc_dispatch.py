@@ -0,0 +1,99 @@
+# Per-frame cost of the NPCs in ai_game.py's event loop (npcs.py) as the number of NPCs grows
+# Fills maps of growing size with NPCs (at the same density as ai_game.py's map), walks the player across the map, and
+# times the NPC part of each frame - checking for finished responses, preloading the models of nearby NPCs, and
+# updating the NPC the player is touching:
+#   - every NPC: a loop over all the NPCs with a colliderect() check for each, the way ai_game.py's four NPC sections
+#     worked (one section per NPC)
+#   - registry: World.query() finds the NPCs near and touching the player, and NPCRegistry only deals with those
+#     (and with the NPCs waiting for their model)
+# The models are stubs that do nothing, so only the game's own work is timed.
+
+# Run from the repository root:
+#   python benchmarks/npc_dispatch.py
+#   python benchmarks/npc_dispatch.py --npcs 4 40 400 --frames 5000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+from npcs import NPC, NPCRegistry, KINDS
+from world import World
+
+# ai_game.py has 4 NPCs (and 3 other objects) on a 1000 x 530 map
+MAP_AREA_PER_NPC = 1000 * 530 / 4
+
+# ai_game.PRELOAD_DISTANCE
+PRELOAD_DISTANCE = 300
+
+
+class StubModel:
+    """Stands in for a chat_models.LazyPipeline."""
+
+    name = "stub"
+
+    def preload(self):
+        pass
+
+
+def write_lines(lines, x, y, colour="black"):
+    """Stands in for ai_game.write_lines."""
+    return y + 20 * len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the NPC part of the event loop for growing numbers of NPCs.")
+    parser.add_argument("--npcs", nargs="+", type=int, default=[4, 16, 64, 256, 1024], help="numbers of NPCs (default: 4 to 1024)")
+    parser.add_argument("--frames", type=int, default=2000, help="frames to time per count (default: 2000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+
+    model = StubModel()
+    ask, formatter = KINDS["question-answering"]
+
+    print(f"{'npcs':>6}{'every NPC (us/frame)':>22}{'registry (us/frame)':>21}{'speed-up':>10}")
+    for count in args.npcs:
+        random.seed(args.seed)
+        size = int((count * MAP_AREA_PER_NPC) ** 0.5)
+        world = World()
+        registry = NPCRegistry()
+        for i in range(count):
+            rect = pygame.Rect(random.randrange(size), random.randrange(size), 72, 72)
+            npc = NPC(f"npc {i}", "NPC", "NPC", None, rect, model, "Hello!", ask, formatter)
+            registry.add(npc)
+            world.add(npc.name, rect)
+        everyone = list(registry)
+        # the player walks in a straight line across the map, a little further each frame
+        players = [pygame.Rect(size * frame // args.frames, size * frame // args.frames, 72, 72) for frame in range(args.frames)]
+
+        start = time.perf_counter()
+        for player in players:
+            near = player.inflate(PRELOAD_DISTANCE, PRELOAD_DISTANCE)
+            for npc in everyone:
+                npc.poll()
+                if near.colliderect(npc.rect):
+                    npc.model.preload()
+                if player.colliderect(npc.rect):
+                    npc.update(write_lines, "", False)
+        every_us = (time.perf_counter() - start) / args.frames * 1e6
+
+        start = time.perf_counter()
+        for player in players:
+            registry.poll()
+            for npc in registry.nearby(world.query(player.inflate(PRELOAD_DISTANCE, PRELOAD_DISTANCE))):
+                npc.model.preload()
+            for npc in registry.touching(world.query(player)):
+                registry.update(npc, write_lines, "", False)
+        registry_us = (time.perf_counter() - start) / args.frames * 1e6
+
+        print(f"{count:>6}{every_us:>22.2f}{registry_us:>21.2f}{every_us / registry_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Accuracy, latency and memory comparison of the model precisions in chat_models.py (fp32, int8 and bf16)
+# For each chatbot and precision, loads the model in a fresh python process (so the memory of one run does not count
+# towards the next), answers a fixed set of player inputs, and reports:
+#   - load (s):        time to load the model and convert it to the precision
+#   - latency (ms):    median time per response
+#   - model (MB):      size of the model's weights
+#   - peak RSS (MB):   peak memory of the whole process
+#   - same as fp32:    how many of the responses are exactly the same as in fp32
+# Text generation is greedy here (no sampling), so its responses can be compared.
+
+# Run from the repository root:
+#   python benchmarks/precision.py                                   (downloads the real models)
+#   python benchmarks/precision.py --models tg_chatbot qa_chatbot --modes fp32 int8
+#   python benchmarks/precision.py --local-models path/to/models     (folders named blenderbot, qa_chatbot, fm_chatbot, tg_chatbot)
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what the player says to each chatbot
+PLAYER_INPUTS = {
+    "blenderbot": ["Hi! How are you?", "Do you like fishing?", "What is your favourite food?", "It is very cold today."],
+    "qa_chatbot": ["What is an NPC?", "What does the Robot do?", "Where is the key?", "What model does the Fox use?"],
+    "fm_chatbot": ["The bear sat on a <mask>.", "I like to eat <mask> for breakfast.", "The <mask> is very tall.", "Open the lock with the <mask>."],
+    "tg_chatbot": ["Once upon a time,", "Once upon a time, a bear", "The robot walked into the forest and", "In the winter, the moose"],
+}
+
+
+def respond(name: str, chatbot, text: str):
+    """Returns the part of a chatbot's response to text that the game shows."""
+    import chat_models
+    from transformers import Conversation
+
+    if name == "blenderbot":
+        return chatbot(Conversation(text)).generated_responses[-1]
+    if name == "qa_chatbot":
+        # answer with the model every time, not from the answer cache
+        if isinstance(chatbot.load(), chat_models.QAEngine):
+            chatbot.load().clear()
+        return chatbot(text, chat_models.context)["answer"]
+    if name == "fm_chatbot":
+        return chatbot(text)[0]["token_str"]
+    return chatbot(text, max_new_tokens=20, do_sample=False)[0]["generated_text"]
+
+
+def run_child(name: str, mode: str, repeats: int, local_models):
+    """
+    Runs in the child process: loads one chatbot in one precision, times its responses and prints the results as JSON.
+    """
+    sys.path.insert(0, ROOT)
+    import resource
+    import torch
+    import chat_models
+
+    chat_models.set_precision(name, mode)
+    start = time.perf_counter()
+    if local_models:
+        sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+        from game_loop import install_local_models
+        install_local_models(local_models)
+    chatbot = chat_models.models[name]
+    chatbot.load()
+    load_seconds = time.perf_counter() - start
+
+    # the size of the weights, as saved by torch (int8 weights are stored packed)
+    buffer = io.BytesIO()
+    torch.save(chatbot.model.state_dict(), buffer)
+
+    responses = []
+    latencies = []
+    for text in PLAYER_INPUTS[name]:
+        # the first response is not timed (one-off work like allocating memory)
+        responses.append(respond(name, chatbot, text))
+        for i in range(repeats):
+            start = time.perf_counter()
+            respond(name, chatbot, text)
+            latencies.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "load": load_seconds,
+        "latency": statistics.median(latencies) * 1000,
+        "model": buffer.tell() / 1e6,
+        "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "responses": responses,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fp32, int8 and bf16 versions of the chat_models chatbots.")
+    parser.add_argument("--models", nargs="+", choices=list(PLAYER_INPUTS), default=list(PLAYER_INPUTS), help="chatbots to compare (default: all)")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "int8", "bf16"], help="precisions to compare (default: fp32 int8 bf16)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed responses per input (default: 3)")
+    parser.add_argument("--local-models", help="folder of local models to use instead of downloading them, one sub-folder per chatbot")
+    parser.add_argument("--child", nargs=2, metavar=("NAME", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.repeats, args.local_models)
+        return
+
+    modes = ["fp32"] + [mode for mode in args.modes if mode != "fp32"]
+    print(f"{'chatbot':<12}{'precision':>10}{'load (s)':>10}{'latency (ms)':>14}{'model (MB)':>12}{'peak RSS (MB)':>15}{'same as fp32':>14}")
+    for name in args.models:
+        reference = None
+        for mode in modes:
+            command = [sys.executable, os.path.abspath(__file__), "--child", name, mode, "--repeats", str(args.repeats)]
+            if args.local_models:
+                command += ["--local-models", os.path.abspath(args.local_models)]
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+
+            if reference is None:
+                reference = result["responses"]
+            same = sum(response == expected for response, expected in zip(result["responses"], reference))
+            print(f"{name:<12}{mode:>10}{result['load']:>10.2f}{result['latency']:>14.2f}{result['model']:>12.1f}"
+                  f"{result['peak']:>15.0f}{f'{same}/{len(reference)}':>14}")
+
+
+if __name__ == "__main__":
+    main()
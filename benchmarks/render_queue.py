@@ -0,0 +1,84 @@
+# Drawing benchmark for RenderQueue (rendering.py)
+# Draws growing numbers of sprites (72 x 72 pixels, ai_game.py's NPC size, unless --size is given) at random positions
+# on a window-sized surface, and times one frame of drawing them:
+#   - one blit at a time: a screen.blit() call per sprite, as ai_game.py used to draw
+#   - render queue: adding every sprite to a RenderQueue and drawing it with one Surface.blits() call
+#   - drawn again: drawing a queue that was filled on an earlier frame - as ai_game.py does for the second and later
+#     dirty rectangles of a frame (see DirtyRectRenderer.redraw)
+# Both draw the same sprites in the same order, so the last column checks they give the same picture.
+# With big sprites most of the time goes into copying pixels, which is the same both ways - use a small --size to see
+# the cost of the python calls on their own.
+
+# Run from the repository root:
+#   python benchmarks/render_queue.py
+#   python benchmarks/render_queue.py --counts 10 100 1000 --frames 200
+#   python benchmarks/render_queue.py --size 4
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+from rendering import RenderQueue
+
+IMAGES = ["brown_bear.png", "polar_bear.png", "robot.png", "fox.png", "moose.png", "key.png", "lock.png"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one blit per sprite with one RenderQueue draw per frame.")
+    parser.add_argument("--counts", nargs="+", type=int, default=[7, 50, 200, 1000, 5000], help="numbers of sprites (default: 7 to 5000)")
+    parser.add_argument("--frames", type=int, default=100, help="frames to time per count (default: 100)")
+    parser.add_argument("--size", type=int, default=72, help="width and height of the sprites in pixels (default: 72)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((1000, 700))
+    images = [pygame.transform.scale(pygame.image.load(os.path.join(ROOT, "ai_game_images", name)).convert_alpha(), (args.size, args.size))
+              for name in IMAGES]
+
+    print(f"{'sprites':>8}{'one blit at a time (ms)':>25}{'render queue (ms)':>19}{'drawn again (ms)':>18}{'same':>6}")
+    for count in args.counts:
+        random.seed(args.seed)
+        sprites = [(random.choice(images), (random.randrange(1000 - args.size), random.randrange(700 - args.size)), random.randrange(3)) for i in range(count)]
+        # one blit at a time has to be called in layer order
+        in_layer_order = sorted(sprites, key=lambda sprite: sprite[2])
+        queue = RenderQueue()
+
+        start = time.perf_counter()
+        for frame in range(args.frames):
+            screen.fill("white")
+            for surface, position, layer in in_layer_order:
+                screen.blit(surface, position)
+        blit_ms = (time.perf_counter() - start) / args.frames * 1000
+        expected = pygame.image.tobytes(screen, "RGB")
+
+        start = time.perf_counter()
+        for frame in range(args.frames):
+            screen.fill("white")
+            queue.clear()
+            for surface, position, layer in sprites:
+                queue.add(surface, position, layer)
+            queue.draw(screen)
+        queue_ms = (time.perf_counter() - start) / args.frames * 1000
+        same = pygame.image.tobytes(screen, "RGB") == expected
+
+        start = time.perf_counter()
+        for frame in range(args.frames):
+            screen.fill("white")
+            queue.draw(screen)
+        again_ms = (time.perf_counter() - start) / args.frames * 1000
+        same = same and pygame.image.tobytes(screen, "RGB") == expected
+
+        print(f"{count:>8}{blit_ms:>25.3f}{queue_ms:>19.3f}{again_ms:>18.3f}{str(same):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Collision query benchmark for world.py
+# Fills maps of growing size with objects (at the same density as ai_game.py's map), then times finding the objects the
+# player touches and the objects near the player, both by checking every object (as ai_game.py used to, with one
+# colliderect() call per object) and with World.query(), which only checks the objects in nearby grid cells.
+
+# Run from the repository root:
+#   python benchmarks/spatial_index.py
+#   python benchmarks/spatial_index.py --objects 10 100 1000 10000 --queries 5000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+from world import World
+
+# ai_game.py has 7 objects on a 1000 x 530 map
+MAP_AREA_PER_OBJECT = 1000 * 530 / 7
+
+# how far away an NPC is "near" the player (ai_game.PRELOAD_DISTANCE)
+NEAR_DISTANCE = 300
+
+
+def build_map(objects: int, seed: int):
+    """Returns (rects, map size) for a square map with objects (72 x 72 pixels) at random positions."""
+    random.seed(seed)
+    size = int((objects * MAP_AREA_PER_OBJECT) ** 0.5)
+    rects = [pygame.Rect(random.randrange(size), random.randrange(size), 72, 72) for i in range(objects)]
+    return rects, size
+
+
+def time_queries(query, players):
+    """Returns the mean time per player in microseconds for query(player)."""
+    start = time.perf_counter()
+    for player in players:
+        query(player)
+    return (time.perf_counter() - start) / len(players) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare checking every object with World.query() as the map grows.")
+    parser.add_argument("--objects", nargs="+", type=int, default=[7, 100, 1000, 10000], help="numbers of objects (default: 7 100 1000 10000)")
+    parser.add_argument("--queries", type=int, default=2000, help="player positions to query per map (default: 2000)")
+    parser.add_argument("--cell-size", type=int, default=128, help="World grid cell size (default: 128)")
+    args = parser.parse_args()
+
+    print(f"{'objects':>8}{'touching: every object (us)':>30}{'grid (us)':>12}{'near: every object (us)':>26}{'grid (us)':>12}{'same':>6}")
+    for objects in args.objects:
+        rects, size = build_map(objects, seed=objects)
+        world = World(args.cell_size)
+        for i, rect in enumerate(rects):
+            world.add(i, rect)
+        players = [pygame.Rect(random.randrange(size), random.randrange(size), 72, 72) for i in range(args.queries)]
+
+        def every_object(player):
+            return [i for i, rect in enumerate(rects) if player.colliderect(rect)]
+
+        def every_object_near(player):
+            return every_object(player.inflate(NEAR_DISTANCE, NEAR_DISTANCE))
+
+        def grid_near(player):
+            return world.query(player.inflate(NEAR_DISTANCE, NEAR_DISTANCE))
+
+        same = all(every_object(player) == world.query(player) and every_object_near(player) == grid_near(player) for player in players[:200])
+        print(f"{objects:>8}{time_queries(every_object, players):>30.2f}{time_queries(world.query, players):>12.2f}"
+              f"{time_queries(every_object_near, players):>26.2f}{time_queries(grid_near, players):>12.2f}{str(same):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Startup-time benchmark for chat_models.py
+# Compares the old eager start-up (every model loaded at import) with the lazy one (no models loaded at import).
+
+# Each case runs in a fresh python process, so nothing is shared between runs except the HuggingFace files cached on disk.
+# Run from the repository root:
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --runs 5
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# repository root - chat_models.py lives here
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# code run in the child process for each case
+CASES = {
+    # what importing chat_models cost before the models were loaded lazily
+    "eager (load_all)": "import chat_models; chat_models.load_all()",
+    # what importing chat_models costs now - the game window can open after this
+    "lazy (import only)": "import chat_models",
+    # lazy import, then the player talks to a single NPC (the Robot)
+    "lazy + first qa_chatbot call": "import chat_models; chat_models.qa_chatbot('What is an NPC?', chat_models.context)",
+}
+
+# appended to each case: print the child's peak memory use (in kilobytes on Linux) so it can be reported too
+REPORT_MEMORY = "\nimport resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def run_case(code):
+    """
+    Runs code in a fresh python process.
+
+    Parameters:
+    - code (str): python code to run
+
+    Returns:
+    - seconds (float): wall-clock time taken by the process
+    - peak_memory (int): peak resident memory of the process in kilobytes
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code + REPORT_MEMORY], cwd=ROOT, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+    return seconds, int(result.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare eager and lazy start-up of chat_models.")
+    parser.add_argument("--runs", type=int, default=3, help="number of runs per case (default: 3)")
+    args = parser.parse_args()
+
+    print(f"{'case':<32}{'median (s)':>12}{'min (s)':>10}{'peak RSS (MB)':>16}")
+    for name, code in CASES.items():
+        times = []
+        memory = []
+        for i in range(args.runs):
+            seconds, peak_memory = run_case(code)
+            times.append(seconds)
+            memory.append(peak_memory)
+        print(f"{name:<32}{statistics.median(times):>12.2f}{min(times):>10.2f}{max(memory) / 1024:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Word-wrap micro-benchmark for write_lines in ai_game.py
+# Compares the old word wrap (render the line after every word to measure it) with text_rendering.TextLayout
+# (measure each word once with font.size, then cache the layout) on replies of 200 to 2000 characters.
+
+# Runs without a window (SDL dummy video driver). Run from the repository root:
+#   python benchmarks/text_layout.py
+
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from text_rendering import TextLayout
+
+# width of the text box in ai_game.py
+WIDTH = 690
+
+WORDS = ("the", "polar", "bear", "said", "that", "it", "would", "really", "like", "to", "talk", "about", "honey",
+         "and", "fish", "because", "winter", "is", "coming", "soon", "NPC", "conversational", "model", "question")
+
+
+def old_wrap(font, line: str, colour: str="black"):
+    """
+    The word wrap write_lines used before TextLayout, returning the lines instead of drawing them.
+    Renders line_to_test after every word to measure it, so a line of n words renders O(n^2) characters.
+    """
+    if font.render(line, True, colour).get_width() <= WIDTH:
+        return [line]
+
+    lines = []
+    line_to_render = ""
+    line_to_test = ""
+    words = line.split()
+
+    i = 0
+    while i < len(words):
+        if i == len(words) - 1:
+            line_to_test = line_to_test + words[i]
+        else:
+            line_to_test = line_to_test + words[i] + " "
+
+        if font.render(line_to_test, True, colour).get_width() <= WIDTH:
+            line_to_render = line_to_test
+        else:
+            lines.append(line_to_render)
+            line_to_render = ""
+            if i == len(words) - 1:
+                line_to_test = words[i]
+                line_to_render = line_to_test
+            else:
+                line_to_test = words[i] + " "
+        i += 1
+
+    if not line_to_render == "":
+        lines.append(line_to_render)
+    return lines
+
+
+def make_reply(length: int, rng: random.Random):
+    """Returns a reply of roughly length characters made of random words."""
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def time_per_call(function, repeats: int):
+    """Returns the mean time of function() in milliseconds."""
+    start = time.perf_counter()
+    for i in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1000, 700))
+    font = pygame.font.SysFont("lucidaconsole", 14)
+    rng = random.Random(0)
+
+    print(f"{'chars':>6}{'lines':>7}{'old wrap (ms)':>16}{'layout, uncached (ms)':>24}{'layout, cached (ms)':>22}")
+    for length in (200, 500, 1000, 2000):
+        reply = make_reply(length, rng)
+        lines = TextLayout().wrap(font, reply, WIDTH)
+
+        old_time = time_per_call(lambda: old_wrap(font, reply), 20)
+        # a fresh TextLayout every call, so nothing is cached - this is the cost the first time a reply is shown
+        uncached_time = time_per_call(lambda: TextLayout().wrap(font, reply, WIDTH), 200)
+        # the same TextLayout every call - this is the cost on every later frame
+        layout = TextLayout()
+        cached_time = time_per_call(lambda: layout.wrap(font, reply, WIDTH), 2000)
+
+        print(f"{length:>6}{len(lines):>7}{old_time:>16.3f}{uncached_time:>24.3f}{cached_time:>22.4f}")
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,35 +5,709 @@
 
 # See the companion article "Pygame with AI": https://de-fellows.github.io/RexCoding/python/pygame/huggingface/transformers/pipelines/natural%20language%20processing/nlp/machine%20learning/ml/artificial%20intelligence/ai/conversational%20models/question-answering%20models/fill-mask/text-generation/2023/06/21/Pygame-with-AI.html
 
+# Note: the models are NOT loaded when this file is imported. Each chatbot is a LazyPipeline that loads its model and
+# tokenizer the first time it is called (or when preload() is called), so the game window opens straight away and
+# models the player never talks to never take up memory.
 
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForQuestionAnswering, AutoModelForMaskedLM, AutoModelForCausalLM
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 
+# what "from chat_models import *" imports: the chatbots, the game's context, and the functions for using them -
+# not the modules imported above, or the thread pool, the caches and the other settings (use chat_models.<name> for those)
+__all__ = [
+    # the chatbots (see LAZY MODEL REGISTRY) and the Robot's context
+    "blenderbot", "qa_chatbot", "fm_chatbot", "tg_chatbot", "context", "models",
+    "LazyPipeline", "ConversationHistory", "QAEngine",
+    # loading the models
+    "preload", "load_all", "use_pipeline", "set_precision",
+    # running the models in the background
+    "submit", "submit_batched", "submit_stream", "generate_story_tokens", "reset_story_cache",
+    # response cache and model server
+    "use_response_cache", "use_model_server",
+]
+
+# ------------------------ LAZY MODEL REGISTRY --------------------------------------- #
+
+class LazyPipeline:
+    """
+    Stands in for a HuggingFace pipeline. The pipeline is built by calling loader() the first time the
+    LazyPipeline is called, and every call after that goes straight to the loaded pipeline.
+
+    Parameters:
+    - name (str): name of the chatbot, used as its key in the models registry
+    - loader (function): takes no arguments and returns the loaded pipeline
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._pipeline = None
+        # the lock stops the game loop and a background preload from loading the same model twice
+        self._lock = threading.Lock()
+        self._preload_thread = None
+
+    @property
+    def loaded(self):
+        """True once the pipeline has been built."""
+        return self._pipeline is not None
+
+    def load(self):
+        """
+        Builds the pipeline if it has not been built yet. If a background preload is already running,
+        this waits for it to finish instead of loading the model a second time.
+
+        Returns:
+        - the loaded pipeline
+        """
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = self._loader()
+        return self._pipeline
+
+    def preload(self):
+        """
+        Starts loading the pipeline on a background thread, so it is ready by the time the player talks to the NPC.
+        Does nothing if the pipeline is already loaded or loading. Cheap enough to call every frame.
+
+        Returns: None
+        """
+        if self._pipeline is None and self._preload_thread is None:
+            self._preload_thread = threading.Thread(target=self.load, name=f"preload-{self.name}", daemon=True)
+            self._preload_thread.start()
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, attribute):
+        # private and special names (e.g. copy's __setstate__, hasattr(chatbot, "__wrapped__"), or _pipeline itself on a
+        # LazyPipeline made without __init__) are never the pipeline's - checking for them must not load the model
+        if attribute.startswith("_"):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {attribute!r}")
+        # anything else (e.g. tg_chatbot.tokenizer, blenderbot.model) is looked up on the loaded pipeline
+        return getattr(self.load(), attribute)
+
+
+# ------------------------ MODEL PRECISION --------------------------------------- #
+# By default every model runs in full precision (fp32). On CPU-only machines, a model can instead be loaded:
+# - "int8": with dynamic int8 quantization - the weights of its linear layers are stored as 8-bit integers (about a
+#   quarter of the memory) and its matrix multiplications run in int8, which is usually much faster on CPU
+# - "bf16": in bfloat16 - half the memory, and faster on CPUs with bfloat16 instructions
+# Both change the models' answers slightly - see benchmarks/precision.py to compare them with fp32.
+
+# The precision is chosen per model, before the model is loaded, e.g. chat_models.set_precision("tg_chatbot", "int8"),
+# or with an environment variable: CHAT_MODELS_PRECISION="tg_chatbot=int8,blenderbot=bf16"
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+# precision each chatbot's model is loaded in
+precision = {
+    "blenderbot": "fp32",
+    "qa_chatbot": "fp32",
+    "fm_chatbot": "fp32",
+    "tg_chatbot": "fp32",
+}
+
+def set_precision(name, mode):
+    """
+    Chooses the precision a chatbot's model is loaded in. Only affects models that have not been loaded yet.
+
+    Parameters:
+    - name (str): name of the chatbot, e.g. "tg_chatbot"
+    - mode (str): "fp32", "int8" or "bf16"
+
+    Returns: None
+    """
+    if name not in precision:
+        raise KeyError(f"unknown chatbot: {name}")
+    if mode not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, not {mode!r}")
+    precision[name] = mode
+
+for setting in os.environ.get("CHAT_MODELS_PRECISION", "").split(","):
+    if not setting.strip():
+        # e.g. a trailing comma
+        continue
+    name, equals, mode = setting.partition("=")
+    if not equals:
+        raise ValueError(f"CHAT_MODELS_PRECISION: {setting.strip()!r} should be chatbot=precision, e.g. tg_chatbot=int8")
+    try:
+        set_precision(name.strip(), mode.strip())
+    except (KeyError, ValueError) as error:
+        raise ValueError(f"CHAT_MODELS_PRECISION: bad setting {setting.strip()!r} - {error.args[0]}") from None
+
+def convert_model(model, mode):
+    """
+    Converts a loaded model to a precision (see MODEL PRECISION).
+
+    Parameters:
+    - model (transformers.PreTrainedModel): the model, in fp32
+    - mode (str): "fp32", "int8" or "bf16"
+
+    Returns:
+    - model: the converted model (the same object, changed in place)
+    """
+    import torch
+
+    if mode == "int8":
+        # GPT-2 uses its own Conv1D layers instead of torch's Linear layers - they do the same thing, so turn them into
+        # Linear layers first, or they would not be quantized
+        from transformers.pytorch_utils import Conv1D
+        for parent in list(model.modules()):
+            for child_name, child in parent.named_children():
+                if isinstance(child, Conv1D):
+                    linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                    linear.weight.data = child.weight.data.t().contiguous()
+                    linear.bias.data = child.bias.data
+                    setattr(parent, child_name, linear)
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    if mode == "bf16":
+        model = model.to(torch.bfloat16)
+        # the pipelines turn the model's scores into numpy arrays, which cannot hold bfloat16 - give them fp32 scores
+        model.register_forward_hook(_float_logits)
+        return model
+
+    if mode != "fp32":
+        raise ValueError(f"precision must be one of {PRECISIONS}, not {mode!r}")
+    return model
+
+def _float_logits(module, inputs, outputs):
+    # forward hook for bf16 models: converts the scores (logits) in the model's outputs to fp32
+    for key, value in outputs.items():
+        if key.endswith("logits"):
+            outputs[key] = value.float()
+    return outputs
+
+# ------------------------ FAST MODEL LOADING --------------------------------------- #
+# from_pretrained() checks the HuggingFace Hub for a newer version of every file on each launch, reads the model's config
+# once for the tokenizer and again for the model, builds the model with random weights, and then copies the saved
+# weights over them. load_parts() does the same job faster:
+# - it uses the files already in the local HuggingFace cache, without going online (they are only downloaded the first time)
+# - it reads the config once, and gives it to both the tokenizer and the model
+# - it builds the model without initializing its weights, and memory-maps the weights from the model.safetensors file
+#   instead of reading them into memory - the operating system only reads the parts the model uses, keeps them in its
+#   file cache between launches, and shares them between processes running the same model
+# If a model has no model.safetensors file (or it does not match the model), its weights are loaded by from_pretrained().
+
+# How long each step of loading each model took is kept in load_times, e.g. load_times["tg_chatbot"]["weights"].
+# See benchmarks/model_loading.py for cold- and warm-start times.
+
+# where each chatbot's model comes from: a model on the HuggingFace Hub, or a local folder
+model_sources = {
+    "blenderbot": "facebook/blenderbot-400M-distill",
+    "qa_chatbot": "distilbert-base-cased-distilled-squad",
+    "fm_chatbot": "distilroberta-base",
+    "tg_chatbot": "gpt2",
+}
+
+# set to False to load every model with from_pretrained() instead (e.g. to compare the two)
+fast_loading = os.environ.get("CHAT_MODELS_FAST_LOADING", "1") != "0"
+
+# seconds taken by each step of loading each chatbot, by chatbot name, e.g. {"tg_chatbot": {"import": 1.6, "config": 0.01, ...}}
+load_times = {}
+
+# how each chatbot's weights were loaded: "mmap" (memory-mapped from model.safetensors) or "from_pretrained"
+weights_loaded_by = {}
+
+# the files load_parts() needs from the HuggingFace Hub (not the TensorFlow, Flax or ONNX versions of the weights)
+_MODEL_FILES = ["*.json", "*.txt", "*.model", "model.safetensors"]
+
+@contextmanager
+def load_step(name, step):
+    """
+    Times a step of loading a chatbot, adding the time to load_times[name][step].
+
+    Parameters:
+    - name (str): name of the chatbot, e.g. "tg_chatbot"
+    - step (str): name of the step, e.g. "tokenizer"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        times = load_times.setdefault(name, {})
+        times[step] = times.get(step, 0.0) + time.perf_counter() - start
+
+def load_parts(name, model_class):
+    """
+    Loads a chatbot's tokenizer and model from model_sources[name] (see FAST MODEL LOADING), in the chatbot's precision.
+
+    Parameters:
+    - name (str): name of the chatbot, e.g. "tg_chatbot"
+    - model_class (str): the transformers class for the model, e.g. "AutoModelForCausalLM"
+
+    Returns:
+    - tokenizer, model: the loaded tokenizer and model
+    """
+    source = model_sources[name]
+    load_times[name] = {}
+
+    with load_step(name, "import"):
+        import transformers
+        model_class = getattr(transformers, model_class)
+
+    if not fast_loading:
+        with load_step(name, "tokenizer"):
+            tokenizer = transformers.AutoTokenizer.from_pretrained(source)
+        with load_step(name, "weights"):
+            model = model_class.from_pretrained(source)
+            weights_loaded_by[name] = "from_pretrained"
+        with load_step(name, "convert"):
+            return tokenizer, convert_model(model, precision[name])
+
+    with load_step(name, "resolve"):
+        folder = _local_folder(source)
+
+    with load_step(name, "config"):
+        config = transformers.AutoConfig.from_pretrained(folder)
+        # keep the model's own name and revision, not the cache folder's (the response cache uses them, see _response_key) -
+        # the HuggingFace cache names each version's folder after its commit hash
+        config._name_or_path = source
+        if folder != source:
+            config._commit_hash = os.path.basename(folder)
+
+    with load_step(name, "tokenizer"):
+        tokenizer = transformers.AutoTokenizer.from_pretrained(folder, config=config)
+
+    with load_step(name, "weights"):
+        model = _load_safetensors(model_class, config, folder)
+        weights_loaded_by[name] = "mmap"
+        if model is None:
+            model = model_class.from_pretrained(folder, config=config)
+            weights_loaded_by[name] = "from_pretrained"
+
+    with load_step(name, "convert"):
+        model = convert_model(model, precision[name])
+    return tokenizer, model
+
+def _local_folder(source):
+    """Returns the folder with source's files: source itself if it is a folder, otherwise its folder in the HuggingFace cache."""
+    if os.path.isdir(source):
+        return source
+    from huggingface_hub import snapshot_download
+
+    try:
+        # already downloaded - no need to go online
+        return snapshot_download(source, allow_patterns=_MODEL_FILES, local_files_only=True)
+    except Exception:
+        return snapshot_download(source, allow_patterns=_MODEL_FILES)
+
+def _load_safetensors(model_class, config, folder):
+    """
+    Builds a model without initializing its weights, and gives it the weights memory-mapped from folder/model.safetensors.
+
+    Returns:
+    - model: the loaded model, or None if there is no model.safetensors file or its weights do not fit the model
+    """
+    import torch
+    from safetensors import safe_open
+    from transformers.modeling_utils import no_init_weights
+    from transformers import GenerationConfig
+
+    path = os.path.join(folder, "model.safetensors")
+    if not os.path.isfile(path):
+        return None
+
+    with no_init_weights():
+        model = model_class.from_config(config)
+    expected = model.state_dict().keys()
+    prefix = model.base_model_prefix
+
+    weights = {}
+    with safe_open(path, framework="pt") as file:
+        for key in file.keys():
+            tensor = file.get_tensor(key)
+            # some checkpoints are saved from the base model, without its prefix (e.g. "h.0.attn" instead of "transformer.h.0.attn")
+            if key not in expected and f"{prefix}.{key}" in expected:
+                key = f"{prefix}.{key}"
+            # from_pretrained() loads every model in fp32 - so does this (MODEL PRECISION converts it afterwards)
+            if tensor.is_floating_point() and tensor.dtype != torch.float32:
+                tensor = tensor.float()
+            weights[key] = tensor
+
+    # assign=True uses the memory-mapped tensors as the model's weights, instead of copying them into the model
+    missing = model.load_state_dict(weights, strict=False, assign=True).missing_keys
+    # weights shared with another weight (e.g. the output layer and the input embeddings) are not saved - tie them again
+    model.tie_weights()
+    tied = model._tied_weights_keys or []
+    if any(not any(re.search(pattern, key) for pattern in tied) for key in missing):
+        # the file does not have every weight the model needs (e.g. it uses old weight names) - let from_pretrained() sort it out
+        return None
+
+    if os.path.isfile(os.path.join(folder, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(folder)
+    return model.eval()
 
 # ------------------------ CONVERSATIONAL MODEL --------------------------------------- #
 # Model: facebook/blenderbot-400M-distill (https://huggingface.co/facebook/blenderbot-400M-distill?text=Hey+my+name+is+Julien%21+How+are+you%3F)
 
-# set up the model and tokenizer
-tokenizer = AutoTokenizer.from_pretrained("facebook/blenderbot-400M-distill")
-model = AutoModelForSeq2SeqLM.from_pretrained("facebook/blenderbot-400M-distill")
+def _load_blenderbot():
+    # set up the model and tokenizer
+    tokenizer, model = load_parts("blenderbot", "AutoModelForSeq2SeqLM")
+
+    # set the tokenizer to right padding - blenderbot's encoder gives each token a position by its index, so padding
+    # put in front of a shorter input in a batch (left padding) would change its reply (see BATCHING REQUESTS)
+    tokenizer.padding_side = 'right'
+
+    # pad using the eos token
+    tokenizer.pad_token = tokenizer.eos_token
+
+    # create chatbot
+    with load_step("blenderbot", "pipeline"):
+        from transformers import pipeline
+        return pipeline(task="conversational", model=model, tokenizer=tokenizer)
+
+blenderbot = LazyPipeline("blenderbot", _load_blenderbot)
+
+class ConversationHistory:
+    """
+    A conversation with blenderbot that never grows past what the model can read. Used in place of transformers'
+    Conversation (it has the same methods and properties the game uses).
+
+    blenderbot only reads max_tokens tokens (128 for blenderbot-400M-distill), but a Conversation gives it the whole
+    conversation every time, so a long conversation gets slower with every message - and eventually too long for the
+    model. ConversationHistory keeps the messages in a deque together with their tokens, tokenizes each message only
+    once (when it is first sent to the model), and drops the oldest messages as soon as the conversation no longer fits.
+
+    Parameters:
+    - max_tokens (int): most tokens to give the model, or None for the model's own limit (default: None)
+    - max_messages (int): most messages to keep, however short they are (default: 32)
+    """
+
+    def __init__(self, max_tokens=None, max_messages=32):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        # {"role": "user" or "assistant", "content": text}, oldest first
+        self._messages = deque()
+        # the tokens of each message in _messages, or None if it has not been tokenized yet
+        self._token_ids = deque()
+        # total number of tokens in _token_ids
+        self._token_count = 0
+        # True until the first message has been tokenized (only messages after the first start with a separator)
+        self._first = True
+
+    # --- the parts of transformers' Conversation used by the game and the pipeline ---
+
+    @property
+    def messages(self):
+        return list(self._messages)
+
+    def add_message(self, message):
+        # runs of spaces and line breaks are collapsed to single spaces, so each message's tokens are the same whatever
+        # comes before and after it (see input_ids)
+        self._messages.append({"role": message["role"], "content": " ".join(message["content"].split())})
+        self._token_ids.append(None)
+        # the deque is bounded by hand rather than with maxlen, so the token count stays right
+        while len(self._messages) > self.max_messages:
+            self._drop_oldest()
+
+    def add_user_input(self, text):
+        self.add_message({"role": "user", "content": text})
 
-# set the tokenizer to left padding
-tokenizer.padding_side = 'left'
+    def append_response(self, response):
+        self.add_message({"role": "assistant", "content": response})
 
-# pad using the eos token
-tokenizer.pad_token = tokenizer.eos_token
+    @property
+    def new_user_input(self):
+        """The player's last message, if blenderbot has not responded to it yet (None otherwise)."""
+        messages = list(self._messages)
+        if messages and messages[-1]["role"] == "user":
+            return messages[-1]["content"]
+        return None
+
+    @property
+    def past_user_inputs(self):
+        """The player's messages that blenderbot has responded to."""
+        messages = list(self._messages)
+        if messages and messages[-1]["role"] == "user":
+            messages.pop()
+        return [message["content"] for message in messages if message["role"] == "user"]
+
+    @property
+    def generated_responses(self):
+        return [message["content"] for message in list(self._messages) if message["role"] == "assistant"]
+
+    # --- tokens ---
+
+    def input_ids(self, tokenizer, max_tokens=None):
+        """
+        Returns the tokens to give blenderbot for the conversation: the same tokens the pipeline would give it (see
+        blenderbot's chat template), for as many of the newest messages as fit. Only messages added since the last call
+        are tokenized.
+
+        Parameters:
+        - tokenizer: blenderbot's tokenizer
+        - max_tokens (int): the model's limit, used if the history has no max_tokens of its own
+
+        Returns:
+        - input_ids (list[int]): the conversation's tokens, ending with the eos token
+        """
+        limit = self.max_tokens or max_tokens or tokenizer.model_max_length
+
+        # tokenize the messages that are new since the last call - the template puts a space before the player's messages
+        # and two spaces between messages, so each message's text is tokenized with the spaces in front of it
+        # (empty messages are left out)
+        for i, message in enumerate(self._messages):
+            if self._token_ids[i] is None:
+                self._token_ids[i] = []
+                if message["content"]:
+                    text = ("" if self._first else "  ") + (" " if message["role"] == "user" else "") + message["content"]
+                    self._token_ids[i] = tokenizer(text, add_special_tokens=False).input_ids
+                    self._token_count += len(self._token_ids[i])
+                    self._first = False
+
+        # drop the oldest messages until the conversation (and the eos token) fits
+        while self._token_count + 1 > limit and len(self._messages) > 1:
+            self._drop_oldest()
+
+        input_ids = [token_id for token_ids in self._token_ids for token_id in token_ids]
+        # a single message that is too long on its own: keep its end
+        return input_ids[max(0, len(input_ids) - (limit - 1)):] + [tokenizer.eos_token_id]
+
+    def _drop_oldest(self):
+        self._messages.popleft()
+        token_ids = self._token_ids.popleft()
+        if token_ids is not None:
+            self._token_count -= len(token_ids)
 
-# create chatbot
-blenderbot = pipeline(task="conversational", model=model, tokenizer=tokenizer)
 
 # -------------------------- QUESTION-ANSWERING MODEL ------------------------------------------------ #
 # Model: distilbert-base-cased-distilled-squad (https://huggingface.co/distilbert-base-cased-distilled-squad)
 
-# set up model and tokenizer
-qa_tokenizer = AutoTokenizer.from_pretrained("distilbert-base-cased-distilled-squad")
-qa_model = AutoModelForQuestionAnswering.from_pretrained("distilbert-base-cased-distilled-squad")
+# The Robot always answers questions about the same context (see below). The question-answering pipeline tokenizes the
+# question and the whole context together on every call, then splits them into overlapping chunks that fit the model.
+# QAEngine tokenizes the context once when the model is loaded, and for each question only tokenizes the question,
+# puts it in front of each cached chunk of the context, and runs the model on all of the chunks in one batch.
+# Answers are also cached by question, so asking the same question again does not run the model at all.
+
+class QAEngine:
+    """
+    Answers questions about one context with a question-answering pipeline, giving the same answers as
+    pipeline(question, context) without re-tokenizing the context for every question.
+
+    Parameters:
+    - pipeline: a question-answering pipeline with a fast tokenizer
+    - context (str): the text containing the answers
+    - max_seq_len (int): maximum number of tokens the model sees at once (default: 384, like the pipeline)
+    - doc_stride (int): number of tokens each chunk of the context shares with the previous chunk (default: 128, like the pipeline)
+    - max_question_len (int): questions longer than this many tokens are cut short (default: 64)
+    - max_answer_len (int): maximum number of tokens in an answer (default: 15, like the pipeline)
+    - max_answers (int): maximum number of answers to remember (default: 256)
+
+    Attributes:
+    - hits (int): number of questions answered from the answer cache
+    - misses (int): number of questions that ran the model
+    """
+
+    def __init__(self, pipeline, context, max_seq_len=384, doc_stride=128, max_question_len=64, max_answer_len=15, max_answers=256):
+        import torch
+
+        self.pipeline = pipeline
+        self.context = context
+        self.max_seq_len = min(pipeline.tokenizer.model_max_length, max_seq_len)
+        self.doc_stride = min(self.max_seq_len // 2, doc_stride)
+        self.max_question_len = max_question_len
+        self.max_answer_len = max_answer_len
+        self.max_answers = max_answers
+        self.hits = 0
+        self.misses = 0
+        self._answers = OrderedDict()
+
+        tokenizer = pipeline.tokenizer
+
+        # tokenize the context once, keeping each token's word, and the characters each word covers in the context
+        encoding = tokenizer(context, add_special_tokens=False, return_offsets_mapping=True)
+        self._context_ids = torch.tensor(encoding.input_ids)
+        self._word_ids = encoding.word_ids()
+        self._word_chars = {}
+        for word, (start, end) in zip(self._word_ids, encoding.offset_mapping):
+            if word in self._word_chars:
+                self._word_chars[word] = (self._word_chars[word][0], end)
+            else:
+                self._word_chars[word] = (start, end)
+
+        # where the special tokens go around the question and the context, e.g. [CLS] question [SEP] context [SEP]
+        layout = tokenizer.build_inputs_with_special_tokens([-1], [-2])
+        self._before_question = torch.tensor(layout[:layout.index(-1)])
+        self._between = torch.tensor(layout[layout.index(-1) + 1:layout.index(-2)])
+        self._after_context = torch.tensor(layout[layout.index(-2) + 1:])
+
+        # the chunks of the context depend on how much room the question leaves, so they are cached by question length
+        self._chunks = {}
+
+    def _context_chunks(self, question_len):
+        """
+        Returns the (start, end) token positions of the chunks of the context that fit next to a question of question_len
+        tokens - the same chunks the tokenizer makes when it splits a long context into overlapping pieces.
+        """
+        if question_len not in self._chunks:
+            room = self.max_seq_len - question_len - len(self._before_question) - len(self._between) - len(self._after_context)
+            chunks = []
+            start = 0
+            while True:
+                end = min(start + room, len(self._context_ids))
+                chunks.append((start, end))
+                if end == len(self._context_ids):
+                    break
+                start += room - self.doc_stride
+            self._chunks[question_len] = chunks
+        return self._chunks[question_len]
+
+    def answer_batch(self, questions):
+        """
+        Finds the answers to questions in the context, running the model on every chunk of the context for every
+        question in one batch (no answer cache - see ask).
+
+        Parameters:
+        - questions (list[str]): the questions to answer
+
+        Returns:
+        - answers (list[dict]): one per question, like the pipeline's answer - "score", "start" and "end" (the answer's
+          position in the context) and "answer"
+        """
+        import torch
+
+        tokenizer = self.pipeline.tokenizer
+        model = self.pipeline.model
+
+        # one row per chunk of the context per question: special tokens, question, special tokens, chunk, special tokens
+        rows = []
+        # for each row: the question it belongs to, the position of its first context token, and its chunk
+        row_info = []
+        for i, question in enumerate(questions):
+            # only the question is tokenized - the context tokens are already cached
+            # (some tokenizers, e.g. RoBERTa's, do not handle leading whitespace well, so it is removed like the pipeline does)
+            question_ids = tokenizer(question.lstrip(), add_special_tokens=False).input_ids[:self.max_question_len]
+            question_ids = torch.tensor(question_ids, dtype=torch.long)
+            context_start = len(self._before_question) + len(question_ids) + len(self._between)
+            for start, end in self._context_chunks(len(question_ids)):
+                rows.append(torch.cat([self._before_question, question_ids, self._between, self._context_ids[start:end], self._after_context]))
+                row_info.append((i, context_start, start, end))
+
+        input_ids = torch.nn.utils.rnn.pad_sequence(rows, batch_first=True, padding_value=tokenizer.pad_token_id)
+        attention_mask = torch.zeros_like(input_ids)
+        # only the context tokens (and the first token, like the pipeline) can be part of the answer
+        can_answer = torch.zeros_like(input_ids, dtype=torch.bool)
+        # 0 for the question and the special tokens around it, 1 for the context (only used by some models, e.g. BERT)
+        token_type_ids = torch.zeros_like(input_ids)
+        for row_index, (row, (i, context_start, start, end)) in enumerate(zip(rows, row_info)):
+            attention_mask[row_index, :len(row)] = 1
+            can_answer[row_index, context_start:context_start + end - start] = True
+            token_type_ids[row_index, context_start:len(row)] = 1
+        can_answer[:, 0] = True
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in tokenizer.model_input_names:
+            inputs["token_type_ids"] = token_type_ids
+
+        with torch.no_grad():
+            outputs = model(**inputs)
+
+        # score every (start, end) span the same way the pipeline does: the probability of the start token times the
+        # probability of the end token, within each chunk, for spans of at most max_answer_len tokens
+        start_probs = torch.softmax(outputs.start_logits.float().masked_fill(~can_answer, -10000.0), dim=-1)
+        end_probs = torch.softmax(outputs.end_logits.float().masked_fill(~can_answer, -10000.0), dim=-1)
+        start_probs[:, 0] = end_probs[:, 0] = 0.0
+        spans = start_probs.unsqueeze(-1) * end_probs.unsqueeze(1)
+        spans = torch.tril(torch.triu(spans), self.max_answer_len - 1)
+        # the best span in each row
+        best_scores, best_spans = spans.flatten(1).max(dim=-1)
+
+        answers = [None] * len(questions)
+        for row_index, (i, context_start, start, end) in enumerate(row_info):
+            score = best_scores[row_index].item()
+            # keep the best span in any chunk for each question
+            if answers[i] is not None and answers[i]["score"] >= score:
+                continue
+            start_token, end_token = divmod(best_spans[row_index].item(), spans.shape[-1])
+            if not (context_start <= start_token < context_start + end - start):
+                answers[i] = {"score": score, "start": 0, "end": 0, "answer": ""}
+                continue
+            # turn the tokens back into whole words of the context
+            offset = start - context_start
+            start_char = self._word_chars[self._word_ids[start_token + offset]][0]
+            end_char = self._word_chars[self._word_ids[end_token + offset]][1]
+            answers[i] = {"score": score, "start": start_char, "end": end_char, "answer": self.context[start_char:end_char]}
+        return answers
+
+    def ask(self, questions):
+        """
+        Answers questions about the context, from the answer cache if the same question has been asked before. The
+        questions that are not in the cache are answered together in one batch (see answer_batch).
+        Questions are compared ignoring case, extra spaces and punctuation at the end, so "What is an NPC?" and
+        "what is an npc" share an answer.
+
+        Parameters:
+        - questions (list[str]): the questions to answer
+
+        Returns:
+        - answers (list[dict]): one per question - "score", "start", "end" and "answer", like the pipeline
+        """
+        keys = [" ".join(question.lower().split()).rstrip("?.! ") for question in questions]
+
+        # questions that are not in the cache, once each
+        new = {}
+        for key, question in zip(keys, questions):
+            if key in self._answers:
+                self.hits += 1
+                self._answers.move_to_end(key)
+            elif key in new:
+                self.hits += 1
+            else:
+                self.misses += 1
+                new[key] = question
+
+        answers = {key: self._answers[key] for key in keys if key in self._answers}
+        if new:
+            for key, answer in zip(new, self.answer_batch(list(new.values()))):
+                answers[key] = answer
+                self._answers[key] = answer
+            while len(self._answers) > self.max_answers:
+                self._answers.popitem(last=False)
+
+        return [dict(answers[key]) for key in keys]
+
+    def clear(self):
+        """Forgets every cached answer, so the next questions run the model."""
+        self._answers.clear()
+
+    def __call__(self, question, context=None):
+        """
+        Answers a question about the context (see ask). Called the same way as the pipeline, so it can be used in its place.
+
+        Parameters:
+        - question (str): the question to answer
+        - context (str): the text containing the answer - if it is not the engine's context, the pipeline is used instead (no caching)
 
-# create chatbot
-qa_chatbot = pipeline(task="question-answering", model=qa_model, tokenizer=qa_tokenizer)
+        Returns:
+        - answer (dict): "score", "start", "end" and "answer", like the pipeline
+        """
+        if context is not None and context != self.context:
+            return self.pipeline(question, context)
+        return self.ask([question])[0]
+
+    def __getattr__(self, attribute):
+        # anything else (e.g. model, tokenizer) is looked up on the pipeline
+        return getattr(self.pipeline, attribute)
+
+def _load_qa_chatbot():
+    # set up model and tokenizer
+    qa_tokenizer, qa_model = load_parts("qa_chatbot", "AutoModelForQuestionAnswering")
+
+    # create chatbot - the context is tokenized now, so the first question does not have to wait for it
+    with load_step("qa_chatbot", "pipeline"):
+        from transformers import pipeline
+        return QAEngine(pipeline(task="question-answering", model=qa_model, tokenizer=qa_tokenizer), context)
+
+qa_chatbot = LazyPipeline("qa_chatbot", _load_qa_chatbot)
 
 # create context - the information containing the answers
 context = """This video game has the following objects in it: Player Bear, Wall, Tree, Key, Lock Polar Bear, Robot, Fox and Moose.
@@ -56,19 +730,604 @@ context = """This video game has the following objects in it: Player Bear, Wall,
 # -------------------------- FILL-MASK MODEL ------------------------------------------------ #
 # Model: distilroberta-base (https://huggingface.co/distilroberta-base)
 
-# set up model and tokenizer
-fm_tokenizer = AutoTokenizer.from_pretrained("distilroberta-base")
-fm_model = AutoModelForMaskedLM.from_pretrained("distilroberta-base")
+def _load_fm_chatbot():
+    # set up model and tokenizer
+    fm_tokenizer, fm_model = load_parts("fm_chatbot", "AutoModelForMaskedLM")
 
-# create chatbot
-fm_chatbot = pipeline(task="fill-mask", model=fm_model, tokenizer=fm_tokenizer)
+    # create chatbot
+    with load_step("fm_chatbot", "pipeline"):
+        from transformers import pipeline
+        return pipeline(task="fill-mask", model=fm_model, tokenizer=fm_tokenizer)
+
+fm_chatbot = LazyPipeline("fm_chatbot", _load_fm_chatbot)
 
 # -------------------------- TEXT-GENERATION MODEL ------------------------------------------------ #
 # Model: gpt2 (https://huggingface.co/gpt2?text=Once+upon+a+time%2C)
 
-# set up model and tokenizer
-tg_tokenizer = AutoTokenizer.from_pretrained("gpt2")
-tg_model = AutoModelForCausalLM.from_pretrained("gpt2")
+def _load_tg_chatbot():
+    # set up model and tokenizer
+    tg_tokenizer, tg_model = load_parts("tg_chatbot", "AutoModelForCausalLM")
+
+    # create chatbot
+    with load_step("tg_chatbot", "pipeline"):
+        from transformers import pipeline
+        return pipeline(task="text-generation", model=tg_model, tokenizer=tg_tokenizer, do_sample=True)
+
+tg_chatbot = LazyPipeline("tg_chatbot", _load_tg_chatbot)
+
+# -------------------------- LOADING MODELS ------------------------------------------------ #
+
+# all chatbots, by name
+models = {
+    "blenderbot": blenderbot,
+    "qa_chatbot": qa_chatbot,
+    "fm_chatbot": fm_chatbot,
+    "tg_chatbot": tg_chatbot,
+}
+
+def preload(name):
+    """
+    Starts loading a chatbot's model in the background (see LazyPipeline.preload).
+
+    Parameters:
+    - name (str): name of the chatbot, e.g. "blenderbot"
+
+    Returns: None
+    """
+    models[name].preload()
+
+def use_pipeline(name, pipeline):
+    """
+    Replaces a chatbot's model with another pipeline, e.g. a stub or a small local model, so the game can be
+    tested or benchmarked without loading the real models (see benchmarks/game_loop.py).
+
+    Parameters:
+    - name (str): name of the chatbot, e.g. "blenderbot"
+    - pipeline (function): called instead of the chatbot's pipeline, with the same arguments
+
+    Returns: None
+    """
+    models[name]._pipeline = pipeline
+
+def load_all():
+    """
+    Loads every chatbot's model straight away, the way this file worked before the models were loaded lazily.
+
+    Parameters: None
+
+    Returns: None
+    """
+    for chatbot in models.values():
+        chatbot.load()
+
+# -------------------------- RUNNING MODELS IN THE BACKGROUND ------------------------------------------------ #
+# A model call can take from hundreds of milliseconds to several seconds. If the game loop made the call itself, the window
+# would freeze until it finished. Instead, the game submits the call to the executor and gets a Future back straight away.
+# The game checks future.done() every frame and uses future.result() once the response is ready.
+
+# a single worker thread runs the calls one at a time, in the order they were submitted
+# (the models are not safe to call from several threads at once, and they already use every CPU core for one call)
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="npc-inference")
+
+def submit(function, *args, **kwargs):
+    """
+    Runs function(*args, **kwargs) on the inference worker thread.
+
+    Parameters:
+    - function (function): the work to run, e.g. qa_chatbot, or a function that calls one of the chatbots
+    - args, kwargs: arguments passed on to function
+
+    Returns:
+    - future (concurrent.futures.Future): holds the return value of function once it has finished
+    """
+    return executor.submit(function, *args, **kwargs)
+
+# -------------------------- BATCHING REQUESTS ------------------------------------------------ #
+# When many players talk to the same NPC at once (e.g. bots testing a server), running each request on its own wastes
+# most of the CPU: a batch of 8 inputs takes far less than 8 times as long as one. A MicroBatcher collects the requests
+# for one chatbot for a few milliseconds (or until it has max_batch_size of them), pads them to the same length and runs
+# them through the model together, then gives each caller its own result.
+
+class MicroBatcher:
+    """
+    Collects requests for one chatbot into batches and runs each batch on the inference worker thread.
+    A single player's request is run on its own after max_wait seconds, so batching only costs a few milliseconds.
+
+    Parameters:
+    - name (str): name of the chatbot, used to name the batching thread
+    - run_batch (function): takes a list of requests (each a tuple of the arguments passed to submit) and returns a list
+      of results, one per request
+    - max_batch_size (int): maximum number of requests in one batch (default: 8)
+    - max_wait (float): seconds to wait for more requests after the first one arrives (default: 0.005)
+
+    Attributes:
+    - batches (int): number of batches run
+    - requests (int): number of requests run
+    """
+
+    def __init__(self, name, run_batch, max_batch_size=8, max_wait=0.005):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._run_batch = run_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, *args):
+        """
+        Adds a request to the next batch.
+
+        Parameters:
+        - args: arguments for the chatbot, e.g. a question and the context
+
+        Returns:
+        - future (concurrent.futures.Future): holds the chatbot's result for this request once its batch has run
+        """
+        future = Future()
+        self._queue.put((args, future))
+        # the batching thread is started by the first request
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"batch-{self.name}", daemon=True)
+                    self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            # wait for the first request, then for up to max_wait seconds for more
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+
+            # leave out requests that were cancelled while they waited
+            batch = [(args, future) for args, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # the batch runs on the inference worker, one model call at a time like every other request - requests that
+            # arrive in the meantime are collected into the next batch
+            try:
+                results = executor.submit(self._run_batch, [args for args, future in batch]).result()
+            except BaseException as error:
+                for args, future in batch:
+                    future.set_exception(error)
+            else:
+                for (args, future), result in zip(batch, results):
+                    future.set_result(result)
+            self.batches += 1
+            self.requests += len(batch)
+
+def _run_blenderbot_batch(requests):
+    """Runs blenderbot on a batch of (conversation,) requests, adding a response to each conversation."""
+    conversations = [conversation for (conversation,) in requests]
+    if getattr(blenderbot.load(), "model", None) is None or (len(conversations) == 1 and not isinstance(conversations[0], ConversationHistory)):
+        # not a HuggingFace pipeline (e.g. a stub, or the model server's client), or one Conversation
+        return [blenderbot(conversation) for conversation in conversations]
+
+    import torch
+
+    # the pipeline does not pass an attention mask when it batches conversations, so the padding would be read as part of
+    # the shorter conversations - tokenize them the same way it does, and pad them with an attention mask here instead
+    # (a ConversationHistory has most of its tokens already, and keeps them within the model's limit)
+    tokenizer = blenderbot.tokenizer
+    max_tokens = blenderbot.model.config.max_position_embeddings
+    rows = [{"input_ids": conversation.input_ids(tokenizer, max_tokens) if isinstance(conversation, ConversationHistory)
+             else tokenizer.apply_chat_template(conversation, add_generation_prompt=True)} for conversation in conversations]
+    inputs = tokenizer.pad(rows, return_tensors="pt")
+    with torch.no_grad():
+        # the same limit the pipeline uses
+        output_ids = blenderbot.model.generate(**inputs, max_new_tokens=256)
+
+    for conversation, ids in zip(conversations, output_ids):
+        # the first token is the decoder's start token, and shorter replies are padded with the eos token
+        conversation.append_response(tokenizer.decode(ids[1:], skip_special_tokens=True, clean_up_tokenization_spaces=True))
+    return conversations
+
+def _run_qa_batch(requests):
+    """Runs qa_chatbot on a batch of (question, context) requests, using the response cache where it can."""
+    return _cached_batch("qa_chatbot", requests, _run_qa_model)
+
+def _run_qa_model(requests):
+    engine = qa_chatbot.load()
+    if len(requests) > 1 and isinstance(engine, QAEngine) and all(request_context == engine.context for question, request_context in requests):
+        return engine.ask([question for question, request_context in requests])
+    return [qa_chatbot(*request) for request in requests]
+
+def _run_fm_batch(requests):
+    """Runs fm_chatbot on a batch of (text,) requests, using the response cache where it can."""
+    return _cached_batch("fm_chatbot", requests, _run_fm_model)
+
+def _run_fm_model(requests):
+    texts = [text for (text,) in requests]
+    if len(texts) == 1:
+        return [fm_chatbot(texts[0])]
+    # the pipeline pads the batch itself (on the right, with an attention mask)
+    return fm_chatbot(texts, batch_size=len(texts))
+
+# a batcher for each chatbot that can batch requests, by name
+batchers = {
+    "blenderbot": MicroBatcher("blenderbot", _run_blenderbot_batch),
+    "qa_chatbot": MicroBatcher("qa_chatbot", _run_qa_batch),
+    "fm_chatbot": MicroBatcher("fm_chatbot", _run_fm_batch),
+}
+
+def submit_batched(name, *args):
+    """
+    Runs a chatbot on the inference worker thread, batched with any other requests for the same chatbot that arrive at
+    about the same time (see MicroBatcher).
+
+    Parameters:
+    - name (str): name of the chatbot - "blenderbot", "qa_chatbot" or "fm_chatbot"
+    - args: arguments for the chatbot, e.g. submit_batched("qa_chatbot", question, context)
+
+    Returns:
+    - future (concurrent.futures.Future): holds the chatbot's result once it has finished
+    """
+    return batchers[name].submit(*args)
+
+# -------------------------- RESPONSE CACHE ------------------------------------------------ #
+# The Fox, the Robot and the Moose always give the same response to the same input (and, for the Moose, the same seed).
+# With the response cache turned on, their responses are stored on disk (see response_cache.py), so an input that has been
+# seen before - even in an earlier game - is answered with a lookup instead of running the model.
+
+# the cache, or None if it is turned off (see use_response_cache)
+response_cache = None
+
+def use_response_cache(path="npc_responses.sqlite", max_bytes=64 * 1024 * 1024):
+    """
+    Turns on the response cache, and loads the most used responses into memory.
+    The CHAT_MODELS_RESPONSE_CACHE environment variable overrides path - set it to "" to turn the cache off, or to
+    ":memory:" to keep it in memory only.
+
+    Parameters:
+    - path (str): database file for the cache (default: "npc_responses.sqlite")
+    - max_bytes (int): maximum size of the stored responses in bytes (default: 64 MB)
+
+    Returns:
+    - cache (ResponseCache): the cache, or None if it is turned off (always off when using a model server, which has its own)
+    """
+    global response_cache
+    from response_cache import ResponseCache
+
+    path = os.environ.get("CHAT_MODELS_RESPONSE_CACHE", path)
+    if response_cache is not None:
+        response_cache.close()
+    if path and model_server is None:
+        response_cache = ResponseCache(path, max_bytes)
+        response_cache.warm_up()
+        # lookups only count their uses in memory - save them when the game exits
+        atexit.register(response_cache.close)
+    else:
+        response_cache = None
+    return response_cache
+
+# chatbot name -> (model name, revision) of the models that have not been loaded yet (see _model_revision)
+_model_revisions = {}
+
+def _model_revision(name):
+    """
+    Returns the model name and revision of a chatbot that has not been loaded yet, worked out from model_sources[name]
+    without loading it - the same values load_parts() gives the model, so the keys match once it is loaded.
+    Returns None if the model's files have not been downloaded yet (the model has to be loaded to know its revision).
+    """
+    if name not in _model_revisions:
+        source = model_sources[name]
+        if os.path.isdir(source):
+            revision = None
+        else:
+            from huggingface_hub import snapshot_download
+            try:
+                # the HuggingFace cache names each version's folder after its commit hash (see load_parts)
+                revision = os.path.basename(snapshot_download(source, allow_patterns=_MODEL_FILES, local_files_only=True))
+            except Exception:
+                return None
+        _model_revisions[name] = (source, revision)
+    return _model_revisions[name]
+
+def _response_key(name, model_input, seed=None, params=None):
+    """
+    Returns the response cache key for an input to a chatbot: the model's name and revision, the input, the seed,
+    and the generation settings (including the precision the model was loaded in).
+    A chatbot that has not been loaded yet is not loaded just to make the key, so a response in the cache is returned
+    without loading its model.
+    """
+    if not models[name].loaded:
+        model_revision = _model_revision(name)
+        if model_revision is not None:
+            model_name, revision = model_revision
+            return response_cache.key(model_name, revision, model_input, seed, dict(params or {}, precision=precision[name]))
+
+    chatbot = models[name].load()
+    model = getattr(chatbot, "model", None)
+    if model is None:
+        # not a HuggingFace pipeline (e.g. a stub from benchmarks/game_loop.py)
+        model_name, revision = getattr(chatbot, "__qualname__", name), None
+    else:
+        model_name, revision = model.name_or_path, getattr(model.config, "_commit_hash", None)
+    return response_cache.key(model_name, revision, model_input, seed, dict(params or {}, precision=precision[name]))
+
+def _cached_batch(name, requests, run):
+    """
+    Gets the responses to a batch of requests for a chatbot from the response cache, and runs run() on only the requests
+    that are not in it, storing their responses.
+    """
+    if response_cache is None:
+        return run(requests)
+
+    keys = [_response_key(name, list(request)) for request in requests]
+    responses = [response_cache.get(key) for key in keys]
+    missing = [i for i, response in enumerate(responses) if response is None]
+    if missing:
+        for i, response in zip(missing, run([requests[i] for i in missing])):
+            response_cache.put(keys[i], response)
+            responses[i] = response
+    return responses
+
+# -------------------------- STREAMING TEXT GENERATION ------------------------------------------------ #
+# tg_chatbot only returns the story once all of the new tokens have been generated. generate_story_tokens() generates the
+# same continuation one token at a time and yields each piece of text as soon as it is decoded, so the game can show the
+# first word after a single decoding step instead of waiting for the whole continuation.
+
+# It also keeps the model's cached keys and values for the story between continuations (see StoryCache), so each
+# continuation only runs the model on the new tokens instead of the whole, ever-growing story.
+
+class TokenStream:
+    """
+    Text produced by a generator running on the inference worker thread (see submit_stream).
+    The game calls read() every frame to get the text that has arrived since the last read.
+    """
+
+    def __init__(self):
+        self._pieces = queue.SimpleQueue()
+        self._cancelled = False
+        # set by submit_stream - finishes when the generator has finished
+        self.future = None
+
+    def read(self):
+        """
+        Returns all of the text that has arrived since the last call, without waiting.
+
+        Returns:
+        - text (str): the new text, or "" if nothing new has arrived
+        """
+        text = ""
+        while True:
+            try:
+                text += self._pieces.get_nowait()
+            except queue.Empty:
+                return text
+
+    def done(self):
+        """True once the generator has finished and all of its text has been read."""
+        return self.future.done() and self._pieces.empty()
+
+    def result(self):
+        """Raises any error from the generator (like Future.result)."""
+        return self.future.result()
+
+    def cancel(self):
+        """Stops the generator after its next piece of text. Any text it has not produced yet is never generated."""
+        self._cancelled = True
+
+def submit_stream(generator_function, *args, **kwargs):
+    """
+    Runs generator_function(*args, **kwargs) on the inference worker thread, passing each item it yields to a TokenStream.
+
+    Parameters:
+    - generator_function (function): a generator function that yields strings, e.g. generate_story_tokens
+    - args, kwargs: arguments passed on to generator_function
+
+    Returns:
+    - stream (TokenStream): receives the text as it is generated
+    """
+    stream = TokenStream()
+
+    def run():
+        generator = generator_function(*args, **kwargs)
+        try:
+            for piece in generator:
+                stream._pieces.put(piece)
+                if stream._cancelled:
+                    break
+        finally:
+            # lets a cancelled generator clean up straight away (e.g. generate_story_tokens clears the story cache)
+            generator.close()
+
+    stream.future = executor.submit(run)
+    return stream
+
+class StoryCache:
+    """
+    Remembers the text-generation model's keys and values ("past_key_values") for the last story it continued.
+    If the next continuation starts from exactly that story, the model only needs to run on the tokens it has not seen yet.
+
+    Attributes:
+    - text (str): the story the cache belongs to, or None if the cache is empty
+    - token_ids (list[int]): the tokens the model sees for that story - the end of the story if it is longer than the model's context window
+    - past_key_values: the model's cached keys and values for every token in token_ids except the last one, or None
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Empties the cache, so the next continuation runs the model on the whole story."""
+        self.text = None
+        self.token_ids = []
+        self.past_key_values = None
+
+# cache for the Moose's story - only used on the inference worker thread, apart from reset_story_cache()
+story_cache = StoryCache()
+
+def reset_story_cache():
+    """
+    Empties the story cache. Call this whenever the story is reset, so none of the old story is used for the new one.
+
+    Returns: None
+    """
+    story_cache.clear()
+
+def generate_story_tokens(story, seed, max_new_tokens=35):
+    """
+    Continues a story with the text-generation model, yielding the text of each new token as soon as it is decoded.
+    Samples the same way tg_chatbot does (the model's default top-k sampling), so the same story and seed always give
+    the same continuation.
+
+    If story is the story from the last call plus everything that call yielded, the cached keys and values from that call
+    are reused and only the newest token is run through the model before sampling starts. When the story gets close to the
+    model's context window (1024 tokens for gpt2), only the end of it is kept and the cache is rebuilt for that part.
+    If the response cache is turned on and already has this story and seed, the stored continuation is yielded in one piece.
+    When using a model server, the continuation is generated by the server and streamed from there.
+
+    Parameters:
+    - story (str): the story so far
+    - seed (int): random seed for sampling
+    - max_new_tokens (int): maximum number of tokens to add to the story
+
+    Yields:
+    - text (str): the next piece of the continuation
+    """
+    # the model server's client streams the continuation from the server instead (see use_model_server)
+    remote = getattr(tg_chatbot.load(), "generate_story_tokens", None)
+    if remote is not None:
+        yield from remote(story, seed, max_new_tokens)
+        return
+
+    import torch
+    from transformers import set_seed, LogitsProcessorList, TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper
+
+    model = tg_chatbot.model
+    tokenizer = tg_chatbot.tokenizer
+
+    # the same story and seed always continue the same way - use the stored continuation if there is one
+    if response_cache is not None:
+        key = _response_key("tg_chatbot", story, seed, {"max_new_tokens": max_new_tokens})
+        text = response_cache.get(key)
+        if text is not None:
+            # the model has not seen the continuation, so the story cache cannot be used for the next one
+            story_cache.clear()
+            yield text
+            return
+
+    # the same sampling settings generate() uses with do_sample=True
+    config = model.generation_config
+    warpers = LogitsProcessorList()
+    if config.temperature is not None and config.temperature != 1.0:
+        warpers.append(TemperatureLogitsWarper(config.temperature))
+    if config.top_k is not None and config.top_k != 0:
+        warpers.append(TopKLogitsWarper(top_k=config.top_k))
+    if config.top_p is not None and config.top_p < 1.0:
+        warpers.append(TopPLogitsWarper(top_p=config.top_p))
+
+    # reuse the cache if this story is where the last continuation finished
+    if story_cache.text == story:
+        token_ids = list(story_cache.token_ids)
+        past_key_values = story_cache.past_key_values
+    else:
+        token_ids = tokenizer(story).input_ids
+        past_key_values = None
+
+    # the story and its continuation must fit in the model's context window (gpt2 uses absolute positions, so it cannot see
+    # more tokens than it has position embeddings). When the story gets too long, keep only its end - half the window, so
+    # this only has to happen once every few continuations - and rebuild the cache for it.
+    window = getattr(model.config, "n_positions", tokenizer.model_max_length)
+    if len(token_ids) + max_new_tokens > window:
+        token_ids = token_ids[-min(window // 2, window - max_new_tokens):]
+        past_key_values = None
+
+    # the cache holds every token except the last one, so only that token needs to be run through the model -
+    # without a cache, the whole story is
+    if past_key_values is None:
+        input_ids = torch.tensor([token_ids])
+    else:
+        input_ids = torch.tensor([token_ids[-1:]])
+
+    # empty the cache while the story is being continued - it is filled again below once the continuation is finished
+    # (if the continuation is cancelled, it stays empty)
+    story_cache.clear()
+
+    # set the seed right before sampling, on the thread that samples
+    set_seed(seed)
+
+    new_tokens = []
+    # the decoded continuation that has already been yielded
+    text_so_far = ""
+
+    with torch.no_grad():
+        for i in range(max_new_tokens):
+            outputs = model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+            past_key_values = outputs.past_key_values
+
+            # pick the next token
+            scores = warpers(input_ids, outputs.logits[:, -1, :])
+            next_token = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)
+            if next_token.item() == tokenizer.eos_token_id:
+                # the cache now also holds the last token of token_ids, so it cannot be reused
+                past_key_values = None
+                break
+            token_ids.append(next_token.item())
+            new_tokens.append(next_token.item())
+            # on the next step, only the new token is run through the model
+            input_ids = next_token
+
+            # decode the whole continuation so tokens that join together (e.g. parts of one character) decode correctly
+            text = tokenizer.decode(new_tokens, skip_special_tokens=True)
+            # "�" means the last token is only part of a character - wait for the rest of it
+            if not text.endswith("�"):
+                yield text[len(text_so_far):]
+                text_so_far = text
+
+    # yield anything that was held back, so the story in the game matches the text the cache belongs to
+    text = tokenizer.decode(new_tokens, skip_special_tokens=True)
+    if text != text_so_far:
+        yield text[len(text_so_far):]
+
+    if response_cache is not None:
+        response_cache.put(key, text)
+
+    # remember where the story finished, so the next continuation only runs the model on the new tokens
+    story_cache.text = story + text
+    story_cache.token_ids = token_ids
+    story_cache.past_key_values = past_key_values
+
+# -------------------------- MODEL SERVER ------------------------------------------------ #
+# Every game process normally loads its own copy of the models. With a model server (see model_server.py), one process
+# loads them and the games send their requests to it instead. The chatbots here are then replaced by RemotePipelines,
+# which take the same arguments and return the same results, so the game does not need to change.
+
+# Set the CHAT_MODELS_SERVER environment variable to the server's address to use it from ai_game.py.
+
+# the connection to the model server, or None if the models run in this process
+model_server = None
+
+def use_model_server(address=None, authkey=None):
+    """
+    Sends every chatbot's requests to a model server instead of loading the models in this process.
+    The response cache is left to the server (see use_response_cache).
+
+    Parameters:
+    - address (str): the server's socket (default: model_server.DEFAULT_ADDRESS)
+    - authkey (bytes): the server's shared secret (default: None - see model_server.load_authkey)
+
+    Returns:
+    - client (ModelClient): the connection to the server
+    """
+    global model_server, response_cache
+    import model_server as server
+
+    model_server = server.ModelClient(address or server.DEFAULT_ADDRESS, authkey)
+    for name in models:
+        use_pipeline(name, model_server.pipeline(name))
+    response_cache = None
+    return model_server
 
-# create chatbot
-tg_chatbot = pipeline(task="text-generation", model=tg_model, tokenizer=tg_tokenizer, do_sample=True)
\ No newline at end of file
+if os.environ.get("CHAT_MODELS_SERVER"):
+    use_model_server(os.environ["CHAT_MODELS_SERVER"])
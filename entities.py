@@ -0,0 +1,167 @@
+# Many moving entities at once, for load testing ai_game.py's world
+
+# ai_game.py moves a single player, one pygame.Rect at a time. To fill the map with hundreds or thousands of wandering
+# NPCs and simulated players, an Entities object keeps every entity's position, size and velocity in NumPy arrays, and
+# moves, blocks and clamps all of them with a few array operations per frame ("tick") instead of a python loop.
+
+# The rules are the same as for the player: an entity moves along x and then along y, stops right next to a wall in its
+# way (like World.sweep), and is then kept inside the map (like Rect.clamp_ip). Positions are whole pixels, like
+# pygame.Rect, so an entity ends up exactly where a Rect moved by those functions would.
+
+# NumPy is installed with HuggingFace Transformers (see the README).
+
+import numpy as np
+import pygame
+
+
+class Entities:
+    """
+    Positions, sizes and velocities of many entities, stored in NumPy arrays (one element per entity).
+
+    Parameters:
+    - walls (list[pygame.Rect]): solid rectangles the entities cannot move through (default: none)
+    - bounds (pygame.Rect): area the entities are kept inside after moving, or None (default: None)
+
+    Attributes:
+    - x, y (np.ndarray[int32]): the top left corner of each entity
+    - w, h (np.ndarray[int32]): the width and height of each entity
+    - vx, vy (np.ndarray[int32]): how far each entity moves per tick, in pixels
+    """
+
+    def __init__(self, walls=(), bounds=None):
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.w = np.zeros(0, dtype=np.int32)
+        self.h = np.zeros(0, dtype=np.int32)
+        self.vx = np.zeros(0, dtype=np.int32)
+        self.vy = np.zeros(0, dtype=np.int32)
+        self.bounds = None if bounds is None else pygame.Rect(bounds)
+        self.set_walls(walls)
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, rects, velocities=None):
+        """
+        Adds entities.
+
+        Parameters:
+        - rects (list[pygame.Rect]): where each new entity is (anything pygame.Rect accepts, e.g. (x, y, w, h))
+        - velocities (list[tuple[int, int]]): (vx, vy) for each new entity (default: not moving)
+
+        Returns:
+        - indices (np.ndarray[int]): the indices of the new entities
+        """
+        rects = np.array([tuple(pygame.Rect(rect)) for rect in rects], dtype=np.int32).reshape(-1, 4)
+        velocities = np.zeros((len(rects), 2), dtype=np.int32) if velocities is None else np.asarray(velocities, dtype=np.int32).reshape(-1, 2)
+        start = len(self)
+        self.x = np.concatenate([self.x, rects[:, 0]])
+        self.y = np.concatenate([self.y, rects[:, 1]])
+        self.w = np.concatenate([self.w, rects[:, 2]])
+        self.h = np.concatenate([self.h, rects[:, 3]])
+        self.vx = np.concatenate([self.vx, velocities[:, 0]])
+        self.vy = np.concatenate([self.vy, velocities[:, 1]])
+        return np.arange(start, len(self))
+
+    def rect(self, i: int):
+        """
+        Returns:
+        - rect (pygame.Rect): where entity i is
+        """
+        return pygame.Rect(int(self.x[i]), int(self.y[i]), int(self.w[i]), int(self.h[i]))
+
+    def set_walls(self, walls):
+        """
+        Sets the solid rectangles the entities cannot move through.
+
+        Parameters:
+        - walls (list[pygame.Rect]): the walls, e.g. [wall] in ai_game.py
+
+        Returns: None
+        """
+        walls = np.array([tuple(pygame.Rect(wall)) for wall in walls], dtype=np.int32).reshape(-1, 4)
+        # shaped (1, walls), so they broadcast against the entities shaped (entities, 1)
+        self._wall_left = walls[:, 0][None, :]
+        self._wall_top = walls[:, 1][None, :]
+        self._wall_right = (walls[:, 0] + walls[:, 2])[None, :]
+        self._wall_bottom = (walls[:, 1] + walls[:, 3])[None, :]
+
+    def step(self):
+        """
+        Moves every entity by its velocity, along x and then along y, stopping it next to any wall in its way
+        (like World.sweep), then keeps it inside bounds (like pygame.Rect.clamp_ip).
+
+        Returns: None
+        """
+        self.x += self._blocked(self.vx, self.x, self.w, self.y, self.h,
+                                self._wall_left, self._wall_right, self._wall_top, self._wall_bottom)
+        self.y += self._blocked(self.vy, self.y, self.h, self.x, self.w,
+                                self._wall_top, self._wall_bottom, self._wall_left, self._wall_right)
+        if self.bounds is not None:
+            self.clamp(self.bounds)
+
+    def _blocked(self, velocity, position, size, across, across_size, wall_start, wall_end, wall_across_start, wall_across_end):
+        """
+        Returns how far each entity can move along one axis (velocity, cut short by the walls in the way).
+        position and size are along the axis of movement, across and across_size along the other axis.
+        """
+        if self._wall_left.size == 0:
+            return velocity
+        position = position[:, None]
+        end = (position + size[:, None])
+        moving = velocity[:, None]
+        # walls level with the entity (overlapping it on the other axis)
+        level = (wall_across_end > across[:, None]) & (wall_across_start < (across + across_size)[:, None])
+        # how far the entity can go before it touches each wall ahead of it
+        forward = np.where(level & (moving > 0) & (wall_start >= end), wall_start - end, np.iinfo(np.int32).max)
+        backward = np.where(level & (moving < 0) & (wall_end <= position), wall_end - position, np.iinfo(np.int32).min)
+        return np.clip(velocity, backward.max(axis=1), forward.min(axis=1)).astype(np.int32)
+
+    def clamp(self, bounds):
+        """
+        Moves every entity inside bounds, the same way pygame.Rect.clamp_ip does: an entity bigger than bounds is centred
+        on it.
+
+        Parameters:
+        - bounds (pygame.Rect): the area to keep the entities in
+
+        Returns: None
+        """
+        bounds = pygame.Rect(bounds)
+        self.x = np.where(self.w >= bounds.w, bounds.x + bounds.w // 2 - self.w // 2,
+                          np.clip(self.x, bounds.left, bounds.right - self.w)).astype(np.int32)
+        self.y = np.where(self.h >= bounds.h, bounds.y + bounds.h // 2 - self.h // 2,
+                          np.clip(self.y, bounds.top, bounds.bottom - self.h)).astype(np.int32)
+
+    def overlapping(self, rect):
+        """
+        Finds the entities that overlap a rectangle (like pygame.Rect.colliderect).
+
+        Parameters:
+        - rect (pygame.Rect): the rectangle to check, e.g. an NPC
+
+        Returns:
+        - indices (np.ndarray[int]): the indices of the entities that overlap rect
+        """
+        rect = pygame.Rect(rect)
+        hit = ((self.x < rect.right) & (self.x + self.w > rect.left) & (self.y < rect.bottom) & (self.y + self.h > rect.top)
+               & (self.w > 0) & (self.h > 0) & (rect.w > 0) & (rect.h > 0))
+        return np.flatnonzero(hit)
+
+    def wander(self, rng, speed: int=10, turn_chance: float=0.05):
+        """
+        Gives a random fraction of the entities a new random direction (left, right, up, down or standing still), like
+        players walking around with the arrow keys.
+
+        Parameters:
+        - rng (np.random.Generator): random number generator, e.g. np.random.default_rng(0)
+        - speed (int): pixels per tick (default: 10, the player's speed in ai_game.py)
+        - turn_chance (float): chance that each entity changes direction on this tick (default: 0.05)
+
+        Returns: None
+        """
+        turning = np.flatnonzero(rng.random(len(self)) < turn_chance)
+        directions = np.array([(0, 0), (-speed, 0), (speed, 0), (0, -speed), (0, speed)], dtype=np.int32)
+        chosen = directions[rng.integers(0, len(directions), len(turning))]
+        self.vx[turning] = chosen[:, 0]
+        self.vy[turning] = chosen[:, 1]
@@ -0,0 +1,208 @@
+# The state of the tree, the lock and the key in simple_pygame.py and ai_game.py
+
+# The games used to keep this state in flags - climb_tree and open_lock ("None", "Yes" or "No"), lock_state ("Locked" or
+# "Unlocked"), key (True or False), key_used ("None", False or True) and tree_climbed - and worked out from them, on
+# every frame, what the text box should say.
+
+# A GameState keeps it as a small state machine instead: each object is in one of a few states (an Enum), and it only
+# changes state when something happens - the player walks up to or away from something ("focus"), or answers a
+# question with [y] or [n]. Only then does it work out what follows from the new state: the title of the text box,
+# the text the tree or the lock shows ("prompt"), and which keys do something ("contexts", see input_handling.py).
+# Every other frame, the game just reads them.
+
+# The whole state is a handful of values, so snapshot() can save it and restore() can go back to it at any time.
+
+from collections import namedtuple
+from enum import Enum
+
+
+class Tree(Enum):
+    """The tree, with the key at the top."""
+    NOT_CLIMBED = "not climbed"     # the key is still at the top
+    SAID_YES = "said yes"           # the player is at the tree and said yes - they climbed it and found the key
+    SAID_NO = "said no"             # the player is at the tree and said no
+    CLIMBED = "climbed"             # the player climbed the tree and walked away - it has nothing more to say
+
+
+class Lock(Enum):
+    """The lock, which the key opens."""
+    LOCKED = "locked"
+    SAID_YES = "said yes"           # the player is at the lock and used the key on it
+    SAID_NO = "said no"             # the player is at the lock and did not use the key
+    UNLOCKED = "unlocked"           # the player used the key and walked away
+
+
+class Key(Enum):
+    """Where the key is."""
+    IN_TREE = "in tree"
+    IN_INVENTORY = "in inventory"
+    USED = "used"
+
+
+# everything snapshot() saves
+GameSnapshot = namedtuple("GameSnapshot", ["tree", "lock", "key", "focus"])
+
+
+class GameState:
+    """
+    The state of the tree, the lock and the key, and what the player is interacting with.
+
+    Each frame, the game calls touch() with what the player is touching, and answer() when the player presses [y] or [n].
+    The attributes below are only worked out again when the state changes.
+
+    Parameters:
+    - text_y (int): y-value of the first line of the text box, where the prompts start (default: 560)
+    - default_title (str): title of the text box when the player is not touching anything (default: "PLAYER BEAR: ")
+
+    Attributes:
+    - tree (Tree), lock (Lock), key (Key): the state of each object
+    - focus: what the player is touching - "tree", "lock", an NPC (anything with a title), or None
+    - title (str): title of the text box
+    - prompt (list[tuple[list[str], int, str]]): what the tree or the lock says, as (lines, y, colour) for write_lines
+    - contexts (tuple[str]): the input contexts for the keys (see input_handling.InputHandler)
+    - transitions (int): number of times the state has changed
+    """
+
+    def __init__(self, text_y: int=560, default_title: str="PLAYER BEAR: "):
+        self.text_y = text_y
+        self.default_title = default_title
+        self.tree = Tree.NOT_CLIMBED
+        self.lock = Lock.LOCKED
+        self.key = Key.IN_TREE
+        self.focus = None
+        self.transitions = 0
+        # functions called with the GameState after every change
+        self._listeners = []
+        self._update()
+
+    def on_transition(self, listener):
+        """
+        Calls a function after every change of state, e.g. to change an image.
+
+        Parameters:
+        - listener (function): takes the GameState
+
+        Returns: None
+        """
+        self._listeners.append(listener)
+
+    def touch(self, focus):
+        """
+        Tells the state what the player is touching on this frame. Nothing happens unless it has changed.
+        Walking away from the tree or the lock after answering finishes what the answer started.
+
+        Parameters:
+        - focus: "tree", "lock", an NPC, or None
+
+        Returns: None
+        """
+        if focus is self.focus:
+            return
+
+        # walking away from the tree - if the player climbed it, it stays climbed
+        if self.focus == "tree":
+            if self.tree == Tree.SAID_YES:
+                self.tree = Tree.CLIMBED
+            elif self.tree == Tree.SAID_NO:
+                self.tree = Tree.NOT_CLIMBED
+        # walking away from the lock - if the player used the key, it stays unlocked
+        elif self.focus == "lock":
+            if self.lock == Lock.SAID_YES:
+                self.lock = Lock.UNLOCKED
+            elif self.lock == Lock.SAID_NO:
+                self.lock = Lock.LOCKED
+
+        self.focus = focus
+        self._changed()
+
+    def answer(self, yes: bool):
+        """
+        The player's answer to the tree's or the lock's question. Ignored if there is no question to answer
+        (e.g. the lock only asks if the player has the key), or after the player has said yes.
+
+        Parameters:
+        - yes (bool): True for [y], False for [n]
+
+        Returns: None
+        """
+        if self.focus == "tree" and self.tree in (Tree.NOT_CLIMBED, Tree.SAID_NO):
+            if yes:
+                # the player climbs the tree, and the key appears in the inventory
+                self.tree = Tree.SAID_YES
+                self.key = Key.IN_INVENTORY
+            else:
+                self.tree = Tree.SAID_NO
+            self._changed()
+
+        elif self.focus == "lock" and self.key == Key.IN_INVENTORY and self.lock in (Lock.LOCKED, Lock.SAID_NO):
+            if yes:
+                # the lock opens, and the key disappears from the inventory
+                self.lock = Lock.SAID_YES
+                self.key = Key.USED
+            else:
+                self.lock = Lock.SAID_NO
+            self._changed()
+
+    def snapshot(self):
+        """
+        Returns:
+        - snapshot (GameSnapshot): the whole state, for restore()
+        """
+        return GameSnapshot(self.tree, self.lock, self.key, self.focus)
+
+    def restore(self, snapshot):
+        """
+        Goes back to a state saved with snapshot().
+
+        Parameters:
+        - snapshot (GameSnapshot): the state to go back to
+
+        Returns: None
+        """
+        self.tree, self.lock, self.key, self.focus = snapshot
+        self._changed()
+
+    def _changed(self):
+        """Works out everything that follows from the new state, and tells the listeners."""
+        self.transitions += 1
+        self._update()
+        for listener in self._listeners:
+            listener(self)
+
+    def _update(self):
+        """Works out the title, the prompt and the input contexts from the state."""
+        y = self.text_y
+        self.prompt = []
+
+        if self.focus == "tree":
+            self.title = "TREE: "
+            self.contexts = ("tree",)
+            # the tree only has something to say until it has been climbed
+            if self.tree != Tree.CLIMBED:
+                self.prompt.append((["There is a tall tree... with something at the top!", "Climb tree? Yes [y] or No [n]: "], y, "black"))
+            if self.tree == Tree.SAID_YES:
+                self.prompt.append((["[y]: You climb to the top and find a KEY."], y + 40, "blue"))
+            elif self.tree == Tree.SAID_NO:
+                self.prompt.append((["[n]: It looks too tall to climb anyway."], y + 40, "blue"))
+
+        elif self.focus == "lock":
+            self.title = "OPEN LOCK: " if self.lock == Lock.UNLOCKED else "LOCK: "
+            self.contexts = ("lock",)
+            if self.lock != Lock.UNLOCKED:
+                self.prompt.append((["A lock. You use your paws but it won't budge.", "It probably needs a KEY..."], y, "black"))
+                # if the player has the key (or has just used it), give them the option to use it
+                if self.key == Key.IN_INVENTORY or self.lock == Lock.SAID_YES:
+                    self.prompt.append((["Use KEY? Yes [y] or No [n]: "], y + 40, "black"))
+            if self.lock == Lock.SAID_YES:
+                self.prompt.append((["[y]: It worked!"], y + 60, "blue"))
+            elif self.lock == Lock.SAID_NO:
+                self.prompt.append((["[n]: Really? Why not?"], y + 60, "blue"))
+
+        elif self.focus is not None:
+            # an NPC
+            self.title = self.focus.title
+            self.contexts = ("npc",)
+
+        else:
+            self.title = self.default_title
+            self.contexts = ()
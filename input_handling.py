@@ -0,0 +1,213 @@
+# Keyboard input for ai_game.py
+
+# The event loop used to check every KEYDOWN event against each thing the player could be doing - next to the tree,
+# next to the lock, talking to an NPC - and added each typed letter to the player's input with input_text += letter,
+# which builds a new string for every key press.
+
+# An InputHandler looks each key up in a table instead: the game binds a handler to a key in a "context" (e.g. "tree"
+# while the player is at the tree, or None for keys that work everywhere), and tells the handler which contexts are
+# active. Typed text comes from TEXTINPUT events (which also handle shift, accents and pasted text) and goes into a
+# TextBuffer - a list of characters with a cursor, so adding or removing a letter does not copy the rest of the text.
+
+# Bursts of events are handled in one go: all the text typed between two bound keys is added to the buffer at once, and
+# a key bound with coalesce=True that is pressed several times in a row (e.g. a held-down key repeating, or a key mashed
+# during a slow frame) only calls its handler once, with the number of presses.
+
+from pygame.locals import KEYDOWN, KEYUP, TEXTINPUT
+
+
+class TextBuffer:
+    """
+    Text the player is typing: a list of characters with a cursor. Adding and removing characters at the cursor
+    does not copy the rest of the text (when the cursor is at the end, as it is while typing).
+
+    Parameters:
+    - max_length (int): most characters the buffer holds - anything typed or pasted beyond that is ignored, or None for
+      no limit (default: None)
+
+    Attributes:
+    - cursor (int): where the next character goes, from 0 (before the first character) to len(buffer) (after the last)
+    """
+
+    def __init__(self, max_length=None):
+        self.max_length = max_length
+        self.cursor = 0
+        self._characters = []
+        # the text as a string, built when it is first asked for after a change
+        self._text = ""
+
+    def __len__(self):
+        return len(self._characters)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def text(self):
+        """The text in the buffer, as a string (only rebuilt after the buffer changes)."""
+        if self._text is None:
+            self._text = "".join(self._characters)
+        return self._text
+
+    def insert(self, text: str):
+        """
+        Adds text at the cursor, and moves the cursor to the end of it.
+
+        Parameters:
+        - text (str): the text to add
+
+        Returns: None
+        """
+        if self.max_length is not None:
+            text = text[:max(0, self.max_length - len(self._characters))]
+        if text:
+            self._characters[self.cursor:self.cursor] = text
+            self.cursor += len(text)
+            self._text = None
+
+    def backspace(self, count: int=1):
+        """
+        Removes up to count characters before the cursor.
+
+        Returns: None
+        """
+        start = max(0, self.cursor - count)
+        if start < self.cursor:
+            del self._characters[start:self.cursor]
+            self.cursor = start
+            self._text = None
+
+    def delete(self, count: int=1):
+        """
+        Removes up to count characters after the cursor.
+
+        Returns: None
+        """
+        if self.cursor < len(self._characters):
+            del self._characters[self.cursor:self.cursor + count]
+            self._text = None
+
+    def move_cursor(self, offset: int):
+        """
+        Moves the cursor offset characters to the right (or to the left if offset is negative), staying within the text.
+
+        Returns: None
+        """
+        self.cursor = min(max(0, self.cursor + offset), len(self._characters))
+
+    def clear(self):
+        """Empties the buffer."""
+        self._characters.clear()
+        self.cursor = 0
+        self._text = ""
+
+
+class InputHandler:
+    """
+    Sends keyboard events to the handlers bound to them in the active contexts.
+
+    Each frame, set contexts to what the player is doing (e.g. ("tree",)) and pass the frame's events to handle().
+    Key bindings for the context None work in every context.
+
+    Attributes:
+    - contexts (tuple): the active contexts
+    """
+
+    def __init__(self):
+        self.contexts = ()
+        # (context, key) -> (handler, coalesce)
+        self._bindings = {}
+        # context -> TextBuffer that receives the typed text in that context
+        self._text_buffers = {}
+
+    def bind(self, context, key: int, handler, coalesce: bool=False):
+        """
+        Binds a handler to a key in a context.
+
+        Parameters:
+        - context: the context the binding works in, e.g. "tree" - None for every context
+        - key (int): the key, e.g. pygame.K_y
+        - handler (function): called with the number of times the key was pressed, when the key is pressed in the context
+        - coalesce (bool): if True, pressing the key several times in a row (with no other bound key or typed text in
+          between) calls the handler once for all of them, instead of once per press (default: False)
+
+        Returns: None
+        """
+        self._bindings[(context, key)] = (handler, coalesce)
+
+    def bind_text(self, context, buffer):
+        """
+        Sends the text typed in a context (TEXTINPUT events) to a buffer.
+
+        Parameters:
+        - context: the context, e.g. "npc"
+        - buffer (TextBuffer): where the text goes
+
+        Returns: None
+        """
+        self._text_buffers[context] = buffer
+
+    def handle(self, events):
+        """
+        Handles the keyboard events for a frame, and returns the other events (e.g. QUIT) for the game to handle.
+
+        Parameters:
+        - events (list[pygame.event.Event]): the frame's events, from pygame.event.get()
+
+        Returns:
+        - events (list[pygame.event.Event]): the events that are not keyboard events
+        """
+        others = []
+        # look-ups for this frame: the bindings and the text buffer in the active contexts (the first context wins)
+        contexts = tuple(self.contexts) + (None,)
+        buffer = next((self._text_buffers[context] for context in contexts if context in self._text_buffers), None)
+
+        # text typed since the last bound key, and the coalesced key press waiting to be handled, as [handler, count]
+        text = []
+        pending = None
+
+        for event in events:
+            if event.type == TEXTINPUT:
+                if buffer is not None:
+                    if pending is not None:
+                        pending[0](pending[1])
+                        pending = None
+                    text.append(event.text)
+
+            elif event.type == KEYDOWN:
+                binding = None
+                for context in contexts:
+                    binding = self._bindings.get((context, event.key))
+                    if binding is not None:
+                        break
+                if binding is None:
+                    continue
+                handler, coalesce = binding
+
+                # another press of the same coalesced key - count it and keep going
+                if pending is not None and coalesce and pending[0] is handler:
+                    pending[1] += 1
+                    continue
+
+                # handle what came before this key first, so everything happens in the order it was typed
+                if pending is not None:
+                    pending[0](pending[1])
+                    pending = None
+                if text:
+                    buffer.insert("".join(text))
+                    text.clear()
+
+                if coalesce:
+                    pending = [handler, 1]
+                else:
+                    handler(1)
+
+            elif event.type != KEYUP:
+                others.append(event)
+
+        if pending is not None:
+            pending[0](pending[1])
+        if text:
+            buffer.insert("".join(text))
+
+        return others
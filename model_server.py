@@ -0,0 +1,359 @@
+# Model server for chat_models.py
+# Loading the four NPC models takes a few GB of memory in every game process. When many copies of the game run on the
+# same machine, a model server loads the models once, and each game talks to it through a local (Unix) socket instead
+# of loading the models itself.
+
+# Start the server, then start the games with CHAT_MODELS_SERVER set to its address:
+#   python model_server.py                          (one process, models loaded when first used)
+#   python model_server.py --workers 4 --preload    (models loaded once, then shared by 4 worker processes)
+#   CHAT_MODELS_SERVER=/tmp/npc_models-$(id -u)/npc_models.sock python ai_game.py
+
+# The games send the server pickles, which can run any code when they are loaded, so only the user who started the
+# server may use it: the socket is in a folder only they can open, and each game must know a secret key ("authkey")
+# made at random the first time the server or a game runs. The key is kept in ~/.config/npc_models/authkey (readable
+# only by that user), or can be given as hexadecimal in the CHAT_MODELS_SERVER_AUTHKEY environment variable.
+
+# With --workers, the models are loaded before the worker processes are started (forked). The workers share the
+# parent's memory copy-on-write, and the weights are only ever read, so they stay shared: N workers use about the same
+# memory for the models as one.
+
+# In the game, chat_models.use_model_server() replaces each chatbot with a RemotePipeline, which is called exactly like
+# the pipeline it stands in for (see ModelClient).
+
+import argparse
+import os
+import pickle
+import secrets
+import stat
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+# where the server listens by default - in a folder of its own, which only the user running the server can open
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f"npc_models-{os.getuid()}", "npc_models.sock")
+
+# where the shared secret is kept, unless it is given in the CHAT_MODELS_SERVER_AUTHKEY environment variable
+AUTHKEY_PATH = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "npc_models", "authkey")
+
+
+def load_authkey(path: str=AUTHKEY_PATH):
+    """
+    Returns the shared secret the games must send to use the server: CHAT_MODELS_SERVER_AUTHKEY (as hexadecimal) if it
+    is set, or else the key in path - made at random, and saved readable only by this user, if there is none yet.
+
+    Parameters:
+    - path (str): file the key is kept in (default: AUTHKEY_PATH)
+
+    Returns:
+    - authkey (bytes): the secret
+    """
+    if os.environ.get("CHAT_MODELS_SERVER_AUTHKEY"):
+        return bytes.fromhex(os.environ["CHAT_MODELS_SERVER_AUTHKEY"])
+
+    try:
+        with open(path, "rb") as file:
+            return bytes.fromhex(file.read().decode())
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    authkey = secrets.token_bytes(32)
+    try:
+        # O_EXCL: if another process made the key first, use theirs
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as file:
+            return bytes.fromhex(file.read().decode())
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(authkey.hex().encode())
+    return authkey
+
+
+def private_socket_path(address: str):
+    """
+    Gets address ready for the server to listen on: makes its folder (readable only by this user) if it does not exist,
+    and removes an old socket left there by a server that was stopped. Anything else at address is left alone.
+
+    Parameters:
+    - address (str): the socket's path
+
+    Raises:
+    - PermissionError: if the folder or the file at address belongs to another user, or the folder can be opened by other users
+    - FileExistsError: if there is something at address that is not a socket
+
+    Returns: None
+    """
+    folder = os.path.dirname(os.path.abspath(address))
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    info = os.lstat(folder)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{folder} must belong to this user and be private to them (chmod 700)")
+
+    try:
+        info = os.lstat(address)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode):
+        raise FileExistsError(f"{address} exists and is not a socket")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{address} belongs to another user")
+    os.remove(address)
+
+
+# -------------------------------------CLIENT--------------------------------------------- #
+
+class ModelClient:
+    """
+    Connection from a game to the model server. Requests are sent one at a time.
+
+    Parameters:
+    - address (str): the server's socket (default: DEFAULT_ADDRESS)
+    - authkey (bytes): the server's shared secret (default: None - see load_authkey)
+    """
+
+    def __init__(self, address: str=DEFAULT_ADDRESS, authkey: bytes=None):
+        self.address = address
+        self._connection = Client(address, family="AF_UNIX", authkey=authkey or load_authkey())
+        self._lock = threading.Lock()
+
+    def call(self, name: str, args, kwargs):
+        """
+        Calls a chatbot on the server and waits for its result.
+
+        Parameters:
+        - name (str): name of the chatbot, e.g. "qa_chatbot"
+        - args (tuple), kwargs (dict): arguments for the chatbot
+
+        Returns:
+        - the chatbot's result
+        """
+        with self._lock:
+            self._connection.send(("call", name, args, kwargs))
+            kind, value = self._connection.recv()
+        if kind == "error":
+            raise value
+        return value
+
+    def stream_story(self, story: str, seed: int, max_new_tokens: int=35):
+        """
+        Continues a story on the server (see chat_models.generate_story_tokens), yielding the text as it arrives.
+        Closing the generator early stops the generation on the server.
+
+        Yields:
+        - text (str): the next piece of the continuation
+        """
+        with self._lock:
+            self._connection.send(("stream", story, seed, max_new_tokens))
+            finished = False
+            try:
+                while True:
+                    kind, value = self._connection.recv()
+                    if kind == "piece":
+                        yield value
+                    elif kind == "error":
+                        finished = True
+                        raise value
+                    else:
+                        finished = True
+                        return
+            finally:
+                if not finished:
+                    # stopped early - tell the server, and skip the pieces it sent in the meantime
+                    self._connection.send(("cancel",))
+                    while self._connection.recv()[0] == "piece":
+                        pass
+
+    def pipeline(self, name: str):
+        """
+        Returns:
+        - pipeline (RemotePipeline): stands in for the chatbot name in chat_models
+        """
+        return RemotePipeline(self, name)
+
+    def close(self):
+        """Closes the connection to the server."""
+        self._connection.close()
+
+
+class RemotePipeline:
+    """
+    Stands in for one of the chatbots in chat_models, running it on the model server.
+    Called with the same arguments as the chatbot, and returns the same result.
+
+    Parameters:
+    - client (ModelClient): connection to the server
+    - name (str): name of the chatbot, e.g. "blenderbot"
+    """
+
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        result = self.client.call(self.name, args, kwargs)
+        # the blenderbot pipeline adds its response to the conversation it is given (a Conversation or a
+        # chat_models.ConversationHistory) - the server only changed its own copy, so copy the changes into the game's
+        if args and type(result) is type(args[0]) and hasattr(result, "__dict__"):
+            args[0].__dict__.update(result.__dict__)
+            return args[0]
+        return result
+
+    def generate_story_tokens(self, story: str, seed: int, max_new_tokens: int=35):
+        """Continues a story on the server, yielding the text as it arrives (see chat_models.generate_story_tokens)."""
+        return self.client.stream_story(story, seed, max_new_tokens)
+
+
+# -------------------------------------SERVER--------------------------------------------- #
+
+def portable_error(error):
+    """
+    Returns error, or a RuntimeError with the same message if error cannot be sent to the game
+    (some exceptions, e.g. transformers' PipelineException, cannot be unpickled).
+    """
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def handle(connection):
+    """
+    Answers one game's requests until it disconnects. Requests from all of the games connected to a worker are
+    batched together (see chat_models.submit_batched).
+    """
+    import chat_models
+
+    try:
+        while True:
+            request = connection.recv()
+            if request[0] == "call":
+                name, args, kwargs = request[1:]
+                # calls that look like the game's are batched with other games' calls; anything else runs on its own
+                if not kwargs and name in chat_models.batchers and not (name == "fm_chatbot" and not isinstance(args[0], str)):
+                    future = chat_models.submit_batched(name, *args)
+                else:
+                    future = chat_models.submit(chat_models.models[name], *args, **kwargs)
+                try:
+                    connection.send(("result", future.result()))
+                except Exception as error:
+                    connection.send(("error", portable_error(error)))
+
+            elif request[0] == "stream":
+                story, seed, max_new_tokens = request[1:]
+                stream = chat_models.submit_stream(chat_models.generate_story_tokens, story, seed, max_new_tokens=max_new_tokens)
+                while not stream.done():
+                    # stop if the game has cancelled the story
+                    if connection.poll(0.01):
+                        connection.recv()
+                        stream.cancel()
+                        break
+                    text = stream.read()
+                    if text:
+                        connection.send(("piece", text))
+                try:
+                    stream.result()
+                    connection.send(("end", None))
+                except Exception as error:
+                    connection.send(("error", portable_error(error)))
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        connection.close()
+
+
+def accept_connections(listener):
+    """Accepts games' connections forever, answering each one on its own thread."""
+    while True:
+        try:
+            connection = listener.accept()
+        except Exception:
+            # e.g. a client with the wrong authkey
+            continue
+        threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+
+def serve(address: str=DEFAULT_ADDRESS, workers: int=1, preload: bool=False, authkey: bytes=None, response_cache: str=None):
+    """
+    Runs the model server until it is stopped (Ctrl+C).
+
+    Parameters:
+    - address (str): socket to listen on (default: DEFAULT_ADDRESS)
+    - workers (int): number of worker processes (default: 1 - the server process answers the games itself)
+    - preload (bool): load every model before accepting connections, instead of when it is first used (default: False)
+    - authkey (bytes): shared secret the games must send (default: None - see load_authkey)
+    - response_cache (str): file to store the responses in, or None for no response cache (default: None) - each worker
+      opens it for itself after it is started, as an SQLite connection cannot be shared between processes
+
+    Returns: None
+    """
+    import chat_models
+
+    def open_response_cache():
+        if response_cache:
+            os.environ.pop("CHAT_MODELS_RESPONSE_CACHE", None)
+            chat_models.use_response_cache(response_cache)
+
+    private_socket_path(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey or load_authkey())
+    # only this user can connect, even if the folder is made readable later
+    os.chmod(address, 0o600)
+
+    # the tokenizers' own threads do not survive a fork - tokenize on one thread instead
+    if workers > 1:
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    if preload or workers > 1:
+        # load the models before forking, so the workers share them
+        chat_models.load_all()
+    print(f"model server listening on {address} with {workers} worker(s)", flush=True)
+
+    try:
+        if workers <= 1:
+            open_response_cache()
+            accept_connections(listener)
+        else:
+            # the workers all accept connections from the same socket - the operating system hands each new game to one of them
+            children = []
+            for i in range(workers):
+                pid = os.fork()
+                if pid == 0:
+                    # a worker - it gets its own connection to the response cache, and saves it before it exits
+                    # (os._exit skips the exit handlers, and must be used so the worker never returns into the parent's code)
+                    try:
+                        open_response_cache()
+                        accept_connections(listener)
+                    except KeyboardInterrupt:
+                        pass
+                    finally:
+                        if chat_models.response_cache is not None:
+                            chat_models.response_cache.close()
+                        os._exit(0)
+                children.append(pid)
+            for pid in children:
+                os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chat_models chatbots to games on this machine.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help=f"socket to listen on (default: {DEFAULT_ADDRESS})")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes sharing the models (default: 1)")
+    parser.add_argument("--preload", action="store_true", help="load every model before accepting connections")
+    parser.add_argument("--response-cache", help="store responses in this file (see chat_models.use_response_cache)")
+    parser.add_argument("--local-models", help="folder of local models to serve instead of the real ones (see benchmarks/game_loop.py)")
+    args = parser.parse_args()
+
+    if args.local_models:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+        from game_loop import install_local_models
+        install_local_models(args.local_models)
+
+    serve(args.address, args.workers, args.preload, response_cache=args.response_cache)
+
+
+if __name__ == "__main__":
+    main()
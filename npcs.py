@@ -0,0 +1,374 @@
+# Non-player characters (NPCs) for ai_game.py
+
+# Every NPC in the game works the same way: when the player walks into it, it shows the last thing the player said and
+# its response, and when the player hits RETURN or ENTER, it gives what the player typed to its model in the background
+# and shows "thinking..." until the response is ready. Only a few things differ from one NPC to the next - its name,
+# image and position, which model it uses, how the player's input is given to the model ("ask") and how the model's
+# output is turned into a response ("formatter").
+
+# So each NPC is an NPC object, and the NPCs themselves are described in a config file (npcs.json), one entry each:
+#   - name: unique name, used for the NPC's sprite and in the World (see world.py)
+#   - kind: which model task the NPC uses - "conversational", "question-answering", "fill-mask" or "story" (see KINDS)
+#   - model: the chatbot in chat_models.py, e.g. "blenderbot"
+#   - title: shown at the top of the text box while the player is talking to the NPC
+#   - speaker: the NPC's name in the text box, e.g. "P. Bear"
+#   - image, size, center: the NPC's image file, the size to draw it at (null for the image's own size), and where it stands
+#   - greeting: the first thing the NPC says (for a story NPC, the start of the story)
+#   - max_new_tokens: (story NPCs only) how many tokens to add to the story each time (default: 35)
+# Adding an NPC only takes a new entry in the config file.
+
+# The game loop only deals with the NPCs it needs to (see NPCRegistry): the ones waiting for their model, the ones near
+# the player (to preload their models) and the ones the player is touching - so dozens of NPCs cost no more per frame
+# than four.
+
+import json
+import random
+
+import chat_models
+from chat_models import ConversationHistory
+
+
+# -------------------------------------ASKING THE MODELS--------------------------------------------- #
+# Each "ask" function adds the player's input to the NPC's history and starts the NPC's model on it in the background.
+# It returns the Future for the response, or None if the NPC answered straight away.
+
+def ask_conversational(npc, text: str):
+    """
+    Polar Bear - model: facebook/blenderbot-400M-distill (https://huggingface.co/facebook/blenderbot-400M-distill)
+    The model reads the whole conversation, and adds its response to it itself.
+    (submit_batched runs it together with any other requests for the same chatbot - see chat_models.py)
+    """
+    npc.history.add_user_input(text)
+    return chat_models.submit_batched(npc.model.name, npc.history)
+
+def ask_question(npc, text: str):
+    """
+    Robot - model: distilbert-base-cased-distilled-squad (https://huggingface.co/distilbert-base-cased-distilled-squad)
+    The model answers the player's question about the game (chat_models.context).
+    """
+    npc.history.add_user_input(text)
+    return chat_models.submit_batched(npc.model.name, text, chat_models.context)
+
+def ask_fill_mask(npc, text: str):
+    """
+    Fox - model: distilroberta-base (https://huggingface.co/distilroberta-base)
+    The model fills in the word '<mask>' in the player's sentence - the Fox explains this if the word is missing.
+    """
+    npc.history.add_user_input(text)
+    if '<mask>' in text:
+        return chat_models.submit_batched(npc.model.name, text)
+    npc.history.append_response("I don't understand. Make sure your input contains the word <mask>.")
+    return None
+
+# -------------------------------------FORMATTING THE RESPONSES--------------------------------------------- #
+# Each formatter turns a model's output into the text the NPC says.
+
+def format_answer(output):
+    """We only want the answer, not the other information the question-answering model returns (score, etc.)."""
+    # format the response so the text looks normal
+    return output["answer"].capitalize() + "."
+
+def format_fill_mask(output):
+    """The sentence with the filled-in blank, and the most likely words for the blank."""
+    # the most likely words, separated by commas, with a period after the last one
+    words = ",".join(prediction["token_str"] for prediction in output) + "."
+    return f"{output[0]['sequence']} The most likely words are:{words}"
+
+# kind -> (ask function, formatter) - conversational models add their response to the history themselves
+KINDS = {
+    "conversational": (ask_conversational, None),
+    "question-answering": (ask_question, format_answer),
+    "fill-mask": (ask_fill_mask, format_fill_mask),
+}
+
+# -------------------------------------NPCS--------------------------------------------- #
+
+class NPC:
+    """
+    A non-player character the player can talk to, backed by one of the models in chat_models.py.
+
+    Parameters:
+    - name (str): unique name for the NPC, e.g. "robot"
+    - title (str): title of the text box while the player is talking to the NPC
+    - speaker (str): the NPC's name in the text box
+    - sprite (pygame.Surface): the NPC's image
+    - rect (pygame.Rect): where the NPC is
+    - model (chat_models.LazyPipeline): the NPC's chatbot, e.g. chat_models.qa_chatbot
+    - greeting (str): the first thing the NPC says
+    - ask (function): takes the NPC and the player's input, and returns the Future for the response (see KINDS)
+    - formatter (function): turns the model's output into the NPC's response, or None if the model adds its response to
+      the history itself
+
+    Attributes:
+    - history (ConversationHistory): what the player and the NPC have said
+    - reply (concurrent.futures.Future): the response the NPC is waiting for, or None
+    """
+
+    __slots__ = ("name", "title", "speaker", "sprite", "rect", "model", "history", "reply", "ask", "formatter")
+
+    def __init__(self, name, title, speaker, sprite, rect, model, greeting, ask, formatter=None):
+        self.name = name
+        self.title = title
+        self.speaker = speaker
+        self.sprite = sprite
+        self.rect = rect
+        self.model = model
+        self.ask = ask
+        self.formatter = formatter
+        self.reply = None
+        self.history = ConversationHistory()
+        self.history.append_response(greeting)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+    def poll(self):
+        """
+        If the model has finished responding, adds the response to the history and stops waiting.
+        result() raises any error from the model here, in the event loop.
+
+        Returns: None
+        """
+        if self.reply is not None and self.reply.done():
+            output = self.reply.result()
+            if self.formatter is not None:
+                self.history.append_response(self.formatter(output))
+            self.reply = None
+
+    def update(self, write_lines, input_text: str, new_user_input: bool):
+        """
+        Writes the conversation to the text box, and gives the player's input to the model if they hit RETURN or ENTER.
+        Called on every frame the player is touching the NPC.
+
+        Parameters:
+        - write_lines (function): ai_game.write_lines - takes (lines, x, y, colour) and returns the y-value of the next line
+        - input_text (str): what the player has typed so far
+        - new_user_input (bool): True if the player hit RETURN or ENTER on this frame
+
+        Returns:
+        - used (bool): True if the input was given to the model (the game then clears input_text)
+        """
+        # if the chatbot is still responding, show the user's input and a "thinking" message
+        if self.reply is not None:
+            y = write_lines(["You: " + self.history.new_user_input], 10, 560, "black")
+            write_lines([f"{self.speaker}: thinking..."], 10, y, "blue")
+
+        # if the player has not spoken to the chatbot yet
+        elif len(self.history.past_user_inputs) == 0:
+            # show the most recent bot response and get the y-coordinate for the next line
+            y = write_lines([f"{self.speaker}: " + self.history.generated_responses[-1]], 10, 560, "blue")
+            # on the next line, show the user's input on screen as they type it out
+            write_lines([f"You: {input_text}"], 10, y, "black")
+
+        else:
+            # show the most recent user input and get the y-coordinate for the next line
+            y = write_lines(["You: " + self.history.past_user_inputs[-1]], 10, 560, "black")
+            # on the next line, show the most recent bot response and get the y-coordinate for the next line
+            y2 = write_lines([f"{self.speaker}: " + self.history.generated_responses[-1]], 10, y, "blue")
+            # on the next line, show the user's input on screen as they type it out
+            write_lines([f"You: {input_text}"], 10, y2, "black")
+
+        # if the player hits the RETURN or ENTER key (the input is kept until the chatbot has finished its last response)
+        if new_user_input == True and self.reply is None:
+            self.reply = self.ask(self, input_text)
+            return True
+        return False
+
+    def backspace(self):
+        """
+        Called when the player presses BACKSPACE while talking to the NPC (the game removes the last letter of the input).
+
+        Returns: None
+        """
+
+
+class StoryNPC(NPC):
+    """
+    An NPC that tells a story with a text-generating model, continuing it each time the player hits RETURN or ENTER, and
+    starting it again when the player hits BACKSPACE.
+    Moose - model: gpt2 (https://huggingface.co/gpt2)
+
+    The story is shown word by word as the model writes it: reply is a chat_models.TokenStream instead of a Future.
+
+    Parameters: the same as NPC (greeting is the start of the story, and ask and formatter are not used), and
+    - max_new_tokens (int): how many tokens to add to the story each time (default: 35)
+
+    Attributes:
+    - story (str): the story so far
+    - seed (int): the random seed the model continues the story with - a new one is picked when the story is reset
+    """
+
+    __slots__ = ("opening", "story", "seeds", "seed", "max_new_tokens")
+
+    def __init__(self, name, title, speaker, sprite, rect, model, greeting, ask=None, formatter=None, max_new_tokens: int=35):
+        super().__init__(name, title, speaker, sprite, rect, model, greeting, ask, formatter)
+        self.opening = greeting
+        self.story = greeting
+        self.max_new_tokens = max_new_tokens
+        # create a list of random numbers to be used as seeds for the text-generating model
+        self.seeds = [random.randint(0,500) for i in range(100)]
+        # use the first entry as the current seed
+        self.seed = self.seeds[0]
+
+    def poll(self):
+        """
+        Adds each new piece of the story to it as soon as it arrives, and stops waiting once the model has finished.
+        result() raises any error from the model here, in the event loop.
+
+        Returns: None
+        """
+        if self.reply is not None:
+            self.story += self.reply.read()
+            if self.reply.done():
+                self.reply.result()
+                self.reply = None
+
+    def update(self, write_lines, input_text: str, new_user_input: bool):
+        """
+        Writes the story to the text box, and continues it in the background if the player hit RETURN or ENTER.
+        See NPC.update.
+        """
+        # show the story, and a "thinking" message while the model is continuing it
+        if self.reply is not None:
+            write_lines([f"{self.speaker}: " + self.story + " (thinking...)"], 10, 560, "blue")
+        else:
+            write_lines([f"{self.speaker}: " + self.story], 10, 560, "blue")
+
+        # show instructions for player
+        write_lines(["TIP - Hit RETURN or ENTER to continue the story, or BACKSPACE to reset it."], 10, 670, "black")
+
+        # if the player hits the RETURN or ENTER key, continue the story in the background, token by token
+        # (ignored if the model is still continuing the story)
+        # Note: the seed is set on the inference thread right before the model starts sampling, see chat_models.generate_story_tokens
+        if new_user_input == True and self.reply is None:
+            self.reply = chat_models.submit_stream(chat_models.generate_story_tokens, self.story, self.seed,
+                                                   max_new_tokens=self.max_new_tokens)
+            return True
+        return False
+
+    def backspace(self):
+        """
+        Resets the story to its opening (e.g. 'Once upon a time,') and picks a new seed.
+
+        Returns: None
+        """
+        self.story = self.opening
+
+        # if the NPC is still continuing the old story, stop it
+        if self.reply is not None:
+            self.reply.cancel()
+            self.reply = None
+
+        # forget the model's cached keys and values for the old story
+        chat_models.reset_story_cache()
+
+        # select a random new number from the seed list to be the new seed
+        self.seed = random.choice(self.seeds)
+
+
+class NPCRegistry:
+    """
+    All the NPCs in the game, in the order they were added.
+
+    The game loop only deals with the NPCs it needs to on each frame: poll() only checks the NPCs waiting for their
+    model, and nearby() and touching() pick out NPCs by the names World.query() found near or touching the player.
+    """
+
+    def __init__(self):
+        # name -> NPC
+        self._npcs = {}
+        # the NPCs waiting for their model (a dict, so they are polled in a fixed order)
+        self._waiting = {}
+
+    def __iter__(self):
+        return iter(self._npcs.values())
+
+    def __len__(self):
+        return len(self._npcs)
+
+    def __contains__(self, name):
+        return name in self._npcs
+
+    def __getitem__(self, name):
+        return self._npcs[name]
+
+    @classmethod
+    def load(cls, path: str, sprites):
+        """
+        Creates the NPCs described in a config file (see the top of this file).
+        Each NPC's image is added to the sprite atlas, so this must be called before the atlas is loaded.
+
+        Parameters:
+        - path (str): the config file, e.g. "npcs.json"
+        - sprites (assets.SpriteAtlas): the game's sprite atlas
+
+        Returns:
+        - npcs (NPCRegistry): the NPCs
+        """
+        with open(path) as file:
+            config = json.load(file)
+
+        for entry in config:
+            sprites.add(entry["name"], entry["image"], entry.get("size"))
+
+        registry = cls()
+        for entry in config:
+            sprite = sprites.get(entry["name"])
+            arguments = dict(name=entry["name"], title=entry["title"], speaker=entry["speaker"], sprite=sprite,
+                             rect=sprite.get_rect(center=tuple(entry["center"])), model=chat_models.models[entry["model"]],
+                             greeting=entry["greeting"])
+            if entry["kind"] == "story":
+                npc = StoryNPC(**arguments, max_new_tokens=entry.get("max_new_tokens", 35))
+            elif entry["kind"] in KINDS:
+                ask, formatter = KINDS[entry["kind"]]
+                npc = NPC(**arguments, ask=ask, formatter=formatter)
+            else:
+                raise ValueError(f"NPC {entry['name']!r} has an unknown kind: {entry['kind']!r}")
+            registry.add(npc)
+        return registry
+
+    def add(self, npc):
+        """
+        Adds an NPC.
+
+        Parameters:
+        - npc (NPC): the NPC - its name must be unique
+
+        Returns: None
+        """
+        if npc.name in self._npcs:
+            raise ValueError(f"there is already an NPC named {npc.name!r}")
+        self._npcs[npc.name] = npc
+
+    def nearby(self, names):
+        """
+        Returns:
+        - npcs (list[NPC]): the NPCs among names, e.g. the objects World.query() found near the player
+        """
+        return [self._npcs[name] for name in names if name in self._npcs]
+
+    # the same lookup, for the objects the player is touching
+    touching = nearby
+
+    def poll(self):
+        """
+        Polls the NPCs that are waiting for their model (see NPC.poll) - the others are not checked.
+
+        Returns: None
+        """
+        for npc in list(self._waiting):
+            npc.poll()
+            if npc.reply is None:
+                del self._waiting[npc]
+
+    def update(self, npc, write_lines, input_text: str, new_user_input: bool):
+        """
+        Updates an NPC the player is touching (see NPC.update), and remembers it if it starts waiting for its model.
+
+        Returns:
+        - used (bool): True if the input was given to the model
+        """
+        used = npc.update(write_lines, input_text, new_user_input)
+        if npc.reply is not None:
+            self._waiting[npc] = None
+        return used
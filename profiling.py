@@ -0,0 +1,213 @@
+# Frame profiling for simple_pygame.py and ai_game.py
+
+# The event loop is split into sections (EVENT LISTENERS, MOVEMENTS, ...). A FrameProfiler times each section on every
+# frame with a "lap timer": lap(name) records the time since the previous lap as the time taken by section name.
+# This only costs one time.perf_counter() call per section, so the games can leave it on all the time.
+
+# The timings can be shown on screen while the game runs (draw_overlay) and saved as a Chrome trace
+# (export_chrome_trace), which can be opened in chrome://tracing or https://ui.perfetto.dev to see every frame's sections
+# on a timeline.
+
+import json
+import time
+from collections import deque
+from itertools import islice
+
+# sections that spend their time waiting rather than working - never reported as the slowest section
+IDLE_SECTIONS = ("clock",)
+
+
+class FrameProfiler:
+    """
+    Times each section of the event loop on every frame, keeping the most recent frames.
+
+    Call start_frame() at the top of the event loop, then lap(name) at the end of each section.
+
+    Parameters:
+    - history (int): number of frames to keep timings for (default: 10000)
+
+    Attributes:
+    - frames (int): number of frames finished so far - keeps counting after the oldest timings are dropped
+    - frame_times (deque[float]): seconds from the start of one frame to the start of the next, for each frame
+    - sections (dict[str, deque[float]]): seconds taken by each section on each frame, in the order the sections first ran
+    - trace (deque[tuple]): (name, start, duration) in seconds for every section and frame, for export_chrome_trace()
+    """
+
+    def __init__(self, history: int=10000):
+        self.history = history
+        self.frames = 0
+        self.frame_times = deque(maxlen=history)
+        self.sections = {}
+        # room for about 16 sections per frame
+        self.trace = deque(maxlen=history * 16)
+        self._frame_start = None
+        self._last = None
+        # times in the trace are measured from here
+        self._origin = time.perf_counter()
+        # the overlay text, and the frame it was last worked out on (see overlay_lines)
+        self._overlay = []
+        self._overlay_frame = None
+
+    def start_frame(self):
+        """
+        Marks the start of a frame (and the end of the previous one).
+
+        Returns: None
+        """
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self.frame_times.append(now - self._frame_start)
+            self.frames += 1
+            self.trace.append(("frame", self._frame_start, now - self._frame_start))
+        self._frame_start = now
+        self._last = now
+
+    def lap(self, name: str):
+        """
+        Records the time since the last lap (or the start of the frame) as the time taken by section name.
+
+        Parameters:
+        - name (str): name of the section that has just finished, e.g. "events"
+
+        Returns: None
+        """
+        now = time.perf_counter()
+        try:
+            self.sections[name].append(now - self._last)
+        except KeyError:
+            self.sections[name] = deque([now - self._last], maxlen=self.history)
+        self.trace.append((name, self._last, now - self._last))
+        self._last = now
+
+    def summary(self):
+        """
+        Returns:
+        - summary (dict[str, dict[str, float]]): for each section, and for the whole frame ("frame"), the mean, p50, p95,
+          p99 and max time in milliseconds
+        """
+        summary = {}
+        for name, times in list(self.sections.items()) + [("frame", self.frame_times)]:
+            if times:
+                summary[name] = {
+                    "mean": sum(times) / len(times) * 1000,
+                    "p50": percentile(times, 50) * 1000,
+                    "p95": percentile(times, 95) * 1000,
+                    "p99": percentile(times, 99) * 1000,
+                    "max": max(times) * 1000,
+                }
+        return summary
+
+    def report(self):
+        """
+        Returns:
+        - report (str): the summary as a table, one row per section
+        """
+        lines = [f"{'section':<16}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}   (ms, {len(self.frame_times)} frames)"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<16}{stats['mean']:>9.3f}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+        return "\n".join(lines)
+
+    def overlay_lines(self, frames: int=60, refresh: int=15):
+        """
+        Returns the text for the on-screen overlay: the average frame time over the last frames, and the section that
+        took the longest on average. The text is only worked out again every refresh frames, so it is cheap to call
+        every frame and does not flicker.
+
+        Parameters:
+        - frames (int): number of recent frames to average over (default: 60, one second at 60 FPS)
+        - refresh (int): number of frames between updates of the text (default: 15)
+
+        Returns:
+        - lines (list[str]): lines of text for the overlay
+        """
+        # counted with frames, not len(frame_times) - frame_times stops growing once it holds history frames
+        if self._overlay_frame is not None and self.frames - self._overlay_frame < refresh:
+            return self._overlay
+        self._overlay_frame = self.frames
+
+        if self.frames == 0:
+            self._overlay = ["frame: -", "slowest: -"]
+            return self._overlay
+
+        recent = list(islice(reversed(self.frame_times), frames))
+        frame_time = sum(recent) / len(recent)
+
+        slowest_name = "-"
+        slowest_time = 0.0
+        for name, times in self.sections.items():
+            if name in IDLE_SECTIONS:
+                continue
+            recent = list(islice(reversed(times), frames))
+            section_time = sum(recent) / len(recent)
+            if section_time > slowest_time:
+                slowest_name = name
+                slowest_time = section_time
+
+        self._overlay = [
+            f"frame: {frame_time * 1000:.2f} ms ({1 / frame_time if frame_time > 0 else 0:.0f} FPS)",
+            f"slowest: {slowest_name} {slowest_time * 1000:.3f} ms",
+        ]
+        return self._overlay
+
+    def draw_overlay(self, surface, font, rect):
+        """
+        Draws the overlay text (see overlay_lines) in a box on surface.
+
+        Parameters:
+        - surface (pygame.Surface): surface to draw on, e.g. the display surface
+        - font (pygame.font.Font): font for the text
+        - rect (pygame.Rect): the box to draw the overlay in
+
+        Returns: None
+        """
+        import pygame
+
+        pygame.draw.rect(surface, (40, 40, 40), rect)
+        y = rect.top + 4
+        for line in self.overlay_lines():
+            surface.blit(font.render(line, True, (255, 255, 255)), (rect.left + 6, y))
+            y += 20
+
+    def export_chrome_trace(self, path: str):
+        """
+        Saves the recorded sections and frames as a Chrome trace (JSON), which can be opened in chrome://tracing or
+        https://ui.perfetto.dev. Sections are shown on one track and whole frames on another.
+
+        Parameters:
+        - path (str): file to write
+
+        Returns: None
+        """
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "event loop sections"}},
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": {"name": "frames"}},
+        ]
+        for name, start, duration in self.trace:
+            events.append({
+                "name": name,
+                "ph": "X",
+                "pid": 1,
+                "tid": 2 if name == "frame" else 1,
+                # Chrome traces use microseconds
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+            })
+
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def percentile(values, p: float):
+    """
+    Returns the p-th percentile of values (nearest-rank method).
+
+    Parameters:
+    - values: numbers, in any order (must not be empty)
+    - p (float): percentile from 0 to 100
+
+    Returns:
+    - value (float): the smallest value that at least p percent of values are less than or equal to
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
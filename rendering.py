@@ -0,0 +1,232 @@
+# Rendering helpers for simple_pygame.py and ai_game.py
+
+# Redrawing the whole window every frame is wasteful: while the player stands still, nothing on screen changes.
+# A DirtyRectRenderer keeps track of what was drawn where on the last frame, and only redraws (and only sends to
+# the display) the parts of the window that changed - the "dirty rectangles".
+
+import pygame
+
+
+class DirtyRectRenderer:
+    """
+    Redraws only the parts of the screen that have changed since the last frame.
+
+    Each frame, the game calls track() for everything that can change (the player, the text box, the inventory...),
+    then calls redraw() once with a function that draws the whole scene. redraw() calls that function once for each
+    dirty rectangle with drawing clipped to the rectangle, so only the changed pixels are drawn, and returns the
+    rectangles so the game can update only those parts of the display with pygame.display.update(rects).
+
+    Parameters:
+    - screen (pygame.Surface): the display surface
+    """
+
+    def __init__(self, screen):
+        self.screen = screen
+        # name -> (rect, state) of every tracked item on the last frame
+        self._previous = {}
+        # names of the items tracked on this frame
+        self._seen = set()
+        # the first frame draws the whole screen
+        self._dirty = [screen.get_rect()]
+
+    def track(self, name: str, rect, state=None):
+        """
+        Tracks an item that can move or change. If the item has moved or its state has changed since the last frame,
+        both its old and new rectangles are marked as dirty.
+
+        Parameters:
+        - name (str): unique name for the item, e.g. "bear"
+        - rect (pygame.Rect): where the item is drawn this frame
+        - state: anything that changes how the item looks, e.g. the text in a text box - it is compared with == to the
+          state from the last frame
+
+        Returns: None
+        """
+        rect = pygame.Rect(rect)
+        self._seen.add(name)
+
+        previous = self._previous.get(name)
+        if previous is None or previous[0] != rect or previous[1] != state:
+            if previous is not None:
+                self._dirty.append(previous[0])
+            self._dirty.append(rect)
+            self._previous[name] = (rect, state)
+
+    def mark(self, rect):
+        """
+        Marks a rectangle as dirty, so it is redrawn on this frame.
+
+        Parameters:
+        - rect (pygame.Rect): the rectangle to redraw
+
+        Returns: None
+        """
+        self._dirty.append(pygame.Rect(rect))
+
+    def mark_all(self):
+        """Marks the whole screen as dirty, e.g. after the window has been covered up and shown again."""
+        self._dirty.append(self.screen.get_rect())
+
+    def redraw(self, draw_scene):
+        """
+        Redraws the dirty parts of the screen. Pass the returned rectangles to pygame.display.update() to show them.
+
+        Parameters:
+        - draw_scene (function): takes no arguments and draws the whole scene onto the screen
+
+        Returns:
+        - rects (list[pygame.Rect]): the rectangles that were redrawn
+        """
+        # items that were tracked on the last frame but not on this one have disappeared, so their old rectangles are dirty
+        for name in list(self._previous):
+            if name not in self._seen:
+                self._dirty.append(self._previous.pop(name)[0])
+        self._seen.clear()
+
+        # combine overlapping rectangles, and cut them down to the part inside the screen
+        screen_rect = self.screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in merge_rects(self._dirty) if rect.colliderect(screen_rect)]
+        self._dirty = []
+
+        for rect in rects:
+            self.screen.set_clip(rect)
+            draw_scene()
+        self.screen.set_clip(None)
+
+        return rects
+
+
+def merge_rects(rects):
+    """
+    Combines overlapping rectangles, so each part of the screen is only redrawn once.
+
+    Parameters:
+    - rects (list[pygame.Rect]): rectangles that may overlap
+
+    Returns:
+    - merged (list[pygame.Rect]): rectangles that do not overlap and cover all of rects
+    """
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        # keep absorbing merged rectangles that overlap this one (the union can grow to overlap others)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        if rect.width > 0 and rect.height > 0:
+            merged.append(rect)
+    return merged
+
+
+class BackgroundLayer:
+    """
+    Everything in the scene that does not move (the background, the boxes, the wall, the objects and the NPCs),
+    drawn once onto a surface of its own. Each frame, the game blits this one surface instead of drawing every
+    static item separately. When a static item changes, call invalidate() and the surface is redrawn the next
+    time it is used.
+
+    Parameters:
+    - size (tuple[int, int]): size of the layer in pixels - the size of the screen
+    - draw_static (function): takes a surface and draws all of the static items onto it
+
+    Attributes:
+    - rebuilds (int): number of times the layer has been drawn
+    """
+
+    def __init__(self, size, draw_static):
+        # convert() gives the surface the same pixel format as the display, so blitting it is as fast as possible
+        self.surface = pygame.Surface(size).convert()
+        self._draw_static = draw_static
+        self._valid = False
+        self.rebuilds = 0
+
+    def invalidate(self):
+        """
+        Marks the layer as out of date, e.g. after one of the static items has changed how it looks.
+        The layer is redrawn the next time draw() is called.
+
+        Returns: None
+        """
+        self._valid = False
+
+    def draw(self, screen):
+        """
+        Blits the layer onto the screen, redrawing it first if it is out of date.
+        Only the part inside the screen's clipping rectangle is copied.
+
+        Parameters:
+        - screen (pygame.Surface): the display surface
+
+        Returns: None
+        """
+        if not self._valid:
+            self._draw_static(self.surface)
+            self._valid = True
+            self.rebuilds += 1
+        screen.blit(self.surface, (0,0))
+
+
+class RenderQueue:
+    """
+    Collects the blits for a frame and draws them all with one Surface.blits() call, in order of their layer.
+
+    Each blit is a separate python call into pygame, so drawing many sprites one screen.blit() at a time spends more
+    time in python than in copying pixels. Instead, the game adds everything it wants to draw on this frame to the
+    queue, and the queue hands the whole list to pygame at once. Blits on a higher layer are drawn on top; blits on the
+    same layer are drawn in the order they were added.
+
+    The queue is kept until clear() is called, so it can be drawn several times - once for each dirty rectangle
+    (see DirtyRectRenderer.redraw).
+
+    Attributes:
+    - count (int): number of blits in the queue
+    """
+
+    def __init__(self):
+        # (layer, surface, position, area) of every blit, in the order they were added
+        self._blits = []
+        # the blits sorted by layer, as (surface, position, area) for Surface.blits() - None until the queue is drawn
+        self._sorted = None
+
+    @property
+    def count(self):
+        return len(self._blits)
+
+    def add(self, surface, position, layer: int=0, area=None):
+        """
+        Adds a blit to the queue.
+
+        Parameters:
+        - surface (pygame.Surface): the image to draw, e.g. a sprite or rendered text
+        - position (tuple[int, int] or pygame.Rect): where to draw it (the top left corner)
+        - layer (int): higher layers are drawn on top of lower ones (default: 0)
+        - area (pygame.Rect): only draw this part of surface, e.g. one sprite of an atlas (default: all of it)
+
+        Returns: None
+        """
+        self._blits.append((layer, surface, position, area))
+        self._sorted = None
+
+    def clear(self):
+        """Empties the queue, ready for the next frame."""
+        self._blits.clear()
+        self._sorted = None
+
+    def draw(self, target):
+        """
+        Draws every blit in the queue onto target with one Surface.blits() call, lowest layer first.
+        Only the part inside target's clipping rectangle is drawn.
+
+        Parameters:
+        - target (pygame.Surface): where to draw, e.g. the display surface
+
+        Returns: None
+        """
+        if self._sorted is None:
+            # sorted() is stable, so blits on the same layer keep the order they were added in
+            self._sorted = [(surface, position, area) for layer, surface, position, area in sorted(self._blits, key=lambda blit: blit[0])]
+        target.blits(self._sorted, doreturn=False)
@@ -0,0 +1,196 @@
+# Persistent response cache for the NPC models in chat_models.py
+
+# The Fox (fill-mask) and the Robot (question-answering) always give the same response to the same input, and the Moose
+# always continues the same story the same way with the same seed. Instead of running the model again, a ResponseCache
+# stores every response in a small SQLite database on disk, so a repeated input - even after the game is restarted -
+# only costs a lookup.
+
+# Each response is stored under a key made from everything that can change it: the model, its revision, the input,
+# the seed and the generation settings. The key is a hash of those values, so any change gives a different key.
+
+# Looking a response up never writes to the database: how often and when each response was used is counted in memory,
+# and only written to disk with the next put(), or by close() - one write for many lookups.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Stores model responses in an SQLite database, keyed by a hash of everything the response depends on.
+    When the stored responses take up more than max_bytes, the least recently used ones are removed.
+
+    Responses must be JSON values (strings, numbers, lists and dicts), e.g. the pipelines' outputs.
+    Safe to use from several threads. Call close() when done, to save how often each response was used.
+
+    Parameters:
+    - path (str): database file, created if it does not exist (":memory:" keeps the cache in memory only)
+    - max_bytes (int): maximum total size of the stored responses, in bytes (default: 64 MB)
+
+    Attributes:
+    - hits (int): number of lookups that found a response
+    - misses (int): number of lookups that did not
+    """
+
+    def __init__(self, path: str, max_bytes: int=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # responses loaded into memory by warm_up(), as JSON text by key (so every lookup returns a new copy)
+        self._memory = {}
+        # uses not written to the database yet: key -> [number of uses, time of the last use] (see _save_uses)
+        self._uses = {}
+        self._lock = threading.Lock()
+        # the model runs on another thread than the one that opens the cache, so the connection is shared (with the lock)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                        key TEXT PRIMARY KEY,
+                                        response TEXT NOT NULL,
+                                        size INTEGER NOT NULL,
+                                        uses INTEGER NOT NULL,
+                                        last_used REAL NOT NULL)""")
+        self._connection.commit()
+        self._size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, revision, model_input, seed=None, params=None):
+        """
+        Returns the key for a response: a hash of the model, its revision, the input, the seed and the generation settings.
+
+        Parameters:
+        - model (str): model name, e.g. "distilroberta-base"
+        - revision (str): the model's revision (commit hash), or None if it is not known
+        - model_input: the input given to the model (any JSON value)
+        - seed (int): random seed, for models that sample (default: None)
+        - params (dict): any other settings that change the response, e.g. {"max_new_tokens": 35} (default: None)
+
+        Returns:
+        - key (str): SHA-256 hash of the values, in hexadecimal
+        """
+        values = {"model": model, "revision": revision, "input": model_input, "seed": seed, "params": params or {}}
+        return hashlib.sha256(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Looks up a response.
+
+        Parameters:
+        - key (str): the response's key (see key())
+
+        Returns:
+        - response: the stored response, or None if there is none
+        """
+        with self._lock:
+            text = self._memory.get(key)
+            if text is None:
+                row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                text = row[0]
+
+            self.hits += 1
+            # counted in memory - written to the database later (see _save_uses)
+            uses = self._uses.get(key)
+            if uses is None:
+                self._uses[key] = [1, time.time()]
+            else:
+                uses[0] += 1
+                uses[1] = time.time()
+            return json.loads(text)
+
+    def put(self, key: str, response):
+        """
+        Stores a response, removing the least recently used responses if the cache is over max_bytes.
+        A response bigger than max_bytes on its own is not stored.
+
+        Parameters:
+        - key (str): the response's key (see key())
+        - response: the response (any JSON value)
+
+        Returns: None
+        """
+        text = json.dumps(response)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            # it would never fit - storing it would only remove every other response
+            return
+        with self._lock:
+            # save the uses first, so the least recently used responses below really are
+            self._save_uses()
+            old = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, 0, ?)", (key, text, size, time.time()))
+            self._memory.pop(key, None)
+            self._uses.pop(key, None)
+            self._size += size
+
+            # remove the least recently used responses until the cache fits again
+            while self._size > self.max_bytes:
+                row = self._connection.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+                if row is None:
+                    break
+                key, size = row
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._size -= size
+            self._connection.commit()
+
+    def warm_up(self, max_entries: int=256):
+        """
+        Loads the most used responses into memory, so looking them up does not need to read the database.
+        Call this when the game starts.
+
+        Parameters:
+        - max_entries (int): number of responses to load (default: 256)
+
+        Returns:
+        - loaded (int): number of responses loaded
+        """
+        with self._lock:
+            self._save_uses()
+            self._connection.commit()
+            rows = self._connection.execute("SELECT key, response FROM responses ORDER BY uses DESC, last_used DESC LIMIT ?", (max_entries,)).fetchall()
+            for key, text in rows:
+                self._memory[key] = text
+        return len(rows)
+
+    def clear(self):
+        """Removes every stored response."""
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+            self._memory.clear()
+            self._uses.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns:
+        - stats (dict): hits, misses, number of stored responses and their total size in bytes
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "size_bytes": self._size}
+
+    def close(self):
+        """Saves the uses counted since the last put() and closes the database. Does nothing if it is already closed."""
+        with self._lock:
+            if self._connection is None:
+                return
+            self._save_uses()
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _save_uses(self):
+        """Writes the uses counted in memory to the database, in one statement (not committed - the caller commits)."""
+        if self._uses:
+            self._connection.executemany("UPDATE responses SET uses = uses + ?, last_used = MAX(last_used, ?) WHERE key = ?",
+                                         [(count, last_used, key) for key, (count, last_used) in self._uses.items()])
+            self._uses.clear()
@@ -10,6 +10,15 @@
 import pygame
 from pygame.locals import *
 
+# redraws only the parts of the screen that change
+from rendering import DirtyRectRenderer
+# times the sections of the event loop
+from profiling import FrameProfiler
+# runs the game logic at a fixed rate, however long each frame takes
+from timestep import FixedTimestep, interpolate_rect
+# the state of the tree, the lock and the key
+from game_state import GameState, Key, Lock
+
 # initialize all imported pygame modules - this will raise exceptions if it fails
 pygame.init()
 
@@ -18,6 +27,19 @@ running = True
 
 # clock for setting frame rate of game (see end of event loop)
 clock = pygame.time.Clock()
+# the most frames drawn per second - 0 for no limit
+FRAME_RATE_LIMIT = 120
+
+# the player moves in fixed "ticks" of game logic, 60 per second, whatever the frame rate (see timestep.py and MOVEMENTS)
+# after a slow frame, up to MAX_TICKS_PER_FRAME ticks run to catch up, so the player keeps moving at the same speed -
+# set FRAME_SKIP to False to run at most one tick per frame instead (the game then slows down with the frame rate)
+TICK_RATE = 60
+FRAME_SKIP = True
+MAX_TICKS_PER_FRAME = 5
+timestep = FixedTimestep(TICK_RATE, frame_skip=FRAME_SKIP, max_ticks_per_frame=MAX_TICKS_PER_FRAME)
+
+# times each section of the event loop on every frame (see profiling.py and benchmarks/game_loop.py)
+profiler = FrameProfiler()
 
 # set display window size (width, height) - the window is pygame's built-in GUI
 screen = pygame.display.set_mode((700,500))
@@ -31,10 +53,16 @@ screen = pygame.display.set_mode((700,500))
 # bear icon - player's character
 bear_surf = pygame.image.load('ai_game_images/brown_bear.png').convert_alpha()
 bear_loc = bear_surf.get_rect()
+# where the player was before the last tick of game logic (see MOVEMENTS)
+bear_prev = bear_loc.copy()
 
 # obstacle - wall
 wall = pygame.Rect((200,200),(10,100))
 
+# text box and inventory box at the bottom of the window
+text_box = pygame.Rect(10,400,480,90)
+inventory_box = pygame.Rect(500,400,190,90)
+
 # tree icon - interactive object
 tree_surf = pygame.image.load('ai_game_images/tree.png').convert_alpha()
 tree_loc = tree_surf.get_rect(center = (400,200))
@@ -48,7 +76,9 @@ key_loc = key_surf.get_rect(center = (595,445))
 # lock icon - interactive object
 lock_surf_large = pygame.image.load('ai_game_images/lock.png').convert_alpha()
 # resize image
-lock_surf = pygame.transform.scale(lock_surf_large, (72,72))
+locked_surf = pygame.transform.scale(lock_surf_large, (72,72))
+# the lock icon drawn on the screen - changes to unlocked_surf once the key is used (see INTERACTING WITH TREE AND LOCK)
+lock_surf = locked_surf
 lock_loc = key_surf.get_rect(center = (150,300))
 
 # unlocked lock icon - will not appear until key is used on lock
@@ -59,32 +89,13 @@ unlocked_surf = pygame.transform.scale(unlocked_surf_large, (72,72))
 
 # -------------------------------------FLAGS FOR INTERACTIVE OBJECTS--------------------------------------------- #
 
-# For Tree:
-climb_tree = "None"     # holds player's response for interaction with tree:
-                        #   - "None": tree is not interacted with
-                        #   - "Yes": player wants to climb tree
-                        #   - "No": player does not want to climb tree
-
-tree_climbed = False    # True when the player has climbed the tree
-                        # Prevents tree from being interacted with after player climbs tree
-
-# For Lock:
-open_lock = "None"      # holds player's response for interaction with lock:
-                        #   - "None": lock is not interacted with
-                        #   - "Yes": player wants to use key on lock
-                        #   - "No": player does not want to use key on lock
-
-lock_state = "Locked"   # current state of lock, either "Locked" or "Unlocked"
-
-# For Key:
-key = False             # whether or not the player has the key
-                        #   - False: player does not have key
-                        #   - True: player has key
-
-key_used = "None"       # whether or not the key has been used
-                        #   - "None": player does not have key
-                        #   - "Yes": player used key
-                        #   - "No": player has key but has not used it
+# For Tree, Lock and Key:
+state = GameState(text_y=420)   # the state of the tree, the lock and the key, and what the player is touching (see game_state.py)
+                                #   - state.tree: the key is at the top, the player said yes or no, or the tree has been climbed
+                                #   - state.lock: locked, the player said yes or no, or unlocked
+                                #   - state.key: in the tree, in the inventory, or used
+                                # state.prompt is what the tree or the lock says - it is only worked out again when the
+                                # state changes, not on every frame
 
 # -------------------------------------TEXT HANDLING--------------------------------------------- #
 # Note: General text will be black, player's response text will be blue
@@ -92,11 +103,16 @@ key_used = "None"       # whether or not the key has been used
 # font object - used to render strings into surfaces
 font = pygame.font.SysFont("lucidaconsole", 14)
 
+# lines of text written to the text box on the current frame, as (text, colour, (x,y)) - see write_lines()
+# they are drawn by draw_scene() at the end of the event loop
+text_to_draw = []
+
 # write lines to screen
 def write_lines(lines: list[str], x: int, y: int, colour: str="black"):
     """
-    Draws lines of text on the display surface (screen). The top left corner of the first line of text
+    Writes lines of text to the text box. The top left corner of the first line of text
     begins at position (x,y) and the y-value increases by the increment for each line.
+    The lines are added to text_to_draw and drawn on the display surface (screen) by draw_scene().
     
     Parameters:
     - lines (list[str]): text to add to screen
@@ -108,70 +124,20 @@ def write_lines(lines: list[str], x: int, y: int, colour: str="black"):
     Returns: None
     """
     for line in lines:
-        screen.blit(font.render(line, True, colour), (x,y))
+        text_to_draw.append((line, colour, (x,y)))
         y += 20
 
-# -------------------------------------SET WINDOW TITLE AND ICON--------------------------------------------- #
-# set window title
-pygame.display.set_caption("My Simple Pygame")
-# set window icon
-pygame.display.set_icon(bear_surf)
-
-# ---------------------------------------EVENT LOOP-------------------------------------------- #
-while running:
-
-    # -----------------------------------EVENT LISTENERS----------------------------------------------- #
-    for event in pygame.event.get():
-
-        # user quitting game - when the player clicks the "quit" button, "running" is set to False and application closes
-        if event.type == QUIT:
-            running = False
-        
-        # if player collides with tree, accept yes or no responses
-        if event.type == KEYDOWN and collide_tree == True:
-            if event.key == K_y:
-                climb_tree = "Yes"
-            elif event.key == K_n:
-                climb_tree = "No"
-        
-        # if player collides with lock, accept yes or no responses
-        if event.type == KEYDOWN and collide_lock == True:
-            if event.key == K_y:
-                open_lock = "Yes"
-            elif event.key == K_n:
-                open_lock = "No"
-
-    # -----------------------------------MOVEMENTS----------------------------------------------- #
-    # get currently pressed keys
-    keys = pygame.key.get_pressed()
+# draws the whole scene
+def draw_scene():
+    """
+    Draws everything in the game on the display surface (screen), from back to front.
+    The renderer calls this at the end of the event loop for each part of the screen that has changed since the last frame,
+    with drawing clipped to that part, so only the pixels that have changed are drawn.
 
-    # movements for player icon
-    if keys[pygame.K_LEFT]:
-        # Left movement occurs UNLESS...
-        # player is within y-range of wall...........................and player is left of wall.....and player will collide with wall
-        if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.left >= wall.right and bear_loc.left - 10 < wall.right: pass
-        # otherwise, move left
-        else: bear_loc = bear_loc.move([-10, 0])
-    if keys[pygame.K_RIGHT]:
-        # Right movement occurs UNLESS...
-        # player is within y-range of wall...........................and player is right of wall.....and player will collide with wall
-        if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.right <= wall.left and bear_loc.right + 10 > wall.left: pass
-        # otherwise, move right
-        else: bear_loc = bear_loc.move([10, 0])
-    if keys[pygame.K_UP]:
-        # Upward movement occurs UNLESS...
-        # player is within x-range of wall...........................and player is below wall........and player will collide with wall
-        if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.top >= wall.bottom and bear_loc.top - 10 < wall.bottom: pass
-        # otherwise, move up
-        else: bear_loc = bear_loc.move([0, -10])
-    if keys[pygame.K_DOWN]:
-        # Downward movement occurs UNLESS...
-        # player is within x-range of wall...........................and player is above wall........and player will collide with wall
-        if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.bottom <= wall.top and bear_loc.bottom + 10 > wall.top: pass
-        # otherwise, move down
-        else: bear_loc = bear_loc.move([0, 10])
+    Parameters: None
 
-    # ----------------------------------DRAWING ITEMS ON SCREEN------------------------------------------------ #
+    Returns: None
+    """
     # draw background
     pygame.draw.rect(screen, (191,180,214), screen.get_rect())
 
@@ -181,24 +147,20 @@ while running:
     screen.blit(instructions, (0,0))
 
     # draw text box
-    pygame.draw.rect(screen, (214,201,240), pygame.Rect(10,400,480,90))
+    pygame.draw.rect(screen, (214,201,240), text_box)
     # add title to text box
     text_box_title = font.render("PLAYER BEAR:", True, "red")
 
     # draw inventory box
-    pygame.draw.rect(screen, (214,201,240), pygame.Rect(500,400,190,90))
+    pygame.draw.rect(screen, (214,201,240), inventory_box)
     # add title to inventory box
     inventory_box_title = font.render("INVENTORY:", True, "red")
 
     # draw wall
     pygame.draw.rect(screen, (154, 146, 173), wall)
 
-    # confine the player's icon to the rectangle of the display screen,
-    # just below the line of instructions
-    bear_loc.clamp_ip(pygame.Rect(0,10,700,390))
-
-    # add bear image to screen
-    screen.blit(bear_surf, bear_loc)
+    # add bear image to screen - part of the way between where it was on the last two ticks (see MOVEMENTS)
+    screen.blit(bear_surf, bear_draw_loc)
     # add tree image to screen
     screen.blit(tree_surf, tree_loc)
     # add text box title to screen
@@ -209,82 +171,146 @@ while running:
     # add lock image to screen
     screen.blit(lock_surf, lock_loc)
 
-    # ---------------------------------------INTERACTING WITH TREE------------------------------------------- #
-    # flag for collision with tree - True if collision is currently occurring
-    collide_tree = pygame.Rect.colliderect(bear_loc, tree_loc)
+    # if player has key, key icon appears in inventory
+    if state.key == Key.IN_INVENTORY:
+        screen.blit(key_surf, key_loc)
+
+    # add the text written to the text box on this frame
+    for line, colour, position in text_to_draw:
+        screen.blit(font.render(line, True, colour), position)
 
-    # if player is colliding with tree and player hasn't climbed tree before, write text to screen
-    if collide_tree == True and tree_climbed == False:
-        write_lines(["There is a tall tree... with something at the top!", "Climb tree? Yes [y] or No [n]: "], 10, 420)
-        
-        # event listeners handle player's response, which is stored in climb_tree
-        if climb_tree == "Yes":
-            write_lines(["[y]: You climb to the top and find a KEY."], 10, 460, "blue")
-            # player has key
-            # key appears in inventory (see below)
-            key = True
-            # player has key but has not used it
-            key_used = False
-
-        elif climb_tree == "No":
-            write_lines(["[n]: It looks too tall to climb anyway."], 10, 460, "blue")
-    
-    # if player is not colliding with tree
-    elif collide_tree == False:
-        # if player climbed the tree (has the key)
-        if key == True:
-            # prevents tree from being interacted with after it has been climbed
-            tree_climbed = True
+# redraws the parts of the screen that have changed - see UPDATE EVENT LOOP
+renderer = DirtyRectRenderer(screen)
 
-        # climb_tree removes the text from the text box when player is not colliding with tree
-        climb_tree = "None"
+# -------------------------------------SET WINDOW TITLE AND ICON--------------------------------------------- #
+# set window title
+pygame.display.set_caption("My Simple Pygame")
+# set window icon
+pygame.display.set_icon(bear_surf)
 
-    # ----------------------------------------KEY APPEARING IN INVENTORY------------------------------------------ #
-    # if player has key, key icon appears in inventory
-    if key == True:
-        screen.blit(key_surf, key_loc)
-    
-    # ----------------------------------------INTERACTING WITH LOCK------------------------------------------ #
-    # flag for collision with lock - True if collision is currently occurring
-    collide_lock = pygame.Rect.colliderect(bear_loc, lock_loc)
+# ---------------------------------------EVENT LOOP-------------------------------------------- #
+while running:
+
+    # start timing the sections of this frame (each section ends with profiler.lap)
+    profiler.start_frame()
+
+    # -----------------------------------EVENT LISTENERS----------------------------------------------- #
+    for event in pygame.event.get():
 
-    # if player is colliding with lock and the lock is locked, write text to screen
-    if collide_lock == True and lock_state == "Locked":
-        write_lines(["A lock. You use your paws but it won't budge.", "It probably needs a KEY..."], 10, 420)
+        # user quitting game - when the player clicks the "quit" button, "running" is set to False and application closes
+        if event.type == QUIT:
+            running = False
+
+        # if the window has been covered up and shown again, redraw all of it
+        if event.type == VIDEOEXPOSE:
+            renderer.mark_all()
         
-        # if the player has the key but has not used it, give them the option to use it
-        if key_used == False:
-            write_lines(["Use KEY? Yes [y] or No [n]: "], 10, 460)
-
-            # event listeners handle player's response, which is stored in open_lock
-            if open_lock == "Yes":
-                write_lines(["[y]: It worked!"], 10, 480, "blue")
-                # change lock icon to unlocked version
-                lock_surf = unlocked_surf                
-                # key disappears from inventory
-                key = False
-
-            elif open_lock == "No":
-                write_lines(["[n]: Really? Why not?"], 10, 480, "blue")
-
-    # if player is not colliding with lock
-    elif collide_lock == False:
-        # if player wants to open the lock and the lock is locked...
-        if open_lock == "Yes" and lock_state == "Locked":
-            # unlock the lock
-            lock_state = "Unlocked"
-            # key has been used
-            key_used = True
-
-        # open_lock removes the text from the text box when player is not colliding with lock
-        open_lock = "None"
-    
-    # ----------------------------------------UPDATE EVENT LOOP------------------------------------------ #
-    # update the display surface
-    pygame.display.update()
+        # if player collides with tree or lock, accept yes or no responses (the state ignores them if there is no question)
+        if event.type == KEYDOWN and state.focus is not None:
+            if event.key == K_y:
+                state.answer(True)
+            elif event.key == K_n:
+                state.answer(False)
+
+    profiler.lap("events")
+
+    # -----------------------------------MOVEMENTS----------------------------------------------- #
+    # get currently pressed keys
+    keys = pygame.key.get_pressed()
 
-    # set the frame rate to 60 FPS (frames per second) - a constant frame rate helps the game run smoother
-    clock.tick(60)
+    # run the ticks of game logic for this frame - none if the last frame was quick, more than one (up to
+    # MAX_TICKS_PER_FRAME) if it was slow (see timestep.py)
+    for tick in range(timestep.advance()):
+        # where the player was before this tick, for drawing it between ticks
+        bear_prev = bear_loc.copy()
+
+        # movements for player icon - 10 pixels per tick
+        if keys[pygame.K_LEFT]:
+            # Left movement occurs UNLESS...
+            # player is within y-range of wall...........................and player is left of wall.....and player will collide with wall
+            if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.left >= wall.right and bear_loc.left - 10 < wall.right: pass
+            # otherwise, move left
+            else: bear_loc = bear_loc.move([-10, 0])
+        if keys[pygame.K_RIGHT]:
+            # Right movement occurs UNLESS...
+            # player is within y-range of wall...........................and player is right of wall.....and player will collide with wall
+            if bear_loc.bottom > wall.top and bear_loc.top < wall.bottom and bear_loc.right <= wall.left and bear_loc.right + 10 > wall.left: pass
+            # otherwise, move right
+            else: bear_loc = bear_loc.move([10, 0])
+        if keys[pygame.K_UP]:
+            # Upward movement occurs UNLESS...
+            # player is within x-range of wall...........................and player is below wall........and player will collide with wall
+            if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.top >= wall.bottom and bear_loc.top - 10 < wall.bottom: pass
+            # otherwise, move up
+            else: bear_loc = bear_loc.move([0, -10])
+        if keys[pygame.K_DOWN]:
+            # Downward movement occurs UNLESS...
+            # player is within x-range of wall...........................and player is above wall........and player will collide with wall
+            if bear_loc.right > wall.left and bear_loc.left < wall.right and bear_loc.bottom <= wall.top and bear_loc.bottom + 10 > wall.top: pass
+            # otherwise, move down
+            else: bear_loc = bear_loc.move([0, 10])
+
+        # confine the player's icon to the rectangle of the display screen,
+        # just below the line of instructions
+        bear_loc.clamp_ip(pygame.Rect(0,10,700,390))
+
+    # where to draw the player on this frame - collisions still use bear_loc, where the player is after the last tick
+    bear_draw_loc = interpolate_rect(bear_prev, bear_loc, timestep.alpha)
+
+    # ----------------------------------DRAWING ITEMS ON SCREEN------------------------------------------------ #
+    # Note: nothing is drawn here. The sections below write to the text box with write_lines(), and the scene is drawn by
+    # draw_scene() at the end of the event loop - only where the screen has changed (see UPDATE EVENT LOOP).
+
+    # clear the text box - the text for this frame is written by the sections below
+    text_to_draw.clear()
+
+    profiler.lap("movement")
+
+    # ---------------------------------------INTERACTING WITH TREE AND LOCK------------------------------------------- #
+    # tell the state what the player is touching (nothing happens unless it has changed - see GameState.touch)
+    if pygame.Rect.colliderect(bear_loc, tree_loc):
+        state.touch("tree")
+    elif pygame.Rect.colliderect(bear_loc, lock_loc):
+        state.touch("lock")
+    else:
+        state.touch(None)
+
+    # write what the tree or the lock says - worked out when the state last changed, e.g. when the player answered [y] or [n]
+    for lines, y, colour in state.prompt:
+        write_lines(lines, 10, y, colour)
+
+    # change lock icon to unlocked version once the key has been used
+    if state.lock == Lock.SAID_YES or state.lock == Lock.UNLOCKED:
+        lock_surf = unlocked_surf
+    else:
+        lock_surf = locked_surf
+
+    profiler.lap("tree and lock")
+
+    # ----------------------------------------UPDATE EVENT LOOP------------------------------------------ #
+    # tell the renderer about everything that can change - if something has moved or changed since the last frame,
+    # its old and new positions are redrawn
+    renderer.track("bear", bear_draw_loc)
+    renderer.track("lock", lock_loc, lock_surf)
+    renderer.track("key", key_loc, state.key)
+    # the text can run past the edge of the text box (e.g. the lock's reply at y = 480), so track everything the lines
+    # cover as well - otherwise the part of a line outside the box would never be redrawn (font.size measures a line
+    # without rendering it)
+    text_area = text_box.unionall([pygame.Rect(position, font.size(line)) for line, colour, position in text_to_draw])
+    renderer.track("text box", text_area, tuple(text_to_draw))
+
+    # redraw the parts of the screen that have changed
+    dirty_rects = renderer.redraw(draw_scene)
+    profiler.lap("draw")
+
+    # update the display surface - only the parts that have changed
+    pygame.display.update(dirty_rects)
+    profiler.lap("display update")
+
+    # limit the frame rate (frames per second) - the player still moves at the same speed, as the game logic runs in
+    # fixed ticks (see MOVEMENTS)
+    clock.tick(FRAME_RATE_LIMIT)
+    profiler.lap("clock")
 
 # close the application
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,167 @@
+# Text rendering helpers for ai_game.py
+
+# font.render() rasterizes a string into a new surface every time it is called. Most of the text in the game (the
+# instructions, the box titles, the NPCs' responses) stays the same for many frames in a row, so instead of rendering
+# it 60 times a second, each rendered line is kept in a TextCache and reused until it falls out of the cache.
+
+from collections import OrderedDict
+
+
+class TextCache:
+    """
+    Least-recently-used cache of rendered text surfaces, keyed by (text, colour, font).
+    When the surfaces in the cache take up more than max_bytes, the ones that have gone unused the longest are removed.
+
+    Parameters:
+    - max_bytes (int): memory cap for the cached surfaces, in bytes (default: 4 MB)
+
+    Attributes:
+    - hits (int): number of render() calls answered from the cache
+    - misses (int): number of render() calls that had to call font.render()
+    - size_bytes (int): memory currently used by the cached surfaces
+    """
+
+    def __init__(self, max_bytes: int=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        # most recently used surfaces are at the end
+        self._surfaces = OrderedDict()
+
+    def render(self, font, text: str, colour):
+        """
+        Returns the surface for text rendered (antialiased) in font and colour, only calling font.render() if
+        it is not already in the cache.
+
+        Parameters:
+        - font (pygame.font.Font): font to render with
+        - text (str): text to render
+        - colour: colour of the text (any colour pygame accepts, e.g. "black" or (255,0,0))
+
+        Returns:
+        - surface (pygame.Surface): the rendered text - do not draw on it, it is shared
+        """
+        key = (text, colour, font)
+        surface = self._surfaces.get(key)
+
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, colour)
+        self._surfaces[key] = surface
+        self.size_bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+        # remove the least recently used surfaces until the cache fits under the cap again
+        # (the surface that was just rendered is always kept)
+        while self.size_bytes > self.max_bytes and len(self._surfaces) > 1:
+            old_key, old_surface = self._surfaces.popitem(last=False)
+            self.size_bytes -= old_surface.get_width() * old_surface.get_height() * old_surface.get_bytesize()
+
+        return surface
+
+    def clear(self):
+        """Removes every surface from the cache. The hit and miss counters are kept."""
+        self._surfaces.clear()
+        self.size_bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+        - stats (dict): hits, misses, number of cached surfaces and memory used in bytes
+        """
+        return {"hits": self.hits, "misses": self.misses, "surfaces": len(self._surfaces), "bytes": self.size_bytes}
+
+
+class TextLayout:
+    """
+    Splits lines of text that are too wide for the text box into several shorter lines ("word wrap"), and caches the
+    result for each (line, font, width), so a line that stays on screen is only laid out once.
+
+    Words are measured with font.size(), which does not rasterize anything, and each word is only measured once per
+    line (plus a few whole-line measurements near the edge of the box), so laying out a line takes time proportional to its length.
+
+    Parameters:
+    - max_entries (int): maximum number of laid out lines to keep; the least recently used are removed first (default: 1024)
+    """
+
+    def __init__(self, max_entries: int=1024):
+        self.max_entries = max_entries
+        # most recently used layouts are at the end
+        self._layouts = OrderedDict()
+
+    def wrap(self, font, line: str, width: int):
+        """
+        Returns line split into lines that each fit within width pixels when rendered in font. A line that already fits
+        is returned unchanged. Otherwise, the line is broken between words, and a single word that is wider than width
+        gets a line to itself.
+
+        Parameters:
+        - font (pygame.font.Font): font the text will be rendered in
+        - line (str): line of text to lay out
+        - width (int): maximum width of a line in pixels
+
+        Returns:
+        - lines (tuple[str]): the wrapped lines, from top to bottom
+        """
+        key = (line, font, width)
+        lines = self._layouts.get(key)
+
+        if lines is not None:
+            self._layouts.move_to_end(key)
+            return lines
+
+        lines = self._break_lines(font, line, width)
+
+        self._layouts[key] = lines
+        if len(self._layouts) > self.max_entries:
+            self._layouts.popitem(last=False)
+
+        return lines
+
+    def _break_lines(self, font, line: str, width: int):
+        # if the line will fit within the width, it does not need to be wrapped
+        if font.size(line)[0] <= width:
+            return (line,)
+
+        space_width = font.size(" ")[0]
+
+        lines = []
+        # words on the line being built, and the width of those words (including the spaces between them)
+        current_words = []
+        current_width = 0
+
+        # font.size() rounds each word to whole pixels, so adding up word widths can be a few pixels off on a long line.
+        # When the total is this close to the width, the whole line is measured instead.
+        tolerance = max(2 * space_width, width // 20)
+
+        for word in line.split():
+            word_width = font.size(word)[0]
+            new_width = current_width + space_width + word_width
+
+            if current_words and abs(new_width - width) <= tolerance:
+                new_width = font.size(" ".join(current_words) + " " + word)[0]
+
+            # if the word fits on the current line (after a space), add it
+            if current_words and new_width <= width:
+                current_words.append(word)
+                current_width = new_width
+
+            # otherwise, finish the current line and start a new one with the word
+            else:
+                if current_words:
+                    lines.append(" ".join(current_words))
+                current_words = [word]
+                current_width = word_width
+
+        if current_words:
+            lines.append(" ".join(current_words))
+
+        return tuple(lines)
+
+    def clear(self):
+        """Removes every layout from the cache."""
+        self._layouts.clear()
@@ -0,0 +1,98 @@
+# Fixed-timestep game updates for simple_pygame.py and ai_game.py
+
+# The games used to move the player 10 pixels on every frame, so the game itself ran slower whenever a frame took longer
+# (a big redraw, a slow model call...), and faster on a faster computer if the frame rate was not limited.
+
+# With a fixed timestep, the game logic runs in "ticks" of a fixed length (1/60 s by default), however long each frame
+# takes. Every frame, the time since the last frame is added to an "accumulator", and one tick is run for each whole
+# tick length in it - none if the frame was quick, one or more if it was slow. The frame is then drawn, and whatever is
+# left in the accumulator says how far the game is between the last tick and the next one (alpha), so moving things can
+# be drawn part of the way between where they were on the last two ticks (see interpolate_rect).
+
+# After a slow frame, the game catches up:
+# - with frame skip (the default), up to max_ticks_per_frame ticks run before the next frame is drawn (the frames in
+#   between are "skipped"), so the game logic keeps up with real time even when drawing is slow. Anything beyond that is
+#   dropped, so a very slow frame cannot make the next frame slower still (a "spiral of death")
+# - without frame skip, at most one tick runs per frame, so the game slows down with the frame rate - after a slow
+#   frame the game carries on where it was, a little behind real time
+
+import time
+
+import pygame
+
+# where FixedTimestep gets the time from (seconds) - replaced by benchmarks/game_loop.py to replay input frame by frame
+time_source = time.perf_counter
+
+
+class FixedTimestep:
+    """
+    Works out how many fixed-length ticks of game logic to run on each frame.
+
+    Each frame, call advance() and run the game logic that many times, then draw the frame using alpha for anything
+    that moves.
+
+    Parameters:
+    - tick_rate (int): ticks per second (default: 60)
+    - frame_skip (bool): allow more than one tick per frame, to catch up after slow frames - False for at most one
+      (default: True)
+    - max_ticks_per_frame (int): with frame_skip, the most ticks to run on one frame - time beyond that is dropped, so a
+      very slow frame cannot make every following frame slow too (default: 5)
+
+    Attributes:
+    - ticks (int): number of ticks run so far
+    - dropped (float): seconds of game time dropped because frames were too slow to catch up
+    - alpha (float): from 0 to 1 - how far the game is between the last tick and the next one
+    """
+
+    def __init__(self, tick_rate: int=60, frame_skip: bool=True, max_ticks_per_frame: int=5):
+        self.tick_rate = tick_rate
+        self.frame_skip = frame_skip
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.ticks = 0
+        self.dropped = 0.0
+        self.alpha = 0.0
+        # time not yet used up by ticks, in ticks
+        self._accumulator = 0.0
+        self._last = time_source()
+
+    def advance(self):
+        """
+        Adds the time since the last call to the accumulator, and takes out the ticks to run on this frame.
+
+        Returns:
+        - ticks (int): number of ticks to run on this frame
+        """
+        now = time_source()
+        self._accumulator += (now - self._last) * self.tick_rate
+        self._last = now
+
+        # (a tiny margin, so a frame that took exactly one tick is not counted as slightly less because of rounding)
+        ticks = int(self._accumulator + 1e-6)
+        limit = max(self.max_ticks_per_frame, 1) if self.frame_skip else 1
+        if ticks > limit:
+            # too far behind to catch up on this frame - drop the extra time
+            self.dropped += (ticks - limit) / self.tick_rate
+            self._accumulator -= ticks - limit
+            ticks = limit
+        self._accumulator = max(self._accumulator - ticks, 0.0)
+        self.ticks += ticks
+        self.alpha = min(self._accumulator, 1.0)
+        return ticks
+
+
+def interpolate_rect(previous, current, alpha: float):
+    """
+    Returns a rectangle part of the way from previous to current, for drawing something that moves between ticks.
+
+    Parameters:
+    - previous (pygame.Rect): where the object was after the second-to-last tick
+    - current (pygame.Rect): where the object was after the last tick
+    - alpha (float): how far to go, from 0 (previous) to 1 (current) - FixedTimestep.alpha
+
+    Returns:
+    - rect (pygame.Rect): the rectangle to draw the object in
+    """
+    rect = pygame.Rect(current)
+    rect.x = round(previous.x + (current.x - previous.x) * alpha)
+    rect.y = round(previous.y + (current.y - previous.y) * alpha)
+    return rect
@@ -0,0 +1,169 @@
+# World objects for ai_game.py
+
+# The game needs to know which objects the player is touching (to talk to an NPC or climb the tree), which are close
+# by (to start loading an NPC's model), and which block the player's way (the wall). Checking the player against every
+# object is fine for a handful of objects, but the work grows with every NPC and obstacle added to the map.
+
+# A World keeps every object in a uniform grid of square cells: each object is listed in the cells its rectangle covers.
+# A query only looks at the objects listed in the cells the query's rectangle covers, so it only examines objects near
+# the player, however big the map is.
+
+# World.sweep() moves a rectangle and stops it at the first solid object in its way, on any side - so the game does not
+# need its own check for each direction and each obstacle.
+
+import pygame
+
+
+class World:
+    """
+    Registry of the objects in the game world, indexed by a uniform grid for fast collision and proximity queries.
+
+    Objects are pygame.Rects, registered under a unique name. Solid objects (e.g. walls) block movement (see sweep()).
+    If an object's rectangle changes, call move() so the index stays up to date.
+
+    Parameters:
+    - cell_size (int): width and height of each grid cell in pixels - about the size of the largest objects works
+      best (default: 128)
+    """
+
+    def __init__(self, cell_size: int=128):
+        self.cell_size = cell_size
+        # name -> (rect, solid) of every object, in the order they were added
+        self._objects = {}
+        # (column, row) -> names of the objects that cover the cell
+        self._cells = {}
+        # name -> the cells the object covers
+        self._object_cells = {}
+        # name -> number for sorting query results in the order the objects were added
+        self._order = {}
+        self._added = 0
+
+    def __contains__(self, name):
+        return name in self._objects
+
+    def __len__(self):
+        return len(self._objects)
+
+    def add(self, name: str, rect, solid: bool=False):
+        """
+        Adds an object to the world.
+
+        Parameters:
+        - name (str): unique name for the object, e.g. "tree"
+        - rect (pygame.Rect): where the object is
+        - solid (bool): True if the object blocks movement, like a wall (default: False)
+
+        Returns: None
+        """
+        order = self._order.get(name, self._added)
+        self._added += 1
+        if name in self._objects:
+            self.remove(name)
+        rect = pygame.Rect(rect)
+        self._objects[name] = (rect, solid)
+        self._order[name] = order
+        cells = self._cells_for(rect)
+        self._object_cells[name] = cells
+        for cell in cells:
+            self._cells.setdefault(cell, []).append(name)
+
+    def remove(self, name: str):
+        """
+        Removes an object from the world.
+
+        Parameters:
+        - name (str): the object's name
+
+        Returns: None
+        """
+        del self._objects[name]
+        del self._order[name]
+        for cell in self._object_cells.pop(name):
+            names = self._cells[cell]
+            names.remove(name)
+            if not names:
+                del self._cells[cell]
+
+    def move(self, name: str, rect):
+        """
+        Moves an object to a new rectangle.
+
+        Parameters:
+        - name (str): the object's name
+        - rect (pygame.Rect): the object's new rectangle
+
+        Returns: None
+        """
+        self.add(name, rect, self._objects[name][1])
+
+    def rect(self, name: str):
+        """
+        Returns:
+        - rect (pygame.Rect): where the object is
+        """
+        return self._objects[name][0]
+
+    def query(self, rect, solid_only: bool=False):
+        """
+        Finds the objects that overlap a rectangle. Only the objects in the grid cells the rectangle covers are checked.
+
+        Parameters:
+        - rect (pygame.Rect): the rectangle to check, e.g. the player - grow it with rect.inflate() to find the objects
+          near it instead
+        - solid_only (bool): only return solid objects (default: False)
+
+        Returns:
+        - names (list[str]): the names of the objects that overlap rect, in the order they were added to the world
+        """
+        rect = pygame.Rect(rect)
+        found = set()
+        for cell in self._cells_for(rect):
+            for name in self._cells.get(cell, ()):
+                if name not in found:
+                    object_rect, solid = self._objects[name]
+                    if (solid or not solid_only) and rect.colliderect(object_rect):
+                        found.add(name)
+        return sorted(found, key=self._order.get)
+
+    def sweep(self, rect, dx: int, dy: int):
+        """
+        Moves a rectangle by (dx, dy), stopping it flush against the first solid object in its way. It moves along x
+        first and then along y, so a rectangle blocked in one direction can still slide along the obstacle in the
+        other. Solid objects the rectangle already overlaps do not block it, so it can never get stuck.
+
+        Parameters:
+        - rect (pygame.Rect): the rectangle to move, e.g. the player
+        - dx, dy (int): how far to move it, in pixels
+
+        Returns:
+        - rect (pygame.Rect): the moved rectangle (a new rectangle - rect itself is not changed)
+        """
+        rect = pygame.Rect(rect)
+        if dx:
+            for name in self.query(rect.union(rect.move(dx, 0)), solid_only=True):
+                obstacle = self._objects[name][0]
+                # only obstacles level with the rectangle and ahead of it block it
+                if obstacle.bottom > rect.top and obstacle.top < rect.bottom:
+                    if dx > 0 and obstacle.left >= rect.right:
+                        dx = min(dx, obstacle.left - rect.right)
+                    elif dx < 0 and obstacle.right <= rect.left:
+                        dx = max(dx, obstacle.right - rect.left)
+            rect.x += dx
+        if dy:
+            for name in self.query(rect.union(rect.move(0, dy)), solid_only=True):
+                obstacle = self._objects[name][0]
+                if obstacle.right > rect.left and obstacle.left < rect.right:
+                    if dy > 0 and obstacle.top >= rect.bottom:
+                        dy = min(dy, obstacle.top - rect.bottom)
+                    elif dy < 0 and obstacle.bottom <= rect.top:
+                        dy = max(dy, obstacle.bottom - rect.top)
+            rect.y += dy
+        return rect
+
+    def _cells_for(self, rect):
+        """Returns the (column, row) of every grid cell rect covers."""
+        size = self.cell_size
+        # right and bottom are just outside the rectangle - a rectangle ending on a cell's edge does not cover that cell
+        columns = range(rect.left // size, max(rect.left, rect.right - 1) // size + 1)
+        rows = range(rect.top // size, max(rect.top, rect.bottom - 1) // size + 1)
+        return [(column, row) for column in columns for row in rows]